@@ -0,0 +1,228 @@
+'''
+ * Copyright 2018 IBM Corporation
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ * http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+'''
+
+"""Translation of many Stan files at once.
+
+    python -m deepppl.dpplc batch deepppl/tests/good -o build -j 4
+
+Each `.stan` file found in the given directories, globs or files is
+translated to a Python module in the output directory. The
+manifest `deepppl_manifest.json` records for each module the hash of its
+source, the target backend, the timings of the compilation phases and
+the errors. Modules whose source, backend and compiler did not change
+since the previous run are not translated again.
+"""
+
+import os
+import glob
+import json
+import time
+import hashlib
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+from . import dpplc
+from .cache import compiler_fingerprint
+from .utils.timing import PhaseTimer
+
+manifest_name = 'deepppl_manifest.json'
+
+
+def collect_sources(paths):
+    """Return the pairs `(source, module)` of the Stan files designated
+    by `paths`, where `module` is the path of the generated module
+    relative to the output directory. Sources found in a directory keep
+    their position relative to this directory."""
+    sources = []
+    for path in paths:
+        if os.path.isdir(path):
+            pattern = os.path.join(path, '**', '*.stan')
+            for source in sorted(glob.glob(pattern, recursive=True)):
+                sources.append((source, os.path.relpath(source, path)))
+        else:
+            matches = sorted(glob.glob(path, recursive=True)) or [path]
+            for source in matches:
+                sources.append((source, os.path.basename(source)))
+    answer = []
+    seen = set()
+    for source, rel in sources:
+        module = os.path.splitext(rel)[0] + '.py'
+        if module not in seen:
+            seen.add(module)
+            answer.append((source, module))
+    return answer
+
+
+def source_hash(source):
+    return hashlib.sha256(source.encode()).hexdigest()
+
+
+def backend(config):
+    """Readable description of the backend and the options, recorded in the
+    manifest. The outputs are reused when all the options, given by
+    `Config.key`, are the same."""
+    answer = 'numpyro' if config.numpyro else 'pyro'
+    if config.standalone:
+        answer += '-standalone'
+    if config.vectorize:
+        answer += '-vectorized'
+    if config.subsample:
+        answer += '-subsampled'
+    if config.deterministic:
+        answer += '-deterministic'
+        answer += ''.join('-' + name for name in config.deterministic_exclude)
+    if config.optimize:
+        answer += '-optimized'
+    return answer
+
+
+def load_manifest(output_dir):
+    try:
+        with open(os.path.join(output_dir, manifest_name)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_manifest(output_dir, manifest):
+    fd, tmp = tempfile.mkstemp(dir=output_dir, suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp, os.path.join(output_dir, manifest_name))
+
+
+def _entry(source, config, verbose):
+    with open(source) as f:
+        code = f.read()
+    return {'source': source,
+            'hash': source_hash(code),
+            'backend': backend(config),
+            'config': repr(config.key()),
+            'verbose': verbose,
+            'compiler': compiler_fingerprint()}, code
+
+
+def _up_to_date(previous, entry, path):
+    if previous is None or previous.get('error') is not None:
+        return False
+    keys = ['hash', 'config', 'verbose', 'compiler']
+    return all(previous.get(k) == entry[k] for k in keys) and os.path.exists(path)
+
+
+def translate(source, path, config, verbose=False):
+    """Translate the Stan file `source` to the Python module `path`
+    and return its manifest entry."""
+    start = time.perf_counter()
+    timer = PhaseTimer()
+    entry, code = _entry(source, config, verbose)
+    try:
+        py = dpplc.stan2pystr(code, config, verbose=verbose, timer=timer)
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(py)
+        entry['error'] = None
+    except Exception as e:
+        entry['error'] = '{}: {}'.format(type(e).__name__, e)
+        # The module of a previous translation would be stale
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+    entry['timings'] = dict(timer.timings, total=time.perf_counter() - start)
+    return entry
+
+
+def batch_compile(paths, output_dir, config=None, verbose=False, jobs=None, force=False):
+    """Translate the Stan files designated by `paths` into `output_dir`,
+    using a pool of `jobs` processes (all the cores by default).
+    Return the updated manifest, mapping each module to its entry."""
+    if config is None:
+        config = dpplc.Config()
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = load_manifest(output_dir)
+    todo = []
+    for source, module in collect_sources(paths):
+        path = os.path.join(output_dir, module)
+        entry, _ = _entry(source, config, verbose)
+        if not force and _up_to_date(manifest.get(module), entry, path):
+            manifest[module]['skipped'] = True
+        else:
+            todo.append((module, source, path))
+    if jobs == 1 or len(todo) <= 1:
+        results = [translate(source, path, config, verbose) for (_, source, path) in todo]
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            futures = [pool.submit(translate, source, path, config, verbose)
+                       for (_, source, path) in todo]
+            results = [f.result() for f in futures]
+    for (module, _, _), entry in zip(todo, results):
+        entry['skipped'] = False
+        manifest[module] = entry
+    write_manifest(output_dir, manifest)
+    return manifest
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(prog='dpplc batch',
+                                     description='Translate many Stan files')
+    parser.add_argument('paths', type=str, nargs='+',
+                        help='Stan files, directories or globs to translate')
+    parser.add_argument('-o', '--output', type=str, default='.',
+                        help='Directory receiving the modules and the manifest')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='Number of worker processes')
+    parser.add_argument('--numpyro', action='store_true',
+                        help='Generate code for NumPyro')
+    parser.add_argument('--standalone', action='store_true',
+                        help='Generate importable modules (see PyroModel.from_module)')
+    parser.add_argument('--parser', type=str, default='ll', choices=['ll', 'sll'],
+                        help='Parser prediction mode (sll: SLL with LL fallback)')
+    parser.add_argument('--vectorize', action='store_true',
+                        help='Vectorize the loops over observed sample statements')
+    parser.add_argument('--subsample', action='store_true',
+                        help='Vectorize and subsample the plates over the data')
+    parser.add_argument('--deterministic', action='store_true',
+                        help='Record the transformed parameters in deterministic sites')
+    parser.add_argument('--deterministic-exclude', type=str, nargs='+', default=[],
+                        metavar='NAME', help='Transformed parameters not to record')
+    parser.add_argument('--optimize', action='store_true',
+                        help='Fold constants, hoist loop invariants and share common subexpressions')
+    parser.add_argument('--force', action='store_true',
+                        help='Translate up-to-date files again')
+    parser.add_argument('--verbose', action='store_true',
+                        help='Output verbose code with shape information')
+    args = parser.parse_args(argv)
+    config = dpplc.Config(numpyro=args.numpyro, standalone=args.standalone,
+                          parser=args.parser, vectorize=args.vectorize,
+                          subsample=args.subsample, deterministic=args.deterministic,
+                          deterministic_exclude=args.deterministic_exclude,
+                          optimize=args.optimize)
+    manifest = batch_compile(args.paths, args.output, config=config,
+                             verbose=args.verbose, jobs=args.jobs,
+                             force=args.force)
+    errors = 0
+    for _, module in collect_sources(args.paths):
+        entry = manifest[module]
+        if entry.get('skipped'):
+            status = 'up-to-date'
+        elif entry['error'] is not None:
+            status = 'error: ' + entry['error']
+            errors += 1
+        else:
+            status = '{:.3f}s'.format(entry['timings']['total'])
+        print('{}: {}'.format(module, status))
+    return 1 if errors else 0
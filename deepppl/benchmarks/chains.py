@@ -0,0 +1,77 @@
+'''
+ * Copyright 2018 IBM Corporation
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ * http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+'''
+
+"""Duration of `NumPyroModel.mcmc` for each way of running the chains,
+to pick the fastest one for the number of cores:
+
+    python -m deepppl.benchmarks.chains --chains 4 --devices 4
+
+The devices are the CPU devices of JAX used by the parallel chains. The
+time includes the compilation of the sampler, as in a single run.
+"""
+
+import argparse
+
+import numpy as np
+
+from .. import dpplc
+from ..dppl import NumPyroModel
+
+
+def coin_data(N):
+    return {'N': N, 'x': np.random.randint(0, 2, N).astype(float)}
+
+
+models = {'coin': coin_data}
+
+
+def main(names, methods, num_chains, num_samples, devices, N):
+    for name in names:
+        model = NumPyroModel(model_file='deepppl/tests/good/{}.stan'.format(name),
+                             config=dpplc.Config(vectorize=True))
+        data = models[name](N)
+        for method in methods:
+            mcmc = model.mcmc(num_samples=2 * num_samples, warmup_steps=num_samples,
+                              num_chains=num_chains, chain_method=method,
+                              host_devices=devices)
+            mcmc.mcmc.progress_bar = False
+            mcmc.run(**data)
+            timing = mcmc.timing
+            per_chain = ''
+            if 'per_chain' in timing:
+                per_chain = ' (chains: {})'.format(
+                    ', '.join('{:.3f}s'.format(t) for t in timing['per_chain']))
+            print('{:<8} {:<11} {} chains on {} devices: {:8.3f}s{}'.format(
+                name, method, num_chains, timing['devices'], timing['total'], per_chain))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='DeepPPL NumPyro chains benchmark')
+    parser.add_argument('--models', type=str, nargs='+', default=list(models),
+                        choices=list(models), help='Models to run')
+    parser.add_argument('--methods', type=str, nargs='+',
+                        default=['sequential', 'vectorized', 'parallel'],
+                        choices=['sequential', 'vectorized', 'parallel'],
+                        help='Ways of running the chains')
+    parser.add_argument('--chains', type=int, default=4, help='Number of chains')
+    parser.add_argument('--samples', type=int, default=1000,
+                        help='Number of warmup steps and of draws per chain')
+    parser.add_argument('--devices', type=int, default=None,
+                        help='Number of CPU devices (all the chains by default)')
+    parser.add_argument('--size', type=int, default=1000, help='Number of observations')
+    args = parser.parse_args()
+    main(args.models, args.methods, args.chains, args.samples,
+         args.devices or args.chains, args.size)
@@ -0,0 +1,65 @@
+'''
+ * Copyright 2018 IBM Corporation
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ * http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+'''
+
+"""Cost of evaluating the generated quantities of `kmeans` for random
+draws, one draw at a time, batched over the draws (on the whole draws at
+once or by chunks), and one draw at a time by a pool of threads:
+
+    python -m deepppl.benchmarks.generated --draws 1000 10000 --chunk 1000 --workers 4
+"""
+
+import argparse
+import time
+
+import torch
+
+from .. import dpplc
+from ..dppl import PyroModel
+
+
+def measure(num_draws, N=100, **kwargs):
+    model = PyroModel(model_file='deepppl/tests/good/kmeans.stan',
+                      config=dpplc.Config(vectorize=True))
+    data = {'N': N, 'D': 2, 'K': 3, 'y': torch.randn(N, 2).numpy()}
+    mcmc = model.mcmc()
+    mcmc.kwargs = dict(data, transformed_data=model._transformed_data(**data))
+    samples = {'mu': torch.randn(num_draws, 3, 2)}
+    start = time.perf_counter()
+    mcmc.sample_generated(samples, **kwargs)
+    return time.perf_counter() - start
+
+
+def main(draws, chunk_size, workers):
+    for num_draws in draws:
+        loop = measure(num_draws)
+        batched = measure(num_draws, batched=True)
+        chunked = measure(num_draws, batched=True, chunk_size=chunk_size)
+        threads = measure(num_draws, workers=workers, chunk_size=chunk_size)
+        print('draws={:<7} per draw {:8.4f}s  batched {:8.4f}s  chunks of {} {:8.4f}s  '
+              '{} threads {:8.4f}s'.format(num_draws, loop, batched, chunk_size, chunked,
+                                          workers, threads))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='DeepPPL generated quantities benchmark')
+    parser.add_argument('--draws', type=int, nargs='+', default=[1000, 10000],
+                        help='Number of draws')
+    parser.add_argument('--chunk', type=int, default=1000,
+                        help='Number of draws per chunk')
+    parser.add_argument('--workers', type=int, default=4,
+                        help='Number of threads')
+    args = parser.parse_args()
+    main(args.draws, args.chunk, args.workers)
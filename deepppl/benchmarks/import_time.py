@@ -0,0 +1,88 @@
+'''
+ * Copyright 2018 IBM Corporation
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ * http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+'''
+
+"""Cold-start time of the compiler.
+
+Each measure runs in a fresh interpreter:
+
+    python -m deepppl.benchmarks.import_time --repeat 5
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+heavy_modules = ['torch', 'pyro', 'jax', 'numpyro', 'pandas']
+
+scenarios = {
+    'import deepppl': 'import deepppl',
+    'import dpplc': 'from deepppl import dpplc',
+    'translate': '''
+from deepppl import dpplc
+dpplc.stan2pystr(open({file!r}).read(), dpplc.Config())
+''',
+    'command line': '''
+import runpy
+sys.argv = ['dpplc', '--noinfer', {file!r}]
+runpy.run_module('deepppl.dpplc', run_name='__main__')
+''',
+    'import PyroModel': 'from deepppl import PyroModel; PyroModel._stan_scoped',
+}
+
+probe = '''
+import sys, time, json
+start = time.perf_counter()
+{code}
+elapsed = time.perf_counter() - start
+loaded = [m for m in {heavy!r} if m in sys.modules]
+print(json.dumps({{'time': elapsed, 'loaded': loaded}}))
+'''
+
+
+def measure(code, repeat=5):
+    """Run `code` in `repeat` fresh interpreters and return the timings
+    and the heavy modules it loaded."""
+    times = []
+    loaded = []
+    for _ in range(repeat):
+        script = probe.format(code=code, heavy=heavy_modules)
+        out = subprocess.run([sys.executable, '-c', script],
+                             stdout=subprocess.PIPE, check=True)
+        res = json.loads(out.stdout.decode().strip().splitlines()[-1])
+        times.append(res['time'])
+        loaded = res['loaded']
+    return times, loaded
+
+
+def main(file, repeat=5):
+    for name, code in scenarios.items():
+        times, loaded = measure(code.format(file=file), repeat=repeat)
+        print('{:<18} median {:8.3f}s  min {:8.3f}s  loaded: {}'.format(
+            name, statistics.median(times), min(times),
+            ', '.join(loaded) or '-'))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='DeepPPL cold-start benchmark')
+    parser.add_argument('--file', type=str,
+                        default='deepppl/tests/good/coin.stan',
+                        help='Stan file translated by the `translate` scenario')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='Number of fresh interpreters per scenario')
+    args = parser.parse_args()
+    main(args.file, repeat=args.repeat)
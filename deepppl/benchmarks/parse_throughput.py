@@ -0,0 +1,95 @@
+'''
+ * Copyright 2018 IBM Corporation
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ * http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+'''
+
+"""Parse throughput of the parser modes on synthetic programs.
+
+The programs are unrolled hierarchical models with `size` groups:
+
+    python -m deepppl.benchmarks.parse_throughput --sizes 10 100 1000
+
+The ANTLR runtime caches its prediction DFA across parses. `cold` is the
+time of the first parse with an empty DFA and `warm` the median of the
+following ones.
+"""
+
+import argparse
+import statistics
+import time
+
+from antlr4 import InputStream
+from antlr4.dfa.DFA import DFA
+from antlr4.PredictionContext import PredictionContextCache
+
+from .. import dpplc
+from ..parser.stanParser import stanParser
+
+
+def synthetic_program(size):
+    """Hierarchical model with `size` groups, each with its own
+    parameter, prior and likelihood statements."""
+    lines = ['data {', '  int N;']
+    lines += ['  real y{}[N];'.format(k) for k in range(size)]
+    lines += ['}', 'parameters {', '  real mu;', '  real<lower=0> tau;',
+              '  real<lower=0> sigma;']
+    lines += ['  real theta{};'.format(k) for k in range(size)]
+    lines += ['}', 'model {', '  mu ~ normal(0, 10);', '  tau ~ cauchy(0, 5);',
+              '  sigma ~ cauchy(0, 5);']
+    for k in range(size):
+        lines.append('  theta{0} ~ normal(mu, tau);'.format(k))
+        lines.append('  for (i in 1:N)')
+        lines.append('    y{0}[i] ~ normal(theta{0} + 0.5 * mu, sigma);'.format(k))
+    lines.append('}')
+    return '\n'.join(lines) + '\n'
+
+
+def reset_dfa():
+    stanParser.decisionsToDFA = [DFA(ds, i) for i, ds
+                                 in enumerate(stanParser.atn.decisionToState)]
+    stanParser.sharedContextCache = PredictionContextCache()
+
+
+def measure(code, mode, repeat=3):
+    config = dpplc.Config(parser=mode)
+    reset_dfa()
+    times = []
+    for _ in range(repeat + 1):
+        start = time.perf_counter()
+        dpplc.streamToParsetree(InputStream(code), config)
+        times.append(time.perf_counter() - start)
+    return times[0], statistics.median(times[1:])
+
+
+def main(sizes, modes, repeat=3):
+    for size in sizes:
+        code = synthetic_program(size)
+        nlines = code.count('\n')
+        for mode in modes:
+            cold, warm = measure(code, mode, repeat=repeat)
+            print('{:>6} groups {:>7} lines  {:<4} cold {:8.3f}s  '
+                  'warm {:8.3f}s  {:10.0f} lines/s'.format(
+                      size, nlines, mode, cold, warm, nlines / warm))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='DeepPPL parse throughput benchmark')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000],
+                        help='Number of groups of the synthetic programs')
+    parser.add_argument('--modes', type=str, nargs='+', default=['ll', 'sll'],
+                        choices=['ll', 'sll'], help='Parser modes to compare')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Number of warm parses per measure')
+    args = parser.parse_args()
+    main(args.sizes, args.modes, repeat=args.repeat)
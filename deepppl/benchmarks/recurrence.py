@@ -0,0 +1,118 @@
+'''
+ * Copyright 2018 IBM Corporation
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ * http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+'''
+
+"""Cost of the time series models on random series of length `N`:
+
+    python -m deepppl.benchmarks.recurrence --sizes 100 1000 10000 100000
+
+`autoregressive` only reads the observed series: with Pyro, one trace of
+the model with the loop is compared to the one with the vectorized
+shifted indexes (`Config(vectorize=True)`). `exponential_smoothing`
+carries a latent level from one iteration to the next: with NumPyro,
+the loop is a `scan` and the time to compile the gradient of the log
+density should not depend on `N`. The NumPyro measures are skipped when
+it is not installed.
+"""
+
+import argparse
+import statistics
+import time
+
+import pyro
+import torch
+from pyro import poutine
+
+from .. import dpplc
+from ..dppl import PyroModel, NumPyroModel
+
+
+def series(N):
+    return torch.cumsum(torch.randn(N), 0) * 0.1
+
+
+# Values of the parameters of the models
+models = {'autoregressive': {'alpha': 0.1, 'beta': 0.5, 'sigma': 1.},
+          'exponential_smoothing': {'a': 0.5, 'sigma': 1.}}
+
+
+def measure(name, N, vectorize, repeat=5):
+    """Median time of a trace of the Pyro model and number of sample sites."""
+    model = PyroModel(model_file='deepppl/tests/good/{}.stan'.format(name),
+                      config=dpplc.Config(vectorize=vectorize))
+    data = {'N': N, 'y': series(N)}
+    # The parameters have improper priors: their values are given
+    params = {k: torch.tensor(v) for k, v in models[name].items()}
+    conditioned = poutine.condition(model._model, data=params)
+    pyro.set_rng_seed(0)
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        trace = poutine.trace(conditioned).get_trace(**data)
+        times.append(time.perf_counter() - start)
+    sites = sum(1 for node in trace.nodes.values() if node['type'] == 'sample')
+    return statistics.median(times), sites
+
+
+def measure_numpyro(name, N, repeat=5):
+    """Time to compile the gradient of the log density of the NumPyro model
+    and median time of its evaluations."""
+    import jax
+    import jax.numpy as jnp
+    from numpyro.infer.util import log_density
+    model = NumPyroModel(model_file='deepppl/tests/good/{}.stan'.format(name))
+    data = {'N': N, 'y': jnp.array(series(N).numpy())}
+    params = {k: jnp.array(v) for k, v in models[name].items()}
+    grad = jax.jit(jax.grad(
+        lambda p: log_density(model._model, (), data, p)[0]))
+    start = time.perf_counter()
+    jax.block_until_ready(grad(params))
+    compile_ = time.perf_counter() - start
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        jax.block_until_ready(grad(params))
+        times.append(time.perf_counter() - start)
+    return compile_, statistics.median(times)
+
+
+def main(names, sizes, repeat=5):
+    try:
+        import numpyro
+    except ImportError:
+        numpyro = None
+    for name in names:
+        for N in sizes:
+            loop, loop_sites = measure(name, N, False, repeat=repeat)
+            vect, vect_sites = measure(name, N, True, repeat=repeat)
+            print('{:<22} N={:<7} loop {:9.4f}s ({:>6} sites)  '
+                  'vectorized {:9.4f}s ({:>6} sites)  x{:.1f}'.format(
+                      name, N, loop, loop_sites, vect, vect_sites, loop / vect))
+            if numpyro is not None:
+                compile_, grad = measure_numpyro(name, N, repeat=repeat)
+                print('{:<22} N={:<7} numpyro compile {:9.4f}s  gradient {:9.4f}s'.format(
+                    name, N, compile_, grad))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='DeepPPL time series benchmark')
+    parser.add_argument('--models', type=str, nargs='+', default=list(models),
+                        choices=list(models), help='Models to run')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000, 100000],
+                        help='Length of the series')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='Number of measures')
+    args = parser.parse_args()
+    main(args.models, args.sizes, repeat=args.repeat)
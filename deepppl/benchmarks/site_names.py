@@ -0,0 +1,85 @@
+'''
+ * Copyright 2018 IBM Corporation
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ * http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+'''
+
+"""Overhead of the sample site names in the construction of a trace.
+
+    python -m deepppl.benchmarks.site_names --sizes 100 1000
+
+`trace` is the time of a trace of the Pyro model with one site per
+element, and `names` the time spent computing its site names, either
+formatted in each iteration (`format`) or looked up in the `site_names`
+table (`table`). `plate` is the time of a trace of the vectorized model.
+"""
+
+import argparse
+import statistics
+import time
+import timeit
+
+import pyro
+from pyro import poutine
+
+from .. import dpplc
+from ..dppl import PyroModel
+from ..utils.utils import SiteNames
+from .vectorize import models
+
+
+def trace_time(name, N, vectorize, repeat=5):
+    model = PyroModel(model_file='deepppl/tests/good/{}.stan'.format(name),
+                      config=dpplc.Config(vectorize=vectorize))
+    data = models[name](N)
+    if model._transformed_data:
+        data['transformed_data'] = model._transformed_data(**data)
+    pyro.set_rng_seed(0)
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        poutine.trace(model._model).get_trace(**data)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def names_time(N, repeat=5):
+    """Time to compute `N` loop-indexed names with each method."""
+    scope = {'site_names': SiteNames(), 'N': N}
+    format_ = "for i in range(1, N + 1): 'x' + '__{}'.format(i - 1) + '__2'"
+    table = "for i in range(1, N + 1): site_names['x__{}__2', i - 1]"
+    return [min(timeit.repeat(stmt, globals=scope, number=1, repeat=repeat))
+            for stmt in [format_, table]]
+
+
+def main(names, sizes, repeat=5):
+    for name in names:
+        for N in sizes:
+            loop = trace_time(name, N, False, repeat=repeat)
+            plate = trace_time(name, N, True, repeat=repeat)
+            format_, table = names_time(N, repeat=repeat)
+            print('{:<6} N={:<7} trace {:9.4f}s  names: format {:8.5f}s '
+                  'table {:8.5f}s  plate {:9.4f}s'.format(
+                      name, N, loop, format_, table, plate))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='DeepPPL site names benchmark')
+    parser.add_argument('--models', type=str, nargs='+', default=['coin'],
+                        choices=list(models), help='Models to run')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000],
+                        help='Number of observations')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='Number of measures')
+    args = parser.parse_args()
+    main(args.models, args.sizes, repeat=args.repeat)
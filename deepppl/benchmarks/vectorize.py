@@ -0,0 +1,102 @@
+'''
+ * Copyright 2018 IBM Corporation
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ * http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+'''
+
+"""Cost of one execution of the Pyro model, with and without loop
+vectorization (`Config(vectorize=True)`), on random data of size `N`:
+
+    python -m deepppl.benchmarks.vectorize --sizes 100 1000 10000
+
+`cockroaches` observes its data with a single vectorized statement in
+the source: it is the baseline the vectorized loops should approach.
+"""
+
+import argparse
+import statistics
+import time
+
+import pyro
+import torch
+from pyro import poutine
+
+from .. import dpplc
+from ..dppl import PyroModel
+
+
+def kmeans_data(N):
+    return {'N': N, 'D': 2, 'K': 3, 'y': torch.randn(N, 2)}
+
+
+def logistic_data(N):
+    return {'N': N, 'M': 5, 'x': torch.randn(N, 5),
+            'y': torch.randint(0, 2, (N,)).float()}
+
+
+def coin_data(N):
+    return {'N': N, 'x': torch.randint(0, 2, (N,)).float()}
+
+
+def cockroaches_data(N):
+    return {'N': N, 'exposure2': torch.rand(N) + 0.5, 'roach1': torch.rand(N) * 100,
+            'senior': torch.randint(0, 2, (N,)).float(),
+            'treatment': torch.randint(0, 2, (N,)).float(),
+            'y': torch.randint(0, 20, (N,)).float()}
+
+
+models = {'kmeans': kmeans_data,
+          'logistic': logistic_data,
+          'coin': coin_data,
+          'cockroaches': cockroaches_data}
+
+
+def measure(name, N, vectorize, repeat=5):
+    """Median time of a trace of the model and number of sample sites."""
+    config = dpplc.Config(vectorize=vectorize)
+    model = PyroModel(model_file='deepppl/tests/good/{}.stan'.format(name),
+                      config=config)
+    data = models[name](N)
+    if model._transformed_data:
+        data['transformed_data'] = model._transformed_data(
+            **{k: v for k, v in data.items()})
+    pyro.set_rng_seed(0)
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        trace = poutine.trace(model._model).get_trace(**data)
+        times.append(time.perf_counter() - start)
+    sites = sum(1 for node in trace.nodes.values() if node['type'] == 'sample')
+    return statistics.median(times), sites
+
+
+def main(names, sizes, repeat=5):
+    for name in names:
+        for N in sizes:
+            loop, loop_sites = measure(name, N, False, repeat=repeat)
+            vect, vect_sites = measure(name, N, True, repeat=repeat)
+            print('{:<12} N={:<7} loop {:9.4f}s ({:>6} sites)  '
+                  'vectorized {:9.4f}s ({:>6} sites)  x{:.1f}'.format(
+                      name, N, loop, loop_sites, vect, vect_sites, loop / vect))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='DeepPPL loop vectorization benchmark')
+    parser.add_argument('--models', type=str, nargs='+', default=list(models),
+                        choices=list(models), help='Models to run')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000],
+                        help='Number of observations')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='Number of traces per measure')
+    args = parser.parse_args()
+    main(args.models, args.sizes, repeat=args.repeat)
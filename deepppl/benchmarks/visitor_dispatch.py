@@ -0,0 +1,111 @@
+'''
+ * Copyright 2018 IBM Corporation
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ * http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+'''
+
+"""Throughput of the IR visitors on a large synthetic program.
+
+    python -m deepppl.benchmarks.visitor_dispatch --size 1000
+
+`dispatch` is a visitor that only counts the nodes: it measures the cost
+of `accept` and of the method lookup. The other lines are the passes of
+`ir2python`, each run on a fresh copy of the IR, and `ir2python` as a
+whole.
+"""
+
+import argparse
+import copy
+import statistics
+import time
+
+from antlr4 import InputStream
+
+from .. import dpplc
+from ..translation import ir2python
+from ..translation.ir import SamplingStmt
+from ..translation.stype_infer import TypeInferenceVisitor
+from .parse_throughput import synthetic_program
+
+
+class CountingVisitor(ir2python.IRVisitor):
+    """Visit every node, all of them through `defaultVisit`."""
+
+    def __init__(self):
+        self.count = 0
+
+    def defaultVisit(self, node):
+        self.count += 1
+        if isinstance(node, SamplingStmt):
+            children = node.args + [node.target, node.shape]
+        else:
+            children = node.children
+        for child in children:
+            if child is not None:
+                child.accept(self)
+
+
+def program_ir(size):
+    tree = dpplc.streamToParsetree(InputStream(synthetic_program(size)))
+    return dpplc.parsetreeToIR(tree)
+
+
+def passes():
+    return [
+        ('VariableInitializationVisitor', lambda ir: ir.accept(ir2python.VariableInitializationVisitor())),
+        ('VariableAnnotationsVisitor', lambda ir: ir.accept(ir2python.VariableAnnotationsVisitor())),
+        ('NetworksVisitor', lambda ir: ir.accept(ir2python.NetworksVisitor())),
+        ('SamplingConsistencyVisitor', lambda ir: ir.accept(ir2python.SamplingConsistencyVisitor())),
+        ('TypeInferenceVisitor', TypeInferenceVisitor.run),
+    ]
+
+
+def measure(f, make_ir, repeat):
+    times = []
+    for _ in range(repeat):
+        ir = make_ir()
+        start = time.perf_counter()
+        f(ir)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def main(size, repeat=5):
+    ir = program_ir(size)
+    counter = CountingVisitor()
+    ir.accept(counter)
+    nodes = counter.count
+    elapsed = measure(lambda ir: ir.accept(CountingVisitor()), lambda: ir, repeat)
+    print('{:<32} {:9.4f}s {:12.0f} visits/s'.format('dispatch', elapsed, nodes / elapsed))
+    # The passes update the IR in place, and expect the previous ones to have run
+    prepared = ir
+    for name, f in passes():
+        elapsed = measure(f, lambda: copy.deepcopy(prepared), repeat)
+        print('{:<32} {:9.4f}s {:12.0f} nodes/s'.format(name, elapsed, nodes / elapsed))
+        prepared = copy.deepcopy(prepared)
+        f(prepared)
+    config = dpplc.Config()
+    elapsed = measure(lambda ir: ir2python.ir2python(ir, config),
+                      lambda: copy.deepcopy(ir), repeat)
+    print('{:<32} {:9.4f}s {:12.0f} nodes/s'.format('ir2python', elapsed, nodes / elapsed))
+    print('{} nodes'.format(nodes))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='DeepPPL visitor dispatch benchmark')
+    parser.add_argument('--size', type=int, default=1000,
+                        help='Number of groups of the synthetic program')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='Number of measures per visitor')
+    args = parser.parse_args()
+    main(args.size, repeat=args.repeat)
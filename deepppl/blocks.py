@@ -0,0 +1,173 @@
+'''
+ * Copyright 2018 IBM Corporation
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ * http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+'''
+
+"""Per-block front end.
+
+The program is split into its top-level blocks, and each block is lexed,
+parsed and translated to IR on its own. The IR of a block is cached in
+memory, keyed by the text of the block, so that when a program is
+edited only the modified blocks go through the parser again.
+
+Blocks are not independent in two cases, which are handled here:
+- the statements of `transformed parameters` are also part of the model
+  (see `StanToIR.exitModelBlock`). They are added when the program is
+  assembled.
+- the network parameters declared in `data` and `parameters` update the
+  declarations of the `networks` block (see `StanToIR.exitNetParamDecl`).
+  When there is a `networks` block, the blocks from `networks` to
+  `parameters` are parsed together.
+"""
+
+import copy
+import re
+
+from antlr4 import CommonTokenStream, InputStream, ParseTreeWalker, PredictionMode
+from antlr4.error.ErrorStrategy import BailErrorStrategy
+
+from .cache import ModelCache
+from .parser.stanLexer import stanLexer
+from .parser.stanParser import stanParser
+from .translation.stan2ir import StanToIR
+from .translation.ir import Program, Model, TransformedParameters
+from .utils.timing import null_timer
+
+block_order = ['functions', 'networks', 'data', 'transformed data',
+               'parameters', 'transformed parameters', 'model',
+               'guide parameters', 'guide', 'generated quantities']
+
+block_cache = ModelCache(maxsize=512)
+
+_token = re.compile(r'''
+    (?P<ws>\s+)
+  | (?P<comment>//[^\n]*|/\*.*?\*/)
+  | (?P<string>"[^"\n]*")
+  | (?P<word>[A-Za-z_][A-Za-z0-9_]*)
+  | (?P<open>\{)
+  | (?P<close>\})
+  | (?P<other>.)
+''', re.VERBOSE | re.DOTALL)
+
+
+def scan_blocks(source):
+    """Return the triples `(name, start, end)` of the top-level blocks of
+    `source`, or `None` if they cannot be identified, in which case the
+    program is left to the parser."""
+    blocks = []
+    depth = 0
+    words = []
+    start = None
+    for m in _token.finditer(source):
+        kind = m.lastgroup
+        if kind in ('ws', 'comment'):
+            continue
+        if depth > 0:
+            if kind == 'open':
+                depth += 1
+            elif kind == 'close':
+                depth -= 1
+                if depth == 0:
+                    blocks.append((' '.join(words), start, m.end()))
+                    words = []
+            continue
+        if kind == 'word':
+            if not words:
+                start = m.start()
+            words.append(m.group())
+        elif kind == 'open' and words:
+            depth = 1
+        else:
+            return None
+    if depth != 0 or words:
+        return None
+    names = [name for name, _, _ in blocks]
+    if any(name not in block_order for name in names):
+        return None
+    positions = [block_order.index(name) for name in names]
+    if positions != sorted(set(positions)):
+        return None
+    return blocks
+
+
+def units(blocks):
+    """Return the triples `(names, start, end)` of the groups of blocks
+    that are parsed together."""
+    names = [name for name, _, _ in blocks]
+    grouped = set()
+    if 'networks' in names:
+        lo = block_order.index('networks')
+        hi = block_order.index('parameters')
+        grouped = {n for n in names if lo < block_order.index(n) <= hi}
+    answer = []
+    for name, start, end in blocks:
+        if name in grouped:
+            # The blocks are ordered: the previous unit starts with `networks`
+            previous, first, _ = answer.pop()
+            answer.append((previous + (name,), first, end))
+        else:
+            answer.append(((name,), start, end))
+    return answer
+
+
+class _Fallback(Exception):
+    """Raised when a unit cannot be translated on its own."""
+
+
+def parse_unit(text, config, timer=null_timer):
+    """Return the IR of the blocks in `text`."""
+    lexer = stanLexer(InputStream(text))
+    stream = CommonTokenStream(lexer)
+    with timer.phase('lexing'):
+        stream.fill()
+    parser = stanParser(stream)
+    if config.parser == 'sll':
+        parser._interp.predictionMode = PredictionMode.SLL
+    parser._errHandler = BailErrorStrategy()
+    parser._listeners = []
+    try:
+        with timer.phase('parsing'):
+            tree = parser.program()
+        with timer.phase('StanToIR'):
+            ParseTreeWalker().walk(StanToIR(), tree)
+    except Exception as e:
+        # The full parser reports the error
+        raise _Fallback() from e
+    return tree.ir
+
+
+def program_ir(source, config, timer=null_timer, cache=None):
+    """Return the IR of the program `source` built block by block, or
+    `None` if the program must go through the full parser."""
+    if cache is None:
+        cache = block_cache
+    with timer.phase('block scan'):
+        blocks = scan_blocks(source)
+    if not blocks:
+        return None
+    body = []
+    for names, start, end in units(blocks):
+        text = source[start:end]
+        try:
+            ir = cache.get(text, lambda: parse_unit(text, config, timer))
+        except _Fallback:
+            return None
+        with timer.phase('block cache'):
+            # The translation passes update the IR in place
+            body.extend(copy.deepcopy(ir).body)
+    tparams = [b for b in body if isinstance(b, TransformedParameters)]
+    models = [b for b in body if isinstance(b, Model)]
+    if tparams and models:
+        models[0].body = tparams[0].body + models[0].body
+    return Program(body=body)
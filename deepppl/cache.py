@@ -0,0 +1,178 @@
+'''
+ * Copyright 2018 IBM Corporation
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ * http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+'''
+
+import os
+import glob
+import hashlib
+import marshal
+import tempfile
+import threading
+from collections import namedtuple, OrderedDict
+from functools import lru_cache
+from importlib.util import MAGIC_NUMBER
+
+from .version import __version__
+
+_package_dir = os.path.dirname(os.path.abspath(__file__))
+# Directories of the package that take no part in the translation
+_unfingerprinted = frozenset(['tests', 'benchmarks', '__pycache__'])
+
+
+def default_cache_dir():
+    """Directory of the on-disk caches.
+    `DEEPPPL_CACHE_DIR` takes precedence over `XDG_CACHE_HOME`."""
+    path = os.environ.get('DEEPPPL_CACHE_DIR')
+    if path:
+        return path
+    base = os.environ.get('XDG_CACHE_HOME') or \
+        os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'deepppl')
+
+
+@lru_cache(maxsize=None)
+def compiler_fingerprint():
+    """Identify the compiler: its version, the Python bytecode format and
+    the content of the modules of the package, so that any change to the
+    compiler invalidates previous entries, whatever the modification
+    times of the files. Besides the parser and the translation, the
+    generated code depends on the block scanner, the hooks and the scopes
+    of `utils`: only the tests and the benchmarks are left out."""
+    h = hashlib.sha256()
+    h.update(__version__.encode())
+    h.update(MAGIC_NUMBER)
+    paths = []
+    for root, dirs, files in os.walk(_package_dir):
+        dirs[:] = [d for d in dirs if d not in _unfingerprinted]
+        paths.extend(os.path.join(root, name) for name in files if name.endswith('.py'))
+    for path in sorted(paths, key=lambda p: os.path.relpath(p, _package_dir)):
+        h.update(os.path.relpath(path, _package_dir).encode())
+        h.update(b'\0')
+        with open(path, 'rb') as f:
+            h.update(hashlib.sha256(f.read()).digest())
+    return h.hexdigest()
+
+
+class CompilationCache(object):
+    """Content-addressed cache of compiled Stan programs.
+
+    Entries are marshalled code objects stored under `directory` and
+    keyed by the source text, the compiler configuration, the verbosity
+    and the compiler fingerprint."""
+
+    suffix = '.dpplc'
+
+    def __init__(self, directory=None):
+        self.directory = directory or default_cache_dir()
+
+    def key(self, source, config, verbose=False):
+        h = hashlib.sha256()
+        for part in [compiler_fingerprint(),
+                     repr(config.key()),
+                     repr(bool(verbose)),
+                     source]:
+            h.update(part.encode())
+            h.update(b'\0')
+        return h.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key + self.suffix)
+
+    def get(self, key):
+        """Return the cached code object or `None`."""
+        try:
+            with open(self._path(key), 'rb') as f:
+                return marshal.load(f)
+        except (OSError, EOFError, ValueError, TypeError):
+            return None
+
+    def put(self, key, code):
+        path = self._path(key)
+        dirname = os.path.dirname(path)
+        try:
+            os.makedirs(dirname, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=dirname, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                marshal.dump(code, f)
+            # Concurrent writers race benignly: the last rename wins
+            os.replace(tmp, path)
+        except OSError:
+            # The cache is only an optimization
+            pass
+
+    def clear(self):
+        for path in glob.glob(os.path.join(self.directory, '*', '*' + self.suffix)):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'evictions', 'maxsize', 'currsize'])
+
+
+class ModelCache(object):
+    """Bounded, thread-safe, in-memory cache of loaded models.
+
+    Values are built on a miss by the `load` function given to `get`, and
+    the least recently used entry is evicted when more than `maxsize`
+    models are cached (`maxsize=None` disables the eviction)."""
+
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def get(self, key, load):
+        with self._lock:
+            if key in self._entries:
+                self._hits += 1
+                self._entries.move_to_end(key)
+                return self._entries[key]
+            self._misses += 1
+        # Loading happens outside of the lock so that compiling a model
+        # does not block the other threads. Concurrent misses on the same
+        # key may load it twice, the first one wins.
+        value = load()
+        with self._lock:
+            value = self._entries.setdefault(key, value)
+            self._entries.move_to_end(key)
+            self._evict()
+        return value
+
+    def _evict(self):
+        if self.maxsize is None:
+            return
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self._evictions += 1
+
+    def resize(self, maxsize):
+        with self._lock:
+            self.maxsize = maxsize
+            self._evict()
+
+    def info(self):
+        with self._lock:
+            return CacheInfo(self._hits, self._misses, self._evictions,
+                             self.maxsize, len(self._entries))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._hits = self._misses = self._evictions = 0
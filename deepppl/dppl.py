@@ -14,42 +14,113 @@
 #  * limitations under the License.
 #  */
 
-from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from types import FunctionType
+import copy
+import functools
+import importlib
 import inspect
 import builtins
+import multiprocessing
+import os
+import time
+import warnings
 
-import torch
-import jax
 import numpy as onp
-from jax import numpy as jnp
-
-import pyro
-import numpyro
 
 from . import dpplc
+from .cache import ModelCache
+from .sink import SampleSink
 from .utils import utils
+from .utils.lazy import LazyModule
+
+# The inference frameworks are only imported when a model using them is built
+torch = LazyModule('torch')
+pyro = LazyModule('pyro')
+jax = LazyModule('jax')
+jnp = LazyModule('jax.numpy')
+numpyro = LazyModule('numpyro')
+control_flow = LazyModule('numpyro.contrib.control_flow')
 
 
+# Compiled and evaluated models shared by all the instances,
+# keyed by the source of the model and the compiler configuration.
+compiled_models = ModelCache(maxsize=128)
+
 
 class PyroModel(object):
-    def __init__(self, model_code=None, model_file=None, **kwargs):
+    def __init__(self, model_code=None, model_file=None, config=None, **kwargs):
+        self._config = config
+        self._kwargs = dict(kwargs)
+        self._module = None
         self._scope = kwargs
-        self._py = self.compile(model_code=model_code, model_file=model_file)
+        self._py, self._toplevel = self._compiled(model_code=model_code, model_file=model_file)
         self._load_py()
 
+    def __reduce__(self):
+        """The functions of the model are built dynamically and cannot be
+        pickled: the model is pickled as its source, or the name of its
+        module, and compiled again when unpickled (the compilation cache,
+        when enabled, avoids translating it again). The other arguments of the model
+        must be picklable."""
+        if self._module is not None:
+            return _load_model, (type(self), None, self._module, None, self._kwargs)
+        return _load_model, (type(self), self._model_code, None, self._config, self._kwargs)
+
+    @classmethod
+    def from_module(cls, module, **kwargs):
+        """Build the model from a module generated ahead of time with
+        `Config(standalone=True)`, e.g. by `dpplc batch --standalone`.
+        `module` is either a module or its name. The module is imported
+        as usual, without going through the compiler."""
+        if isinstance(module, str):
+            module = importlib.import_module(module)
+        model = cls.__new__(cls)
+        model._config = None
+        model._kwargs = dict(kwargs)
+        model._module = module.__name__
+        model._scope = kwargs
+        model._py = None
+        model._toplevel = {k: v for k, v in vars(module).items()
+                           if not k.startswith('__')}
+        model._load_py()
+        return model
+
+    def config(self):
+        """Compiler options, given by the `config` argument."""
+        return self._config or dpplc.Config()
+
     def compile(self, **kwargs):
+        kwargs.setdefault('config', self.config())
         return dpplc.do_compile(**kwargs)
 
+    def _compiled(self, model_code=None, model_file=None):
+        """Return the code object and the top-level functions of the model.
+        Both are shared between the instances built from the same source."""
+        if not (model_code or model_file) or (model_code and model_file):
+            assert False, "Either code or file but not both must be provided."
+        if model_file:
+            with open(model_file) as f:
+                model_code = f.read()
+        self._model_code = model_code
+        config = self.config()
+
+        def load():
+            py = self.compile(model_code=model_code, config=config)
+            locals_ = {}
+            eval(py, globals(), locals_)
+            return py, locals_
+        return compiled_models.get((model_code, config.key()), load)
+
     def _load_py(self):
         """Load the python object into `_model`"""
-        locals_ = {}
-        eval(self._py, globals(), locals_)
+        locals_ = self._toplevel
         self._scope.update(locals_)
         self._guide = None
         self._prior = None
         self._transformed_data = None
         self._generated_quantities = None
+        self._batched_generated_quantities = None
         for k in locals_.keys():
             if k.startswith('guide_'):
                 self._guide = self._stan_scoped(k)
@@ -59,6 +130,9 @@ class PyroModel(object):
                 self._transformed_data = self._np_scoped(k)
             if k.startswith('generated_quantities'):
                 self._generated_quantities = self._np_scoped(k)
+                # Bound to the functions of the framework, to be vectorized
+                # over the draws
+                self._batched_generated_quantities = self._stan_scoped(k)
         self._model = self._stan_scoped('model')
 
     def _stan_scoped(self, name):
@@ -76,40 +150,55 @@ class PyroModel(object):
                                  torch.zeros,
                                  torch.ones,
                                  torch.nn.functional.softplus,
-                                 pyro.sample]})
+                                 pyro.sample,
+                                 pyro.plate,
+                                 pyro.deterministic]})
         scoped['fabs'] = torch.abs
         scoped.update(self._scope)
         f = self._scope[name]
-        scoped[name] = FunctionType(f.__code__, scoped, name)
+        scoped[name] = FunctionType(f.__code__, scoped, name, f.__defaults__)
         return scoped[name]
 
     def _np_scoped(self, name):
-        f = self._scope[name]
-        scoped = {k: v for k, v in builtins.__dict__.items()}
-        scoped.update({x.__name__: x
-                       for x in [onp.sqrt,
-                                 onp.random.randn,
-                                 onp.exp,
-                                 onp.log,
-                                 onp.zeros,
-                                 onp.ones]})
-        scoped['dot_self'] = lambda x: onp.dot(x, x)
-        f = self._scope[name]
-        scoped[name] = FunctionType(f.__code__, scoped, name)
-        return scoped[name]
+        return utils.np_scoped(self._scope[name])
 
-    def mcmc(self, num_samples=10000, warmup_steps=1000, num_chains=1, thin=1, kernel=None):
+    def mcmc(self, num_samples=10000, warmup_steps=1000, num_chains=1, thin=1, kernel=None,
+             parallel=False, max_workers=None, seed=None):
+        """With `parallel=True`, each chain runs in its own process of a
+        pool of `max_workers` processes (one per chain, up to the number of
+        cores, by default), with the NUTS kernel. The chain `i` is seeded
+        with `seed + i` (see `ParallelMCMC`)."""
+        if parallel:
+            assert kernel is None, "The chains run in parallel use the NUTS kernel"
+            mcmc = ParallelMCMC(self, num_samples - warmup_steps, warmup_steps=warmup_steps,
+                                num_chains=num_chains, max_workers=max_workers, seed=seed)
+            return MCMCProxy(mcmc, False, self._generated_quantities, self._transformed_data, thin,
+                             batched_generated_quantities=self._batched_generated_quantities,
+                             model=self)
         if kernel is None:
             kernel = pyro.infer.NUTS(self._model, adapt_step_size=True)
         mcmc = pyro.infer.MCMC(
             kernel, num_samples - warmup_steps, warmup_steps=warmup_steps, num_chains=num_chains)
-        return MCMCProxy(mcmc, False, self._generated_quantities, self._transformed_data, thin)
+        return MCMCProxy(mcmc, False, self._generated_quantities, self._transformed_data, thin,
+                         batched_generated_quantities=self._batched_generated_quantities,
+                         model=self)
 
-    def svi(self, optimizer=None, loss=None, params={'lr': 0.0005, "betas": (0.90, 0.999)}):
+    def svi(self, optimizer=None, loss=None, params={'lr': 0.0005, "betas": (0.90, 0.999)},
+            subsample_size=None):
+        """With `subsample_size`, each step only observes a random minibatch
+        of the elements of the subsampled plates and the ELBO is scaled
+        accordingly. The model must be compiled with `Config(subsample=True)`
+        and observe some data array, as a whole or in a loop."""
+        if subsample_size is not None and \
+                'subsample_size' not in inspect.signature(self._model).parameters:
+            raise ValueError("The model has no subsampled plate: minibatches require "
+                             "a model compiled with Config(subsample=True) observing "
+                             "some data array")
         optimizer = optimizer if optimizer else pyro.optim.Adam(params)
         loss = loss if loss is not None else pyro.infer.Trace_ELBO()
         svi = pyro.infer.SVI(self._model, self._guide, optimizer, loss)
-        return SVIProxy(svi, self._generated_quantities, self._transformed_data)
+        return SVIProxy(svi, self._generated_quantities, self._transformed_data,
+                        subsample_size=subsample_size)
 
 
 class NumPyroModel(PyroModel):
@@ -125,50 +214,189 @@ class NumPyroModel(PyroModel):
                                  jnp.log,
                                  jnp.zeros,
                                  jnp.ones,
-                                 numpyro.sample]})
+                                 jnp.arange,
+                                 numpyro.sample,
+                                 numpyro.plate,
+                                 numpyro.deterministic]})
         scoped['softplus'] = lambda x: jnp.logaddexp(x, 0.)
         scoped['fabs'] = jnp.abs
+        scoped['fori_loop'] = jax.lax.fori_loop
+        scoped['scan'] = control_flow.scan
         scoped.update(self._scope)
         f = self._scope[name]
-        scoped[name] = FunctionType(f.__code__, scoped, name)
+        scoped[name] = FunctionType(f.__code__, scoped, name, f.__defaults__)
         return scoped[name]
 
-    def compile(self, **kwargs):
-        config = dpplc.Config(numpyro=True)
-        return super(NumPyroModel, self).compile(config=config, **kwargs)
+    def _np_scoped(self, name):
+        """The transformed data and the generated quantities share the code
+        of the model: when it updates arrays with the operations of JAX,
+        they are evaluated with `jax.numpy`, otherwise with NumPy."""
+        return utils.np_scoped(self._scope[name], npyro=True)
+
+    def config(self):
+        config = copy.copy(super(NumPyroModel, self).config())
+        config.numpyro = True
+        return config
 
-    def mcmc(self, num_samples=10000, warmup_steps=1000, num_chains=1, thin=1, kernel=None):
+    def mcmc(self, num_samples=10000, warmup_steps=1000, num_chains=1, thin=1, kernel=None,
+             chain_method='parallel', seed=0, host_devices=None):
+        """`chain_method` is the way NumPyro runs the chains: 'parallel'
+        (one device per chain, falling back to 'sequential' when there are
+        not enough of them), 'sequential', or 'vectorized' (all the chains
+        in a single compiled program). `host_devices` sets the number of
+        CPU devices for the parallel chains: it only takes effect before
+        JAX runs its first operation. The key of each chain is split from
+        the key of `seed`. The duration of the run is reported by the
+        `timing` of the result, with the duration of each chain when they
+        run sequentially."""
+        if host_devices is not None:
+            numpyro.set_host_device_count(host_devices)
         if kernel is None:
             kernel = numpyro.infer.NUTS(self._model, adapt_step_size=True)
-        mcmc = numpyro.infer.MCMC(
-            kernel, warmup_steps, num_samples - warmup_steps, num_chains=num_chains)
-        return MCMCProxy(mcmc, True, self._generated_quantities, self._transformed_data, thin)
+        build = functools.partial(
+            numpyro.infer.MCMC, kernel, num_warmup=warmup_steps,
+            num_samples=num_samples - warmup_steps, num_chains=num_chains)
+        mcmc = build(chain_method=chain_method)
+        if mcmc.chain_method == 'sequential' and num_chains > 1:
+            try:
+                # NumPyro has no progress bar for the callable methods
+                mcmc = build(chain_method=SequentialChains(), progress_bar=False)
+            except ValueError:
+                # This version of NumPyro only takes the names of the methods
+                pass
+        return MCMCProxy(mcmc, True, self._generated_quantities, self._transformed_data, thin,
+                         batched_generated_quantities=self._batched_generated_quantities,
+                         seed=seed, model=self)
+
+
+class SequentialChains(object):
+    """`chain_method` of NumPyro running the chains one after the other,
+    as 'sequential' does, and recording the duration of each of them in
+    `durations`. The first one includes the compilation of the sampler."""
+
+    def __init__(self):
+        self.durations = []
+
+    def __call__(self, f):
+        def run(xs):
+            num_chains = jax.tree_util.tree_leaves(xs)[0].shape[0]
+            self.durations = []
+            ys = []
+            for i in range(num_chains):
+                start = time.perf_counter()
+                ys.append(jax.block_until_ready(f(jax.tree_util.tree_map(lambda x: x[i], xs))))
+                self.durations.append(time.perf_counter() - start)
+            return jax.tree_util.tree_map(lambda *y: jnp.stack(y), *ys)
+        return run
+
+
+class ParallelMCMC(object):
+    """Run the chains of `pyro.infer.MCMC` for `model` in a pool of
+    processes, one chain per task, and combine their draws. The workers
+    receive a pickled copy of the model, which is compiled again from its
+    source, and start with the `spawn` method so that they do not inherit
+    the threads of PyTorch. Each worker uses its share of the cores for the
+    operations of PyTorch. It has the interface of `pyro.infer.MCMC` used
+    by `MCMCProxy`."""
+
+    def __init__(self, model, num_samples, warmup_steps=0, num_chains=1, max_workers=None,
+                 seed=None):
+        self.model = model
+        self.num_samples = num_samples
+        self.warmup_steps = warmup_steps
+        self.num_chains = num_chains
+        cores = os.cpu_count() or 1
+        self.max_workers = max_workers or min(num_chains, cores)
+        self.threads = max(1, cores // self.max_workers)
+        self.seed = seed if seed is not None else int(onp.random.randint(2 ** 31 - num_chains))
+        self._samples = None
+        # Duration of each chain in its worker
+        self.durations = []
+
+    def run(self, *args, **kwargs):
+        """Run the chains, collecting the draws of each chain as soon as it
+        completes."""
+        samples = [None] * self.num_chains
+        durations = [None] * self.num_chains
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=self.max_workers, mp_context=context) as pool:
+            futures = {pool.submit(_sample_chain, self.model, self.seed + chain,
+                                   self.num_samples, self.warmup_steps, self.threads,
+                                   args, kwargs): chain
+                       for chain in range(self.num_chains)}
+            for future in as_completed(futures):
+                samples[futures[future]], durations[futures[future]] = future.result()
+        self.durations = durations
+        self._samples = {k: torch.stack([torch.as_tensor(chain[k]) for chain in samples])
+                         for k in samples[0]}
+
+    def get_samples(self, group_by_chain=False):
+        """The draws of all the chains, one after the other, or with a leading
+        chain dimension with `group_by_chain=True`."""
+        if group_by_chain:
+            return dict(self._samples)
+        return {k: v.reshape((-1,) + v.shape[2:]) for k, v in self._samples.items()}
 
 
 class MCMCProxy():
-    def __init__(self, mcmc, numpyro=False, generated_quantities=None, transformed_data=None, thin=1):
+    def __init__(self, mcmc, numpyro=False, generated_quantities=None, transformed_data=None, thin=1,
+                 batched_generated_quantities=None, seed=0, model=None):
         self.mcmc = mcmc
+        # Rebuilt by the processes evaluating the generated quantities
+        self.model = model
         self.transformed_data = transformed_data
         self.generated_quantities = generated_quantities
+        self.batched_generated_quantities = batched_generated_quantities
         self.thin = thin
         self.numpyro = numpyro
         self.args = []
         self.kwargs = {}
+        self.timing = {}
         if numpyro:
-            self.rng_key, _ = jax.random.split(jax.random.PRNGKey(0))
+            self.rng_key = jax.random.PRNGKey(seed)
+            if mcmc.num_chains > 1:
+                # An independent key for each chain
+                self.rng_key = jax.random.split(self.rng_key, mcmc.num_chains)
 
     def run(self, *args, **kwargs):
         self.args = [_convert_to_np(v) for v in args]
         self.kwargs = {k: _convert_to_np(v) for k, v in kwargs.items()}
+        if self.numpyro:
+            # Only JAX arrays can be indexed by the index of a JAX loop
+            self.args = [_convert_to_jnp(v) for v in self.args]
+            self.kwargs = {k: _convert_to_jnp(v) for k, v in self.kwargs.items()}
         if self.transformed_data:
             self.kwargs['transformed_data'] = self.transformed_data(
                 *self.args, **self.kwargs)
+        start = time.perf_counter()
         if self.numpyro:
             self.mcmc.run(self.rng_key, *self.args, **self.kwargs)
+            jax.block_until_ready(self.mcmc.get_samples())
         else:
             args = [_convert_to_tensor(v) for v in self.args]
             kwargs = {k: _convert_to_tensor(v) for k, v in self.kwargs.items()}
             self.mcmc.run(*args, **kwargs)
+        self.timing = self.run_timing(time.perf_counter() - start)
+
+    def run_timing(self, total):
+        """Duration of the last run, in seconds, with the layout of the
+        chains. `per_chain` lists the duration of each chain when it is
+        measured: a single chain, the chains of `ParallelMCMC` in their
+        workers, or the sequential chains of NumPyro."""
+        num_chains = self.mcmc.num_chains
+        timing = {'total': total, 'num_chains': num_chains}
+        chain_method = getattr(self.mcmc, 'chain_method', None)
+        if num_chains == 1:
+            timing['per_chain'] = [total]
+        elif isinstance(self.mcmc, ParallelMCMC):
+            timing['per_chain'] = list(self.mcmc.durations)
+        elif isinstance(chain_method, SequentialChains):
+            timing['per_chain'] = list(chain_method.durations)
+            chain_method = 'sequential'
+        if self.numpyro:
+            timing['chain_method'] = chain_method
+            timing['devices'] = jax.local_device_count()
+        return timing
 
     def sample_model(self):
         if self.numpyro:
@@ -177,30 +405,177 @@ class MCMCProxy():
             samples = self.mcmc.get_samples()
         return {x: samples[x][::self.thin] for x in samples}
 
-    def sample_generated(self, samples):
-        kwargs = self.kwargs
-        res = defaultdict(list)
+    def sample_generated(self, samples, batched=False, chunk_size=None, workers=None,
+                         pool='thread', seed=None):
+        """Evaluate the transformed parameters and the generated quantities
+        for each draw of `samples`. With `batched=True`, they are evaluated
+        for all the draws at once with `jax.vmap` or `torch.vmap` (torch 2.0
+        or later, or functorch), `chunk_size` draws at a time when it is
+        given, to bound the memory used. Programs that cannot be vectorized,
+        like the loops updating arrays in place or the control flow
+        depending on the values, fall back to one call per draw, run by
+        `workers` threads or processes when it is given (see
+        `sample_generated_parallel`). The other errors are raised. The
+        results are stacked into arrays of all the draws."""
+        if batched and self.batched_generated_quantities:
+            reason = self.unbatchable()
+            if reason is None:
+                try:
+                    return self.sample_generated_batched(samples, chunk_size=chunk_size)
+                except Exception as e:
+                    if not self.vmapError(e):
+                        raise
+                    reason = '{}: {}'.format(type(e).__name__, e)
+            warnings.warn('Cannot vectorize the generated quantities ({}), '
+                          'evaluating them draw by draw'.format(reason))
+        if workers is not None:
+            return self.sample_generated_parallel(samples, workers, chunk_size=chunk_size,
+                                                  pool=pool, seed=seed)
+        return _generate(self.generated_quantities, self.args, self.kwargs, samples)
+
+    def sample_generated_parallel(self, samples, workers, chunk_size=None, pool='thread',
+                                  seed=None):
+        """Evaluate the generated quantities draw by draw, by chunks of
+        `chunk_size` draws (one per worker by default) run concurrently by
+        a pool of `workers` threads, or processes with `pool='process'`.
+        The threads share the model, and the NumPy operations release the
+        GIL; the processes compile the model again from its source. The
+        draws keep their order, and the random numbers of the chunk `i`
+        are drawn from a generator seeded with `seed + i`, so that the
+        results do not depend on the scheduling of the chunks."""
+        assert pool in ('thread', 'process'), "The pool is either 'thread' or 'process'"
         num_samples = len(list(samples.values())[0])
-        for i in range(num_samples):
-            kwargs['parameters'] = {x: samples[x][i] for x in samples}
-            d = self.generated_quantities(*self.args, **kwargs)
-            for k, v in d.items():
-                res[k].append(_convert_to_np(v))
+        chunk_size = chunk_size or -(-num_samples // workers)
+        starts = range(0, num_samples, chunk_size)
+        if seed is None:
+            seed = int(onp.random.randint(2 ** 31 - len(starts)))
+        chunks = [{k: v[start:start + chunk_size] for k, v in samples.items()}
+                  for start in starts]
+        res = {}
+        if pool == 'process':
+            context = multiprocessing.get_context('spawn')
+            executor = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+        else:
+            executor = ThreadPoolExecutor(max_workers=workers)
+        with executor:
+            if pool == 'process':
+                futures = [executor.submit(_generate_chunk, self.model, self.args, self.kwargs,
+                                           chunk, seed + i)
+                           for i, chunk in enumerate(chunks)]
+            else:
+                futures = [executor.submit(_generate, _seeded(self.generated_quantities, seed + i),
+                                           self.args, self.kwargs, chunk)
+                           for i, chunk in enumerate(chunks)]
+            for start, future in zip(starts, futures):
+                for k, v in future.result().items():
+                    _stack(res, k, start, v, num_samples)
         return res
 
-    def get_samples(self):
+    def unbatchable(self):
+        """Why the generated quantities cannot be vectorized, as known
+        before evaluating them, or `None`."""
+        if not self.numpyro:
+            try:
+                _torch_vmap()
+            except NotImplementedError as e:
+                return str(e)
+        if utils.inplace_updates(self.batched_generated_quantities.__code__):
+            return 'the loops update arrays in place'
+        return None
+
+    def vmapError(self, e):
+        """The error `e` is raised by `vmap` on an operation it cannot
+        batch: a traced value converted to a python value for JAX, or a
+        batching error of torch, whose messages start with 'vmap'."""
+        if self.numpyro:
+            jax_errors = importlib.import_module('jax.errors')
+            errors = tuple(getattr(jax_errors, name) for name in
+                           ['ConcretizationTypeError', 'TracerArrayConversionError',
+                            'TracerBoolConversionError', 'TracerIntegerConversionError',
+                            'NonConcreteBooleanIndexError']
+                           if hasattr(jax_errors, name))
+            return isinstance(e, errors)
+        return isinstance(e, RuntimeError) and 'vmap' in str(e)
+
+    def sample_generated_batched(self, samples, chunk_size=None):
+        if self.numpyro:
+            vmap = jax.vmap
+        else:
+            vmap = _torch_vmap()
+        args = self.args
+        kwargs = {k: v for k, v in self.kwargs.items() if k != 'parameters'}
+        if self.numpyro:
+            args = [_convert_to_jnp(v) for v in args]
+            kwargs = {k: _convert_to_jnp(v) for k, v in kwargs.items()}
+            samples = {k: jnp.asarray(v) for k, v in samples.items()}
+        else:
+            args = [_convert_to_tensor(v) for v in args]
+            kwargs = {k: _convert_to_tensor(v) for k, v in kwargs.items()}
+            samples = {k: torch.as_tensor(v) for k, v in samples.items()}
+
+        def draw(parameters):
+            return self.batched_generated_quantities(*args, parameters=parameters, **kwargs)
+        res = {}
+        num_samples = len(list(samples.values())[0])
+        chunk_size = chunk_size or num_samples
+        for start in range(0, num_samples, chunk_size):
+            chunk = {k: v[start:start + chunk_size] for k, v in samples.items()}
+            for k, v in vmap(draw)(chunk).items():
+                _stack(res, k, start, _convert_to_np(v), num_samples)
+        return res
+
+    def get_samples(self, batched=False, chunk_size=None, workers=None, pool='thread', seed=None):
         samples = self.sample_model()
         if self.generated_quantities:
-            gen = self.sample_generated(samples)
+            gen = self.sample_generated(samples, batched=batched, chunk_size=chunk_size,
+                                        workers=workers, pool=pool, seed=seed)
             samples.update(gen)
         return {k: _convert_to_np(v) for k, v in samples.items()}
 
+    def sink(self, directory, chunk_size=1000, batched=False, workers=None, pool='thread',
+             seed=None):
+        """Write the thinned draws and their generated quantities to the
+        `.npy` files of `directory`, one per variable, `chunk_size` draws
+        at a time (see `SampleSink`), instead of converting them all in
+        memory like `get_samples`. The draws are sliced chain by chain from
+        the storage of the sampler, and the generated quantities are
+        evaluated chunk by chunk by `sample_generated`, with `batched`,
+        `workers` and `pool`; the random numbers of the chunk starting at
+        the draw `start` are drawn from the seeds following `seed + start`.
+        Return the arrays written, memory-mapped: they can be opened again
+        with `deepppl.sink.load_samples`."""
+        chains = self.mcmc.get_samples(group_by_chain=True)
+        num_chains, length = next(iter(chains.values())).shape[:2]
+        # The draws kept by the thinning of the chains one after the other
+        offsets = [(-chain * length) % self.thin for chain in range(num_chains)]
+        num_draws = sum(len(range(offset, length, self.thin)) for offset in offsets)
+        if seed is None:
+            seed = int(onp.random.randint(2 ** 31 - num_draws))
+        sink = SampleSink(directory, num_draws)
+        start = 0
+        step = chunk_size * self.thin
+        for chain, offset in enumerate(offsets):
+            for begin in range(offset, length, step):
+                chunk = {x: v[chain, begin:begin + step:self.thin] for x, v in chains.items()}
+                if self.generated_quantities:
+                    generated = self.sample_generated(chunk, batched=batched, workers=workers,
+                                                      pool=pool, seed=seed + start)
+                    for k, v in generated.items():
+                        sink.write(k, start, onp.asarray(v))
+                for k, v in chunk.items():
+                    sink.write(k, start, _convert_to_np(v))
+                start += len(next(iter(chunk.values())))
+        sink.close()
+        return sink.arrays()
+
 
 class SVIProxy(object):
-    def __init__(self, svi, generated_quantities=None, transformed_data=None):
+    def __init__(self, svi, generated_quantities=None, transformed_data=None,
+                 subsample_size=None):
         self.svi = svi
         self.transformed_data = transformed_data
         self.generated_quantities = generated_quantities
+        self.subsample_size = subsample_size
         self.args = []
         self.kwargs = {}
 
@@ -214,16 +589,90 @@ class SVIProxy(object):
         self.kwargs = kwargs
         if self.transformed_data:
             self.kwargs['transformed_data'] = self.transformed_data(
-                **self.args, **self.kwargs)
+                *self.args, **self.kwargs)
         args = [_convert_to_tensor(v) for v in self.args]
         kwargs = {k: _convert_to_tensor(v) for k, v in self.kwargs.items()}
+        if self.subsample_size is not None:
+            kwargs['subsample_size'] = self.subsample_size
         return self.svi.step(*args, **kwargs)
 
 
+def _load_model(cls, model_code, module, config, kwargs):
+    if module is not None:
+        return cls.from_module(module, **kwargs)
+    return cls(model_code=model_code, config=config, **kwargs)
+
+
+def _sample_chain(model, seed, num_samples, warmup_steps, threads, args, kwargs):
+    """Run one chain of NUTS for `model` in a worker of `ParallelMCMC`.
+    Return its draws and its duration."""
+    torch.set_num_threads(threads)
+    pyro.set_rng_seed(seed)
+    kernel = pyro.infer.NUTS(model._model, adapt_step_size=True)
+    mcmc = pyro.infer.MCMC(kernel, num_samples, warmup_steps=warmup_steps,
+                           num_chains=1, disable_progbar=True)
+    start = time.perf_counter()
+    mcmc.run(*args, **kwargs)
+    duration = time.perf_counter() - start
+    return {k: v.numpy() for k, v in mcmc.get_samples().items()}, duration
+
+
+def _generate(generated_quantities, args, kwargs, samples):
+    """The generated quantities of each draw of `samples`, stacked."""
+    kwargs = dict(kwargs)
+    res = {}
+    num_samples = len(list(samples.values())[0])
+    for i in range(num_samples):
+        kwargs['parameters'] = {x: samples[x][i] for x in samples}
+        d = generated_quantities(*args, **kwargs)
+        for k, v in d.items():
+            _stack(res, k, i, onp.asarray(_convert_to_np(v))[None], num_samples)
+    return res
+
+
+def _generate_chunk(model, args, kwargs, samples, seed):
+    """Evaluate the generated quantities of a chunk of draws in a worker
+    process of `MCMCProxy.sample_generated_parallel`."""
+    return _generate(_seeded(model._generated_quantities, seed), args, kwargs, samples)
+
+
+def _seeded(f, seed):
+    """The function `f` of the generated code drawing its random numbers
+    from its own generator, seeded with `seed`."""
+    scoped = dict(f.__globals__)
+    scoped['randn'] = onp.random.RandomState(seed).randn
+    return FunctionType(f.__code__, scoped, f.__name__, f.__defaults__)
+
+
+def _torch_vmap():
+    vmap = getattr(torch, 'vmap', None)
+    if vmap is None:
+        try:
+            from functorch import vmap
+        except ImportError:
+            raise NotImplementedError('torch.vmap requires torch 2.0 or functorch')
+    return vmap
+
+
+def _stack(arrays, name, start, values, num_draws):
+    """Store the draws `values` of `name` from the draw `start` on in the
+    array of `arrays` allocated for the `num_draws` draws with the first
+    values stored. The array is converted when the values need a wider
+    type."""
+    values = onp.asarray(values)
+    array = arrays.get(name)
+    if array is None:
+        array = arrays[name] = onp.empty((num_draws,) + values.shape[1:], dtype=values.dtype)
+    elif not onp.can_cast(values.dtype, array.dtype):
+        array = arrays[name] = array.astype(onp.result_type(array, values))
+    array[start:start + len(values)] = values
+
+
 def _convert_to_np(value):
-    if type(value) == torch.Tensor:
+    if torch.is_loaded() and type(value) == torch.Tensor:
         return value.cpu().numpy()
-    if isinstance(value, (list, jnp.ndarray)):
+    if isinstance(value, list) or \
+            (jnp.is_loaded() and isinstance(value, jnp.ndarray)):
         return onp.array(value)
     else:
         return value
@@ -236,3 +685,12 @@ def _convert_to_tensor(value):
         return {k: _convert_to_tensor(v) for k, v in value.items()}
     else:
         return value
+
+
+def _convert_to_jnp(value):
+    if isinstance(value, onp.ndarray):
+        return jnp.asarray(value)
+    elif isinstance(value, dict):
+        return {k: _convert_to_jnp(v) for k, v in value.items()}
+    else:
+        return value
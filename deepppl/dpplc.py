@@ -14,23 +14,76 @@
  * limitations under the License.
 '''
 
+import os
 import sys
 from antlr4 import *
 from antlr4.error.ErrorListener import ErrorListener
+from antlr4.error.ErrorStrategy import BailErrorStrategy, DefaultErrorStrategy
+from antlr4.error.Errors import ParseCancellationException
 from .parser.stanLexer import stanLexer
 from .parser.stanParser import stanParser
 from .translation.stan2ir import StanToIR
 from .translation.ir2python import ir2python
+from .cache import CompilationCache
+from .blocks import program_ir
+from .utils.timing import PhaseTimer, null_timer
 
 import ast
 import astor
-import torch
-import pyro
-import pyro.distributions as dist
 
 class Config(object):
-    def __init__(self, numpyro = False):
+    """Compiler options.
+    `numpyro`: generate code for NumPyro instead of Pyro. The arrays are
+    updated with the functional operations of JAX, and the loops only
+    updating arrays become `jax.lax.fori_loop`, or the `scan` of NumPyro
+    when they also observe values (see `Ir2PythonVisitor.functionalLoop`).
+    `standalone`: generate an importable module that imports the runtime
+    functions it uses (see `PyroModel.from_module`).
+    `parser`: prediction mode of the parser, either 'll' (full context) or
+    'sll', which first tries the faster SLL prediction and only falls
+    back to LL on the programs SLL fails to parse.
+    `incremental`: parse the blocks of the program separately and reuse
+    the IR of the blocks that did not change since a previous compilation
+    in the same process (see `deepppl.blocks`). It is off by default: the
+    IR is kept in memory, which only pays off when the same program is
+    edited and compiled again, e.g. in a notebook or the compile server.
+    `vectorize`: turn the loops of the model observing independent
+    elements, or shifted elements of the data, into a single batched
+    sample statement in a plate.
+    `subsample`: vectorize, and subsample the plates whose size is given
+    by the data, including a plate over the first dimension of the data
+    arrays observed as a whole. The model and the guide then take a
+    `subsample_size` argument (see `PyroModel.svi`).
+    `deterministic`: record the value of the transformed parameters in
+    deterministic sites of the model, which the samplers returning them
+    (NumPyro) give with the parameters instead of recomputing them with
+    the generated quantities. The names of `deterministic_exclude`, like
+    large intermediates, are not recorded: only the statements computing
+    them are evaluated again with the generated quantities.
+    `optimize`: fold the constant expressions, hoist the expressions that
+    do not depend on a loop out of it and compute the repeated
+    expressions only once (see `ConstantFoldingVisitor`,
+    `LoopInvariantVisitor` and `CommonSubexpressionVisitor`). The arrays
+    of zeros or ones whose shape is given by the data are built once with
+    the transformed data, and the default values of the arrays assigned
+    as a whole are not allocated (see `AllocationVisitor`)."""
+    def __init__(self, numpyro = False, standalone = False, parser = 'll',
+                 incremental = False, vectorize = False, subsample = False,
+                 deterministic = False, deterministic_exclude = (), optimize = False):
+        assert parser in ('ll', 'sll'), "Unknown parser mode: {}".format(parser)
         self.numpyro = numpyro
+        self.standalone = standalone
+        self.parser = parser
+        self.incremental = incremental
+        self.vectorize = vectorize
+        self.subsample = subsample
+        self.deterministic = deterministic
+        self.deterministic_exclude = tuple(sorted(deterministic_exclude))
+        self.optimize = optimize
+
+    def key(self):
+        """Hashable description of the options affecting the generated code"""
+        return tuple(sorted(vars(self).items()))
 
 class MyErrorListener(ErrorListener):
     def syntaxError(self, recognizer, offendingSymbol, line, column, msg, e):
@@ -38,57 +91,123 @@ class MyErrorListener(ErrorListener):
               ': Syntax error, ' + str(msg))
         raise SyntaxError
 
-def streamToParsetree(stream):
+def streamToParsetree(stream, config=None, timer=null_timer):
     lexer = stanLexer(stream)
     stream = CommonTokenStream(lexer)
+    with timer.phase('lexing'):
+        stream.fill()
+    with timer.phase('parsing'):
+        return _parse(stream, config)
+
+def _parse(stream, config):
     parser = stanParser(stream)
+    if config is not None and config.parser == 'sll':
+        # Two-stage parsing: SLL is exact on the vast majority of inputs.
+        # When it fails, the input is parsed again with full LL so that
+        # the result (and the syntax errors) are the same as with LL.
+        parser._interp.predictionMode = PredictionMode.SLL
+        parser._errHandler = BailErrorStrategy()
+        parser._listeners = []
+        try:
+            return parser.program()
+        except ParseCancellationException:
+            stream.seek(0)
+            parser.reset()
+            parser._interp.predictionMode = PredictionMode.LL
+            parser._errHandler = DefaultErrorStrategy()
     parser._listeners = [MyErrorListener()]
     tree = parser.program()
     return tree
 
-def parsetreeToIR(tree):
-    toIr = StanToIR()
-    walker = ParseTreeWalker()
-    walker.walk(toIr, tree)
+def parsetreeToIR(tree, timer=null_timer):
+    with timer.phase('StanToIR'):
+        toIr = StanToIR()
+        walker = ParseTreeWalker()
+        walker.walk(toIr, tree)
     return tree.ir
 
-def stan2astpy(stream, config, verbose=False):
-    tree = streamToParsetree(stream)
-    ir = parsetreeToIR(tree)
-    return ir2python(ir, config, verbose=verbose)
+def stan2astpy(stream, config, verbose=False, timer=null_timer):
+    tree = streamToParsetree(stream, config, timer=timer)
+    ir = parsetreeToIR(tree, timer=timer)
+    return ir2python(ir, config, verbose=verbose, timer=timer)
 
-def stan2astpyFile(filename, config, verbose=False):
+def stan2astpyFile(filename, config, verbose=False, timer=null_timer):
     stream = FileStream(filename)
-    return stan2astpy(stream, config, verbose=verbose)
+    return stan2astpy(stream, config, verbose=verbose, timer=timer)
 
-def stan2astpyStr(str, config, verbose=False):
+def stan2astpyStr(str, config, verbose=False, timer=null_timer):
+    if config.incremental:
+        ir = program_ir(str, config, timer=timer)
+        if ir is not None:
+            return ir2python(ir, config, verbose=verbose, timer=timer)
     stream = InputStream(str)
-    return stan2astpy(stream, config, verbose=verbose)
+    return stan2astpy(stream, config, verbose=verbose, timer=timer)
 
-def stan2pystr(str, config, verbose=False):
+def stan2pystr(str, config, verbose=False, timer=null_timer):
     """Return the program's python source code""" 
-    py = stan2astpyStr(str, config, verbose=verbose)
-    return astor.to_source(py)
+    py = stan2astpyStr(str, config, verbose=verbose, timer=timer)
+    with timer.phase('astor'):
+        return astor.to_source(py)
+
+_default_cache = None
+
+def default_cache():
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = CompilationCache()
+    return _default_cache
 
-def do_compile(model_code = None, model_file = None, config=None, verbose=False):
+def do_compile(model_code = None, model_file = None, config=None, verbose=False, cache=None,
+               timer=None):
+    """Compile a Stan program to a python code object.
+    `cache` is either a boolean or a `CompilationCache`. When enabled,
+    programs that were already compiled are loaded from the cache
+    without going through the parser and the translation passes. The
+    cache is disabled by default, unless the environment variable
+    `DEEPPPL_CACHE` is set to 1.
+    `timer` is an optional `PhaseTimer` recording the duration of each
+    compilation phase."""
     if not (model_code or model_file) or (model_code and model_file):
         assert False, "Either code or file but not both must be provided."
     if config is None:
         config = Config()
-    if model_code:
-        ast_ = stan2astpyStr(model_code, config, verbose=verbose)
-    else:
-        ast_ = stan2astpyFile(model_file, config, verbose=verbose)
-    return compile(ast_, "<deepppl_ast>", 'exec')
+    if model_file:
+        with open(model_file) as f:
+            model_code = f.read()
+    if timer is None:
+        timer = null_timer
+    if cache is None:
+        cache = os.environ.get('DEEPPPL_CACHE') == '1'
+    if cache is True:
+        cache = default_cache()
+    if cache:
+        with timer.phase('cache lookup'):
+            key = cache.key(model_code, config, verbose)
+            code = cache.get(key)
+        if code is not None:
+            return code
+    ast_ = stan2astpyStr(model_code, config, verbose=verbose, timer=timer)
+    with timer.phase('compile'):
+        code = compile(ast_, "<deepppl_ast>", 'exec')
+    if cache:
+        with timer.phase('cache store'):
+            cache.put(key, code)
+    return code
 
-def main(file, verbose=False):
-    config = Config()
-    return stan2astpyFile(file, config, verbose=verbose)
+def main(file, verbose=False, config=None, timer=null_timer):
+    if config is None:
+        config = Config()
+    return stan2astpyFile(file, config, verbose=verbose, timer=timer)
 
 
 if __name__ == '__main__':
+    if sys.argv[1:2] == ['batch']:
+        from .batch import main as batch_main
+        sys.exit(batch_main(sys.argv[2:]))
+    if sys.argv[1:2] == ['serve']:
+        from .server import main as serve_main
+        sys.exit(serve_main(sys.argv[2:]))
     import argparse
-    import pandas as pd
     parser = argparse.ArgumentParser(description='DeepPPL compiler')
     parser.add_argument('file', type=str,
                         help='A Stan file to compile')
@@ -98,14 +217,71 @@ if __name__ == '__main__':
                     help='Do not launch inference')
     parser.add_argument('--verbose', action='store_true',
                     help='Output verbose code with shape information')
+    parser.add_argument('--parser', type=str, default='ll', choices=['ll', 'sll'],
+                    help='Parser prediction mode (sll: SLL with LL fallback)')
+    parser.add_argument('--incremental', action='store_true',
+                    help='Reuse the IR of the unchanged blocks of a previous compilation')
+    parser.add_argument('--vectorize', action='store_true',
+                        help='Vectorize the loops over observed sample statements')
+    parser.add_argument('--subsample', action='store_true',
+                        help='Vectorize and subsample the plates over the data')
+    parser.add_argument('--deterministic', action='store_true',
+                        help='Record the transformed parameters in deterministic sites')
+    parser.add_argument('--deterministic-exclude', type=str, nargs='+', default=[],
+                        metavar='NAME', help='Transformed parameters not to record')
+    parser.add_argument('--optimize', action='store_true',
+                        help='Fold constants, hoist loop invariants and share common subexpressions')
+    parser.add_argument('--timings', action='store_true',
+                    help='Print the duration of each compilation phase')
+    parser.add_argument('--profile', action='store_true',
+                    help='Profile each compilation phase with cProfile')
+    parser.add_argument('--profile-output', type=str, default=None, metavar='FILE',
+                    help='Dump the profile statistics to FILE instead of printing them')
+    parser.add_argument('--no-server', action='store_true',
+                    help='Compile in this process even if a compile server is running')
     args = parser.parse_args()
     verbose = False if args.verbose is None else args.verbose
-    ast_ = main(args.file, verbose=verbose)
+    config = Config(parser=args.parser, incremental=args.incremental,
+                    vectorize=args.vectorize,
+                    subsample=args.subsample, deterministic=args.deterministic,
+                    deterministic_exclude=args.deterministic_exclude,
+                    optimize=args.optimize)
+    profile = args.profile or args.profile_output is not None
+    timer = PhaseTimer(profile=profile)
+    response = None
+    if not (args.no_server or profile):
+        from .server import compile_remote
+        with open(args.file) as f:
+            response = compile_remote(f.read(), config, verbose=verbose)
+    if response is not None:
+        for line in response['diagnostics']:
+            print(line)
+        if response['error'] is not None:
+            error = response['error']
+            sys.exit(': '.join(m for m in [error['type'], error['message']] if m))
+        source = response['source']
+        ast_ = ast.parse(source)
+        timer.timings.update(response['timings'])
+        timer.timings.pop('total', None)
+    else:
+        ast_ = main(args.file, verbose=verbose, config=config, timer=timer)
+        if args.print:
+            with timer.phase('astor'):
+                source = astor.to_source(ast_)
     if args.print:
-        print(astor.to_source(ast_))
-    co = compile(ast_, "<ast>", 'exec')
-    eval(co)
+        print(source)
+    if args.timings:
+        print(timer.report(), file=sys.stderr)
+    if args.profile_output is not None:
+        timer.stats().dump_stats(args.profile_output)
+    elif args.profile:
+        print(timer.profile_report(), file=sys.stderr)
     if not args.noinfer:
+        import pandas as pd
+        import torch
+        import pyro
+        co = compile(ast_, "<ast>", 'exec')
+        eval(co)
         x = torch.Tensor([0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 1.0, 0.0, 0.0, 1.0])
         posterior = pyro.infer.Importance(model, num_samples=1000)
         marginal = pyro.infer.EmpiricalMarginal(posterior.run(x), sites='theta')
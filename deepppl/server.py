@@ -0,0 +1,223 @@
+'''
+ * Copyright 2018 IBM Corporation
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ * http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+'''
+
+"""Long-running compile server.
+
+    python -m deepppl.dpplc serve
+
+The server listens on a Unix domain socket, `$DEEPPPL_SOCKET` or
+`dpplc.sock` in the cache directory by default, and keeps the parser and
+the translation passes warm between requests. Requests and responses are
+JSON objects, one per line:
+
+    {"op": "compile", "code": "...", "config": {"numpyro": false}, "verbose": false,
+     "fingerprint": "..."}
+    {"source": "...", "error": null, "diagnostics": [], "timings": {...}}
+
+where `error` is `null` or `{"type": ..., "message": ...}` and
+`diagnostics` are the messages printed by the compiler. The optional
+`fingerprint` is the `compiler_fingerprint()` of the client: a server
+started before the compiler was upgraded or edited rejects the request
+with a `StaleServer` error and stops, and `dpplc` compiles in process.
+The other operations are `ping` and `shutdown`.
+"""
+
+import io
+import os
+import json
+import socket
+import socketserver
+import threading
+import time
+from contextlib import redirect_stdout
+
+from . import dpplc
+from .cache import compiler_fingerprint, default_cache_dir
+from .utils.timing import PhaseTimer
+
+# Seconds to wait for a translation before compiling in process
+compile_timeout = 30
+
+warmup_program = '''
+parameters {
+  real mu;
+}
+model {
+  mu ~ normal(0, 1);
+}
+'''
+
+
+def default_socket_path():
+    return os.environ.get('DEEPPPL_SOCKET') or \
+        os.path.join(default_cache_dir(), 'dpplc.sock')
+
+
+def compile_request(request):
+    """Translate the program of `request` and return the response."""
+    start = time.perf_counter()
+    timer = PhaseTimer()
+    out = io.StringIO()
+    source = None
+    error = None
+    try:
+        config = dpplc.Config(**request.get('config', {}))
+        with redirect_stdout(out):
+            source = dpplc.stan2pystr(request['code'], config,
+                                      verbose=request.get('verbose', False),
+                                      timer=timer)
+    except Exception as e:
+        error = {'type': type(e).__name__, 'message': str(e) if e.args else ''}
+    timings = dict(timer.timings, total=time.perf_counter() - start)
+    return {'source': source,
+            'error': error,
+            'diagnostics': out.getvalue().splitlines(),
+            'timings': timings}
+
+
+class CompileHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line.decode())
+            except ValueError as e:
+                self.reply({'error': {'type': 'ValueError', 'message': str(e)}})
+                continue
+            op = request.get('op', 'compile')
+            if op == 'ping':
+                self.reply({'pong': os.getpid()})
+            elif op == 'shutdown':
+                self.reply({'shutdown': True})
+                threading.Thread(target=self.server.shutdown).start()
+                return
+            elif op == 'compile' and request.get('fingerprint') not in \
+                    (None, self.server.fingerprint):
+                self.reply({'error': {'type': 'StaleServer',
+                                      'message': 'The compiler has changed since '
+                                                 'the server started'}})
+                threading.Thread(target=self.server.shutdown).start()
+                return
+            elif op == 'compile':
+                # The compiler prints its diagnostics on stdout, which is
+                # redirected per request: compilations run one at a time.
+                with self.server.lock:
+                    self.reply(compile_request(request))
+            else:
+                self.reply({'error': {'type': 'ValueError',
+                                      'message': 'Unknown operation: {}'.format(op)}})
+
+    def reply(self, response):
+        self.wfile.write(json.dumps(response).encode() + b'\n')
+        self.wfile.flush()
+
+
+class CompileServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path):
+        self.lock = threading.Lock()
+        # The compiler loaded by the server
+        self.fingerprint = compiler_fingerprint()
+        socketserver.UnixStreamServer.__init__(self, path, CompileHandler)
+
+
+def serve(path=None, warmup=True):
+    """Run the compile server on the Unix socket `path` until it receives
+    a `shutdown` request."""
+    path = path or default_socket_path()
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    if os.path.exists(path):
+        if ping(path):
+            raise RuntimeError('A server is already listening on ' + path)
+        os.remove(path)
+    if warmup:
+        compile_request({'code': warmup_program})
+    server = CompileServer(path)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def request(message, path=None, timeout=None):
+    """Send `message` to the server and return its response, or `None` if
+    no server is listening on `path` or if it does not answer within
+    `timeout` seconds."""
+    path = path or default_socket_path()
+    if not hasattr(socket, 'AF_UNIX') or not os.path.exists(path):
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(path)
+    except OSError:
+        sock.close()
+        return None
+    try:
+        with sock, sock.makefile('rwb') as f:
+            f.write(json.dumps(message).encode() + b'\n')
+            f.flush()
+            line = f.readline()
+    except OSError:
+        return None
+    return json.loads(line.decode()) if line else None
+
+
+def ping(path=None):
+    return request({'op': 'ping'}, path=path, timeout=1) is not None
+
+
+def shutdown(path=None):
+    return request({'op': 'shutdown'}, path=path, timeout=1) is not None
+
+
+def compile_remote(code, config=None, verbose=False, path=None, timeout=None):
+    """Translate `code` with the server. Return the response, or `None`
+    if no server is running, if it does not answer within `timeout`
+    seconds (`compile_timeout` by default) or if it runs another version
+    of the compiler."""
+    if config is None:
+        config = dpplc.Config()
+    response = request({'op': 'compile',
+                        'code': code,
+                        'config': vars(config),
+                        'verbose': verbose,
+                        'fingerprint': compiler_fingerprint()},
+                       path=path, timeout=compile_timeout if timeout is None else timeout)
+    if response is not None and (response.get('error') or {}).get('type') == 'StaleServer':
+        return None
+    return response
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(prog='dpplc serve',
+                                     description='Run the DeepPPL compile server')
+    parser.add_argument('--socket', type=str, default=None,
+                        help='Path of the Unix socket (default: {})'.format(
+                            default_socket_path()))
+    parser.add_argument('--stop', action='store_true',
+                        help='Stop the running server')
+    args = parser.parse_args(argv)
+    if args.stop:
+        return 0 if shutdown(args.socket) else 1
+    serve(args.socket)
+    return 0
@@ -0,0 +1,64 @@
+'''
+ * Copyright 2018 IBM Corporation
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ * http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+'''
+
+import os
+
+import numpy as np
+from numpy.lib.format import open_memmap
+
+
+class SampleSink(object):
+    """Draws of the variables of a model written chunk by chunk to a
+    directory, as one `.npy` file per variable holding `num_draws` draws.
+    A file is created with the shape and the type of the first chunk of
+    its variable, and the chunks are flushed to disk as they are written,
+    so that only one chunk is held in memory at a time."""
+
+    def __init__(self, directory, num_draws):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.num_draws = num_draws
+        self.names = []
+        self._files = {}
+
+    def path(self, name):
+        return os.path.join(self.directory, name + '.npy')
+
+    def write(self, name, start, values):
+        """Write the draws `values` of `name` from the draw `start` on."""
+        values = np.asarray(values)
+        f = self._files.get(name)
+        if f is None:
+            f = open_memmap(self.path(name), mode='w+', dtype=values.dtype,
+                            shape=(self.num_draws,) + values.shape[1:])
+            self._files[name] = f
+            self.names.append(name)
+        f[start:start + len(values)] = values
+        f.flush()
+
+    def close(self):
+        self._files.clear()
+
+    def arrays(self):
+        """The arrays written, memory-mapped read-only."""
+        return {name: np.load(self.path(name), mmap_mode='r') for name in self.names}
+
+
+def load_samples(directory):
+    """The arrays written by a `SampleSink` to `directory`, memory-mapped
+    read-only."""
+    return {name[:-len('.npy')]: np.load(os.path.join(directory, name), mmap_mode='r')
+            for name in sorted(os.listdir(directory)) if name.endswith('.npy')}
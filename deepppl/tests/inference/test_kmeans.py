@@ -15,8 +15,7 @@ def test_kmeans():
     t_kmeans = MCMCTest(
         name='kmeans',
         model_file='deepppl/tests/good/kmeans.stan',
-        data=data,
-        with_numpyro=False # In place mutation not supported in Numpyro
+        data=data
     )
     
     return t_kmeans.run()
@@ -12,10 +12,10 @@ def model(N=None, mu_loc=None, mu_scale=None, s=None, tau_df=None,
     tau = sample('tau', ImproperUniform())
     theta = zeros(N)
     theta = tau * theta_raw + mu
-    sample('mu' + '__1', dist.Normal(mu_loc, mu_scale), obs=mu)
-    sample('tau' + '__2', dist.StudentT(tau_df, 0.0, tau_scale), obs=tau)
-    sample('theta_raw' + '__3', dist.Normal(zeros(N), 1.0), obs=theta_raw)
-    sample('y' + '__4', dist.Normal(theta, s), obs=y)
+    sample('mu__1', dist.Normal(mu_loc, mu_scale), obs=mu)
+    sample('tau__2', dist.StudentT(tau_df, 0.0, tau_scale), obs=tau)
+    sample('theta_raw__3', dist.Normal(zeros(N), 1.0), obs=theta_raw)
+    sample('y__4', dist.Normal(theta, s), obs=y)
 
 
 def generated_quantities(N=None, mu_loc=None, mu_scale=None, s=None, tau_df
@@ -37,13 +37,13 @@ def model(img=None, label=None):
     mlp = prior_mlp(img, label)
     model_mlp = dict(mlp.named_parameters())
     logits = zeros(10)
-    sample('model_mlp' + '__{}'.format('l1.weight') + '__1', dist.
+    sample('model_mlp__l1.weight__1', dist.
         Normal(0, 1), obs=model_mlp['l1.weight'])
-    sample('model_mlp' + '__{}'.format('l1.bias') + '__2', dist.Normal
+    sample('model_mlp__l1.bias__2', dist.Normal
         (0, 1), obs=model_mlp['l1.bias'])
-    sample('model_mlp' + '__{}'.format('l2.weight') + '__3', dist.
+    sample('model_mlp__l2.weight__3', dist.
         Normal(0, 1), obs=model_mlp['l2.weight'])
-    sample('model_mlp' + '__{}'.format('l2.bias') + '__4', dist.Normal
+    sample('model_mlp__l2.bias__4', dist.Normal
         (0, 1), obs=model_mlp['l2.bias'])
     logits = mlp(img)
-    sample('label' + '__5', categorical_logits(logits), obs=label)
+    sample('label__5', categorical_logits(logits), obs=label)
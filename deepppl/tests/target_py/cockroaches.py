@@ -19,13 +19,13 @@ def model(N=None, exposure2=None, roach1=None, senior=None, treatment=None,
     log_expo = transformed_data['log_expo']
     sqrt_roach = transformed_data['sqrt_roach']
     beta = sample('beta', ImproperUniform(shape=4))
-    sample('beta' + '__{}'.format(1 - 1) + '__1', dist.Normal(0, 5), obs=
+    sample('beta__0__1', dist.Normal(0, 5), obs=
         beta[1 - 1])
-    sample('beta' + '__{}'.format(2 - 1) + '__2', dist.Normal(0, 2.5), obs=
+    sample('beta__1__2', dist.Normal(0, 2.5), obs=
         beta[2 - 1])
-    sample('beta' + '__{}'.format(3 - 1) + '__3', dist.Normal(0, 2.5), obs=
+    sample('beta__2__3', dist.Normal(0, 2.5), obs=
         beta[3 - 1])
-    sample('beta' + '__{}'.format(4 - 1) + '__4', dist.Normal(0, 2.5), obs=
+    sample('beta__3__4', dist.Normal(0, 2.5), obs=
         beta[4 - 1])
-    sample('y' + '__5', poisson_log(log_expo + beta[1 - 1] + beta[2 - 1] *
+    sample('y__5', poisson_log(log_expo + beta[1 - 1] + beta[2 - 1] *
         sqrt_roach + beta[3 - 1] * treatment + beta[4 - 1] * senior), obs=y)
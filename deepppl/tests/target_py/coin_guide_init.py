@@ -13,7 +13,7 @@ def guide_(x: 'int[10]'=None):
 
 def model(x: 'int[10]'=None):
     theta: 'real' = sample('theta', dist.Uniform(0.0, 1.0))
-    sample('theta' + '__1', dist.Beta(10.0, 10.0), obs=theta)
+    sample('theta__1', dist.Beta(10.0, 10.0), obs=theta)
     for i in range(1, 10 + 1):
-        sample('x' + '__{}'.format(i - 1) + '__2', dist.Bernoulli(theta),
+        sample(site_names['x__{}__2', i - 1], dist.Bernoulli(theta),
             obs=x[i - 1])
@@ -20,7 +20,7 @@ def model(x=None, transformed_data=None):
     ___shape['x'] = 10
     ___shape['theta'] = ()
     theta = sample('theta', dist.Uniform(0.0, 1.0))
-    sample('theta' + '__1', dist.Uniform(0, 1), obs=theta)
+    sample('theta__1', dist.Uniform(0, 1), obs=theta)
     for i in range(1, 10 + 1):
-        sample('y' + '__{}'.format(i - 1) + '__2', dist.Bernoulli(theta),
+        sample(site_names['y__{}__2', i - 1], dist.Bernoulli(theta),
             obs=y[i - 1])
@@ -7,4 +7,4 @@ import pyro.distributions as dist
 
 def model():
     theta: 'real' = sample('theta', ImproperUniform())
-    sample('theta' + '__1', dist.Normal(1000.0, 1.0), obs=theta)
+    sample('theta__1', dist.Normal(1000.0, 1.0), obs=theta)
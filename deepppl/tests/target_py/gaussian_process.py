@@ -28,4 +28,4 @@ def model(N=None, x=None, transformed_data=None):
     ___shape['x'] = N
     ___shape['y'] = N
     y = sample('y', ImproperUniform(N))
-    sample('y' + '__1', dist.MultivariateNormal(mu, K), obs=y)
+    sample('y__1', dist.MultivariateNormal(mu, K), obs=y)
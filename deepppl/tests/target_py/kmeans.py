@@ -19,10 +19,10 @@ def model(D=None, K=None, N=None, y=None, transformed_data=None):
             soft_z[n - 1, k - 1] = neg_log_K - 0.5 * dot_self(mu[k - 1] - y
                 [n - 1])
     for k in range(1, K + 1):
-        sample('mu' + '__{}'.format(k - 1) + '__1', dist.Normal(zeros(D), 1
+        sample(site_names['mu__{}__1', k - 1], dist.Normal(zeros(D), 1
             ), obs=mu[k - 1])
     for n in range(1, N + 1):
-        sample('expr' + '__{}'.format(n) + '__2', dist.Exponential(1.0),
+        sample(site_names['expr__{}__2', n], dist.Exponential(1.0),
             obs=-log_sum_exp(soft_z[n - 1]))
 
 
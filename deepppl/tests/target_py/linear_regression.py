@@ -9,4 +9,4 @@ def model(N: 'int'=None, x: 'real[N]'=None, y: 'real[N]'=None):
     alpha: 'real' = sample('alpha', ImproperUniform())
     beta: 'real' = sample('beta', ImproperUniform())
     sigma: 'real' = sample('sigma', LowerConstrainedImproperUniform(0.0))
-    sample('y' + '__1', dist.Normal(alpha + beta * x, sigma), obs=y)
+    sample('y__1', dist.Normal(alpha + beta * x, sigma), obs=y)
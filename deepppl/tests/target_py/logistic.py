@@ -14,8 +14,8 @@ def model(M=None, N=None, x=None, y=None):
     ___shape['beta'] = M
     beta = sample('beta', ImproperUniform(M))
     for m in range(1, M + 1):
-        sample('beta' + '__{}'.format(m - 1) + '__1', dist.Cauchy(0.0, 2.5
+        sample(site_names['beta__{}__1', m - 1], dist.Cauchy(0.0, 2.5
             ), obs=beta[m - 1])
     for n in range(1, N + 1):
-        sample('y' + '__{}'.format(n - 1) + '__2', dist.Bernoulli(
+        sample(site_names['y__{}__2', n - 1], dist.Bernoulli(
             inv_logit(x[n - 1] * beta)), obs=y[n - 1])
@@ -21,9 +21,9 @@ def guide_():
 def model():
     cluster = sample('cluster', ImproperUniform())
     theta = sample('theta', ImproperUniform())
-    sample('cluster' + '__1', dist.Normal(0, 1), obs=cluster)
+    sample('cluster__1', dist.Normal(0, 1), obs=cluster)
     if cluster > 0:
         mu = 2
     else:
         mu = 0
-    sample('theta' + '__2', dist.Normal(mu, 1), obs=theta)
+    sample('theta__2', dist.Normal(mu, 1), obs=theta)
@@ -10,8 +10,8 @@ def model():
     x_std: 'real' = sample('x_std', ImproperUniform())
     y: 'real' = 3.0 * y_std
     x: 'real' = exp(y / 2) * x_std
-    sample('y_std' + '__1', dist.Normal(0, 1), obs=y_std)
-    sample('x_std' + '__2', dist.Normal(0, 1), obs=x_std)
+    sample('y_std__1', dist.Normal(0, 1), obs=y_std)
+    sample('x_std__2', dist.Normal(0, 1), obs=x_std)
 
 
 def generated_quantities(parameters=None):
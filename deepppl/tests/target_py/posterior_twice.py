@@ -7,5 +7,5 @@ import pyro.distributions as dist
 
 def model():
     theta = sample('theta', ImproperUniform())
-    sample('theta' + '__1', dist.Normal(1000.0, 1.0), obs=theta)
-    sample('theta' + '__2', dist.Normal(1000.0, 1.0), obs=theta)
+    sample('theta__1', dist.Normal(1000.0, 1.0), obs=theta)
+    sample('theta__2', dist.Normal(1000.0, 1.0), obs=theta)
@@ -17,4 +17,4 @@ def model(K=None, N=None, x=None, y=None):
     alpha = sample('alpha', ImproperUniform())
     beta = sample('beta', ImproperUniform(K))
     sigma = sample('sigma', LowerConstrainedImproperUniform(0.0))
-    sample('y' + '__1', dist.Normal(x * beta + alpha, sigma), obs=y)
+    sample('y__1', dist.Normal(x * beta + alpha, sigma), obs=y)
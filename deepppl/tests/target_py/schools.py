@@ -12,11 +12,11 @@ def model(N=None, sigma_y=None, y=None):
     xi = sample('xi', ImproperUniform())
     theta = zeros(N)
     theta = mu_theta + xi * eta
-    sample('mu_theta' + '__1', dist.Normal(0, 100), obs=mu_theta)
-    sample('sigma_eta' + '__2', dist.InverseGamma(1, 1), obs=sigma_eta)
-    sample('eta' + '__3', dist.Normal(zeros(N), sigma_eta), obs=eta)
-    sample('xi' + '__4', dist.Normal(0, 5), obs=xi)
-    sample('y' + '__5', dist.Normal(theta, sigma_y), obs=y)
+    sample('mu_theta__1', dist.Normal(0, 100), obs=mu_theta)
+    sample('sigma_eta__2', dist.InverseGamma(1, 1), obs=sigma_eta)
+    sample('eta__3', dist.Normal(zeros(N), sigma_eta), obs=eta)
+    sample('xi__4', dist.Normal(0, 5), obs=xi)
+    sample('y__5', dist.Normal(theta, sigma_y), obs=y)
 
 
 def generated_quantities(N=None, sigma_y=None, y=None, parameters=None):
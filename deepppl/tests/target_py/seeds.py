@@ -20,13 +20,13 @@ def model(I=None, N=None, n=None, x1=None, x2=None, transformed_data=None):
     tau = sample('tau', LowerConstrainedImproperUniform(0.0))
     b = sample('b', ImproperUniform(shape=I))
     sigma = 1.0 / sqrt(tau)
-    sample('alpha0' + '__1', dist.Normal(0.0, 1000), obs=alpha0)
-    sample('alpha1' + '__2', dist.Normal(0.0, 1000), obs=alpha1)
-    sample('alpha2' + '__3', dist.Normal(0.0, 1000), obs=alpha2)
-    sample('alpha12' + '__4', dist.Normal(0.0, 1000), obs=alpha12)
-    sample('tau' + '__5', dist.Gamma(0.001, 0.001), obs=tau)
-    sample('b' + '__6', dist.Normal(zeros(I), sigma), obs=b)
-    sample('n' + '__7', binomial_logit(N, alpha0 + alpha1 * x1 + alpha2 *
+    sample('alpha0__1', dist.Normal(0.0, 1000), obs=alpha0)
+    sample('alpha1__2', dist.Normal(0.0, 1000), obs=alpha1)
+    sample('alpha2__3', dist.Normal(0.0, 1000), obs=alpha2)
+    sample('alpha12__4', dist.Normal(0.0, 1000), obs=alpha12)
+    sample('tau__5', dist.Gamma(0.001, 0.001), obs=tau)
+    sample('b__6', dist.Normal(zeros(I), sigma), obs=b)
+    sample('n__7', binomial_logit(N, alpha0 + alpha1 * x1 + alpha2 *
         x2 + alpha12 * x1x2 + b), obs=n)
 
 
@@ -15,7 +15,7 @@ def model(K=None, N=None, x=None, y=None):
     beta = sample('beta', ImproperUniform(K))
     ___shape['squared_error'] = ()
     squared_error = dot_self(y - x * beta)
-    sample('expr' + '__1', dist.Exponential(1.0), obs=--squared_error)
+    sample('expr__1', dist.Exponential(1.0), obs=--squared_error)
 
 def generated_quantities(K=None, N=None, x=None, y=None, parameters=None):
     beta = parameters['beta']
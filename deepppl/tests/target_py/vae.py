@@ -15,6 +15,6 @@ def model(nz=None, x=None):
     pyro.module('decoder', decoder)
     z = sample('z', ImproperUniform(shape=nz))
     mu = zeros((28, 28))
-    sample(('z' + '__1'), dist.Normal(zeros(nz), 1), obs=z)
+    sample(('z__1'), dist.Normal(zeros(nz), 1), obs=z)
     mu = decoder(z)
-    sample(('x' + '__2'), dist.Bernoulli(mu), obs=x)
+    sample(('x__2'), dist.Bernoulli(mu), obs=x)
@@ -17,7 +17,7 @@ def model(x=None):
     pyro.module('decoder', decoder)
     z = sample('z', ImproperUniform(shape=encoder(x)[1].size()))
     mu = zeros((28, 28))
-    sample('z' + '__1', dist.Normal(zeros(encoder(x)[1].size()), 1), obs=z
+    sample('z__1', dist.Normal(zeros(encoder(x)[1].size()), 1), obs=z
         )
     mu = decoder(z)
-    sample('x' + '__2', dist.Bernoulli(mu), obs=x)
+    sample('x__2', dist.Bernoulli(mu), obs=x)
@@ -13,4 +13,4 @@ def model(K=None, N=None, x=None, y=None):
     ___shape['y'] = N
     ___shape['beta'] = K
     beta = sample('beta', ImproperUniform(K))
-    sample('y' + '__1', dist.Normal(x * beta, 1), obs=y)
+    sample('y__1', dist.Normal(x * beta, 1), obs=y)
@@ -0,0 +1,78 @@
+# /*
+#  * Copyright 2018 IBM Corporation
+#  *
+#  * Licensed under the Apache License, Version 2.0 (the "License");
+#  * you may not use this file except in compliance with the License.
+#  * You may obtain a copy of the License at
+#  *
+#  * http://www.apache.org/licenses/LICENSE-2.0
+#  *
+#  * Unless required by applicable law or agreed to in writing, software
+#  * distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+# */
+
+from deepppl import dpplc
+from deepppl.batch import batch_compile
+
+import shutil
+import pytest
+
+
+def sources(tmp_path):
+    src = tmp_path / 'src'
+    (src / 'sub').mkdir(parents=True)
+    shutil.copy('deepppl/tests/good/coin.stan', str(src))
+    shutil.copy('deepppl/tests/good/gaussian.stan', str(src / 'sub'))
+    shutil.copy('deepppl/tests/good/coin_unknown_distribution.stan', str(src))
+    return src
+
+
+@pytest.mark.parametrize('jobs', [1, 2])
+def test_batch_compile(tmp_path, jobs):
+    src = sources(tmp_path)
+    out = tmp_path / 'out'
+    manifest = batch_compile([str(src)], str(out), jobs=jobs)
+    assert set(manifest) == {'coin.py', 'sub/gaussian.py', 'coin_unknown_distribution.py'}
+    assert manifest['coin.py']['error'] is None
+    assert manifest['coin.py']['backend'] == 'pyro'
+    assert (out / 'sub' / 'gaussian.py').exists()
+    assert 'UnknownDistributionException' in manifest['coin_unknown_distribution.py']['error']
+    assert not (out / 'coin_unknown_distribution.py').exists()
+
+
+def test_batch_compile_incremental(tmp_path):
+    src = sources(tmp_path)
+    out = tmp_path / 'out'
+    batch_compile([str(src)], str(out), jobs=1)
+    with open(str(src / 'coin.stan'), 'a') as f:
+        f.write('\n')
+    manifest = batch_compile([str(src)], str(out), jobs=1)
+    assert not manifest['coin.py']['skipped']
+    assert manifest['sub/gaussian.py']['skipped']
+    # Errors are retried
+    assert not manifest['coin_unknown_distribution.py']['skipped']
+
+
+@pytest.mark.parametrize('config', [dpplc.Config(parser='sll'),
+                                    dpplc.Config(incremental=not dpplc.Config().incremental)])
+def test_batch_compile_options(tmp_path, config):
+    src = sources(tmp_path)
+    out = tmp_path / 'out'
+    batch_compile([str(src)], str(out), jobs=1)
+    manifest = batch_compile([str(src)], str(out), config=config, jobs=1)
+    assert not manifest['coin.py']['skipped']
+
+
+def test_batch_compile_stale_output(tmp_path):
+    src = sources(tmp_path)
+    out = tmp_path / 'out'
+    batch_compile([str(src)], str(out), jobs=1)
+    assert (out / 'coin.py').exists()
+    with open(str(src / 'coin.stan'), 'a') as f:
+        f.write('\nsyntax error')
+    manifest = batch_compile([str(src)], str(out), jobs=1)
+    assert manifest['coin.py']['error'] is not None
+    assert not (out / 'coin.py').exists()
@@ -0,0 +1,83 @@
+# /*
+#  * Copyright 2018 IBM Corporation
+#  *
+#  * Licensed under the Apache License, Version 2.0 (the "License");
+#  * you may not use this file except in compliance with the License.
+#  * You may obtain a copy of the License at
+#  *
+#  * http://www.apache.org/licenses/LICENSE-2.0
+#  *
+#  * Unless required by applicable law or agreed to in writing, software
+#  * distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+# */
+
+from deepppl import dpplc, blocks
+from deepppl.cache import ModelCache
+
+import glob
+import pytest
+
+sources = sorted(glob.glob('deepppl/tests/good/*.stan'))
+
+
+def translate(code, incremental):
+    try:
+        return dpplc.stan2pystr(code, dpplc.Config(incremental=incremental))
+    except Exception as e:
+        return type(e)
+
+
+@pytest.mark.parametrize('source', sources)
+def test_incremental_same_translation(source):
+    with open(source) as f:
+        code = f.read()
+    full = translate(code, False)
+    assert translate(code, True) == full
+    # The second translation reuses the IR of the blocks
+    assert translate(code, True) == full
+
+
+def test_scan_blocks():
+    code = '''
+    data { int N; } // comment with { brace
+    /* model { } */
+    parameters { real<lower=0> z[N]; }
+    model { for (i in 1:N) { z[i] ~ normal(0, 1); } }
+    '''
+    names = [name for name, _, _ in blocks.scan_blocks(code)]
+    assert names == ['data', 'parameters', 'model']
+    assert blocks.scan_blocks('model { } data { }') is None
+    assert blocks.scan_blocks('model { ') is None
+
+
+def test_only_modified_blocks_are_parsed(monkeypatch):
+    cache = ModelCache()
+    monkeypatch.setattr(blocks, 'block_cache', cache)
+    with open('deepppl/tests/good/coin.stan') as f:
+        code = f.read()
+    config = dpplc.Config(incremental=True)
+    dpplc.stan2pystr(code, config)
+    assert cache.info().misses == 3
+    edited = code + '\ngenerated quantities {\n  real y;\n  y = z + 1;\n}\n'
+    assert dpplc.stan2pystr(edited, config) == \
+        dpplc.stan2pystr(edited, dpplc.Config(incremental=False))
+    info = cache.info()
+    assert (info.hits, info.misses) == (3, 4)
+
+
+def test_networks_blocks_parsed_together():
+    with open('deepppl/tests/good/mlp.stan') as f:
+        code = f.read()
+    names = [names for names, _, _ in blocks.units(blocks.scan_blocks(code))]
+    assert names[0] == ('networks', 'data', 'parameters')
+
+
+def test_incremental_opt_in(monkeypatch):
+    cache = ModelCache()
+    monkeypatch.setattr(blocks, 'block_cache', cache)
+    with open('deepppl/tests/good/coin.stan') as f:
+        dpplc.stan2pystr(f.read(), dpplc.Config())
+    assert cache.info().misses == 0
@@ -0,0 +1,129 @@
+# /*
+#  * Copyright 2018 IBM Corporation
+#  *
+#  * Licensed under the Apache License, Version 2.0 (the "License");
+#  * you may not use this file except in compliance with the License.
+#  * You may obtain a copy of the License at
+#  *
+#  * http://www.apache.org/licenses/LICENSE-2.0
+#  *
+#  * Unless required by applicable law or agreed to in writing, software
+#  * distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+# */
+
+from deepppl import dpplc, dppl, PyroModel
+from deepppl import cache as cache_module
+from deepppl.cache import CompilationCache, ModelCache
+
+import pytest
+
+coin = 'deepppl/tests/good/coin.stan'
+
+
+def test_disk_cache_hit(tmp_path, monkeypatch):
+    cache = CompilationCache(str(tmp_path))
+    code = dpplc.do_compile(model_file=coin, cache=cache)
+
+    def fail(*args, **kwargs):
+        assert False, "The parser should not run on a cache hit"
+    monkeypatch.setattr(dpplc, 'stan2astpyStr', fail)
+    cached = dpplc.do_compile(model_file=coin, cache=cache)
+    assert cached == code
+
+
+def test_disk_cache_key(tmp_path):
+    cache = CompilationCache(str(tmp_path))
+    with open(coin) as f:
+        source = f.read()
+    pyro = cache.key(source, dpplc.Config())
+    assert pyro == cache.key(source, dpplc.Config())
+    assert pyro != cache.key(source, dpplc.Config(numpyro=True))
+    assert pyro != cache.key(source, dpplc.Config(), verbose=True)
+    assert pyro != cache.key(source + '\n', dpplc.Config())
+
+
+def test_disk_cache_corrupted_entry(tmp_path):
+    cache = CompilationCache(str(tmp_path))
+    with open(coin) as f:
+        source = f.read()
+    key = cache.key(source, dpplc.Config())
+    dpplc.do_compile(model_code=source, cache=cache)
+    with open(cache._path(key), 'wb') as f:
+        f.write(b'garbage')
+    assert cache.get(key) is None
+    assert dpplc.do_compile(model_code=source, cache=cache) is not None
+
+
+def test_disk_cache_opt_in(tmp_path, monkeypatch):
+    cache = CompilationCache(str(tmp_path))
+    monkeypatch.setattr(dpplc, '_default_cache', cache)
+    monkeypatch.delenv('DEEPPPL_CACHE', raising=False)
+    dpplc.do_compile(model_file=coin)
+    assert not list(tmp_path.iterdir())
+    monkeypatch.setenv('DEEPPPL_CACHE', '1')
+    dpplc.do_compile(model_file=coin)
+    assert list(tmp_path.iterdir())
+
+
+def test_fingerprint_content(tmp_path, monkeypatch):
+    for name in ['dpplc.py', 'version.py']:
+        (tmp_path / name).write_text('x = 1\n')
+    monkeypatch.setattr(cache_module, '_package_dir', str(tmp_path))
+    cache_module.compiler_fingerprint.cache_clear()
+    try:
+        fingerprint = cache_module.compiler_fingerprint()
+        # Touching a file keeps the fingerprint, editing it changes it
+        (tmp_path / 'dpplc.py').write_text('x = 1\n')
+        cache_module.compiler_fingerprint.cache_clear()
+        assert cache_module.compiler_fingerprint() == fingerprint
+        (tmp_path / 'dpplc.py').write_text('x = 2\n')
+        cache_module.compiler_fingerprint.cache_clear()
+        assert cache_module.compiler_fingerprint() != fingerprint
+    finally:
+        cache_module.compiler_fingerprint.cache_clear()
+
+
+@pytest.mark.parametrize('name', ['blocks.py', 'utils/utils.py', 'translation/ir.py'])
+def test_fingerprint_modules(tmp_path, monkeypatch, name):
+    # Every module of the package feeds the fingerprint, but the tests
+    for path in [name, 'tests/test_x.py']:
+        (tmp_path / path).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / path).write_text('x = 1\n')
+    monkeypatch.setattr(cache_module, '_package_dir', str(tmp_path))
+    cache_module.compiler_fingerprint.cache_clear()
+    try:
+        fingerprint = cache_module.compiler_fingerprint()
+        (tmp_path / 'tests/test_x.py').write_text('x = 2\n')
+        cache_module.compiler_fingerprint.cache_clear()
+        assert cache_module.compiler_fingerprint() == fingerprint
+        (tmp_path / name).write_text('x = 2\n')
+        cache_module.compiler_fingerprint.cache_clear()
+        assert cache_module.compiler_fingerprint() != fingerprint
+    finally:
+        cache_module.compiler_fingerprint.cache_clear()
+
+
+def test_model_cache_lru():
+    cache = ModelCache(maxsize=2)
+    assert cache.get('a', lambda: 1) == 1
+    assert cache.get('b', lambda: 2) == 2
+    assert cache.get('a', lambda: 3) == 1
+    assert cache.get('c', lambda: 4) == 4
+    # 'b' is the least recently used entry
+    assert cache.get('b', lambda: 5) == 5
+    info = cache.info()
+    assert (info.hits, info.misses, info.evictions, info.currsize) == (1, 4, 2, 2)
+
+
+def test_model_shared_between_instances(monkeypatch):
+    monkeypatch.setattr(dppl, 'compiled_models', ModelCache())
+    m1 = PyroModel(model_file=coin)
+    m2 = PyroModel(model_file=coin)
+    info = dppl.compiled_models.info()
+    assert (info.hits, info.misses) == (1, 1)
+    assert m1._py is m2._py
+    assert m1._model is not m2._model
+    assert m1._model.__code__ is m2._model.__code__
@@ -0,0 +1,143 @@
+# /*
+#  * Copyright 2018 IBM Corporation
+#  *
+#  * Licensed under the Apache License, Version 2.0 (the "License");
+#  * you may not use this file except in compliance with the License.
+#  * You may obtain a copy of the License at
+#  *
+#  * http://www.apache.org/licenses/LICENSE-2.0
+#  *
+#  * Unless required by applicable law or agreed to in writing, software
+#  * distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+# */
+
+from deepppl import dpplc, PyroModel
+
+import pytest
+import torch
+from pyro import poutine
+
+program = '''
+data {
+  int N;
+  vector[N] y;
+}
+parameters {
+  real mu;
+  real<lower=0> sigma;
+}
+transformed parameters {
+  vector[N] z;
+  real tau;
+  z = (y - mu) / sigma;
+  tau = 1 / sigma;
+}
+model {
+  mu ~ normal(0, 1);
+  sigma ~ normal(0, 1);
+  z ~ normal(0, 1);
+}
+'''
+
+data = dict(N=5, y=torch.arange(5.))
+
+
+def translate(config):
+    return dpplc.stan2pystr(program, config)
+
+
+def test_sites():
+    source = translate(dpplc.Config(deterministic=True))
+    assert "deterministic('tau', tau)" in source
+    assert "deterministic('z', z)" in source
+    assert "if {'tau', 'z'} <= parameters.keys():" in source
+    assert 'deterministic' not in translate(dpplc.Config())
+
+
+def test_exclude():
+    source = translate(dpplc.Config(deterministic=True, deterministic_exclude=['z']))
+    assert "deterministic('tau', tau)" in source
+    assert "deterministic('z', z)" not in source
+    # Only `z` is computed again with the generated quantities
+    assert """    if {'tau'} <= parameters.keys():
+        tau = parameters['tau']
+        z = zeros(N)
+        z = (y - mu) / sigma
+    else:""" in source
+
+
+excluded = '''
+data {
+  int N;
+  vector[N] y;
+}
+parameters {
+  real mu;
+  real<lower=0> sigma;
+}
+transformed parameters {
+  real tau;
+  vector[N] z;
+  vector[N] w;
+  real s;
+  tau = 1 / sigma;
+  z = (y - mu) * tau;
+  for (n in 1:N)
+    w[n] = z[n] * 2;
+  s = sum(w) + tau;
+}
+model {
+  mu ~ normal(0, 1);
+  sigma ~ normal(0, 1);
+  y ~ normal(mu + s, sigma);
+}
+'''
+
+
+def test_exclude_needed_only():
+    config = dpplc.Config(deterministic=True, deterministic_exclude=['w'])
+    model = PyroModel(model_code=excluded, config=config)
+    parameters = {'mu': torch.tensor(1.), 'sigma': torch.tensor(2.)}
+    computed = model._generated_quantities(parameters=parameters, **data)
+    assert torch.allclose(torch.as_tensor(computed['w']).float(), (data['y'] - 1.) / 2. * 2)
+    # `w` is computed from the recorded `z`, which is neither computed
+    # again nor modified, and the other statements are skipped
+    z = torch.ones(5)
+    recorded = dict(parameters, tau=torch.tensor(3.), z=z, s=torch.tensor(4.))
+    answer = model._generated_quantities(parameters=recorded, **data)
+    assert torch.allclose(torch.as_tensor(answer['w']).float(), 2 * torch.ones(5))
+    assert answer['z'] is z and torch.equal(z, torch.ones(5))
+    assert answer['tau'] is recorded['tau']
+    assert answer['s'] is recorded['s']
+
+
+@pytest.mark.parametrize('config', [dpplc.Config(deterministic=True),
+                                    dpplc.Config(deterministic=True, vectorize=True)])
+def test_trace(config):
+    model = PyroModel(model_code=program, config=config)
+    trace = poutine.trace(model._model).get_trace(**data)
+    mu = trace.nodes['mu']['value']
+    sigma = trace.nodes['sigma']['value']
+    assert torch.allclose(trace.nodes['z']['value'], (data['y'] - mu) / sigma)
+    assert torch.allclose(trace.nodes['tau']['value'], 1 / sigma)
+    # The deterministic sites do not change the density
+    parameters = {'mu': mu, 'sigma': sigma}
+    trace = poutine.trace(poutine.condition(model._model, data=parameters)).get_trace(**data)
+    reference = PyroModel(model_code=program)._model
+    reference = poutine.trace(poutine.condition(reference, data=parameters)).get_trace(**data)
+    assert torch.allclose(trace.log_prob_sum(), reference.log_prob_sum())
+
+
+def test_generated_quantities():
+    model = PyroModel(model_code=program, config=dpplc.Config(deterministic=True))
+    parameters = {'mu': torch.tensor(1.), 'sigma': torch.tensor(2.)}
+    computed = model._generated_quantities(parameters=parameters, **data)
+    assert torch.allclose(torch.as_tensor(computed['z']), (data['y'] - 1.) / 2.)
+    # The values recorded by the sampler are not computed again
+    recorded = dict(parameters, z=torch.zeros(5), tau=torch.tensor(3.))
+    answer = model._generated_quantities(parameters=recorded, **data)
+    assert answer['z'] is recorded['z']
+    assert answer['tau'] is recorded['tau']
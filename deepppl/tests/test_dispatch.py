@@ -0,0 +1,39 @@
+# /*
+#  * Copyright 2018 IBM Corporation
+#  *
+#  * Licensed under the Apache License, Version 2.0 (the "License");
+#  * you may not use this file except in compliance with the License.
+#  * You may obtain a copy of the License at
+#  *
+#  * http://www.apache.org/licenses/LICENSE-2.0
+#  *
+#  * Unless required by applicable law or agreed to in writing, software
+#  * distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+# */
+
+from deepppl.translation.ir import IR, Variable, Constant
+from deepppl.translation.ir2python import IRVisitor
+
+
+class NameVisitor(IRVisitor):
+    def defaultVisit(self, node):
+        return 'default'
+
+    def visitVariable(self, node):
+        return node.id
+
+
+def test_dispatch_table():
+    visitor = NameVisitor()
+    assert Variable(id='x').accept(visitor) == 'x'
+    assert Constant(value=1).accept(visitor) == 'default'
+    assert NameVisitor._dispatch[Variable] is NameVisitor.visitVariable
+
+
+def test_dispatch_late_ir_class():
+    class Late(IR):
+        pass
+    assert Late().accept(NameVisitor()) == 'default'
@@ -0,0 +1,198 @@
+# /*
+#  * Copyright 2018 IBM Corporation
+#  *
+#  * Licensed under the Apache License, Version 2.0 (the "License");
+#  * you may not use this file except in compliance with the License.
+#  * You may obtain a copy of the License at
+#  *
+#  * http://www.apache.org/licenses/LICENSE-2.0
+#  *
+#  * Unless required by applicable law or agreed to in writing, software
+#  * distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+# */
+
+from deepppl import dpplc, PyroModel, NumPyroModel
+from deepppl.utils import utils
+
+import numpy as np
+import pytest
+import torch
+from pyro import poutine
+
+jax = dpplc.Config(numpyro=True)
+
+
+def translate(code, config=jax):
+    return dpplc.stan2pystr(code, config)
+
+
+def program(body):
+    return '''
+data {
+  int N;
+  int K;
+  vector[N] x;
+  vector[K] w;
+}
+parameters {
+  real mu;
+}
+transformed parameters {
+  real z[N, K];
+  %s
+}
+model {
+  mu ~ normal(0, 1);
+}
+''' % body
+
+
+def test_functional_update():
+    with open('deepppl/tests/good/kmeans.stan') as f:
+        source = translate(f.read())
+    assert '''    def ___loop_1(n, ___carry):
+        soft_z, = ___carry
+
+        def ___loop_2(k, ___carry):
+            soft_z, = ___carry
+            soft_z = soft_z.at[n - 1, k - 1].set(neg_log_K - 0.5 * dot_self
+                (mu[k - 1] - y[n - 1]))
+            return soft_z,
+        soft_z, = fori_loop(1, K + 1, ___loop_2, (soft_z,))
+        return soft_z,
+    soft_z, = fori_loop(1, N + 1, ___loop_1, (soft_z,))''' in source
+    assert 'soft_z[n - 1, k - 1] =' not in source
+
+
+def test_numpy_blocks():
+    with open('deepppl/tests/good/kmeans.stan') as f:
+        source = translate(f.read())
+    # The functions without the imports of NumPyro
+    functions = {}
+    exec(source[source.index('\ndef '):], {}, functions)
+    # Only the generated quantities update arrays: they need jax.numpy
+    assert not utils.functional_updates(functions['transformed_data'].__code__)
+    assert utils.functional_updates(functions['generated_quantities'].__code__)
+    assert utils.np_scoped(functions['transformed_data'], npyro=True).__globals__['exp'] \
+        is np.exp
+
+
+def test_pyro_unchanged():
+    with open('deepppl/tests/good/kmeans.stan') as f:
+        source = translate(f.read(), dpplc.Config())
+    assert 'soft_z[n - 1, k - 1] =' in source
+    assert 'fori_loop' not in source
+
+
+def test_traced_bounds():
+    # The bounds of the inner loop depend on the index of the outer one
+    source = translate(program('for (n in 1:N) for (k in 1:n) z[n, k] = x[n] * w[k];'))
+    assert 'for n in range(1, N + 1):' in source
+    assert 'z, = fori_loop(1, n + 1, ___loop_1, (z,))' in source
+
+
+@pytest.mark.parametrize('body', [
+    # the model samples in the loop
+    'for (k in 1:K) w[k] ~ normal(mu, 1);',
+    # the scalars may change of type
+    'real a; a = 0; for (k in 1:K) a = a + w[k];',
+    # conditional on the traced index
+    'for (k in 1:K) if (k > 1) z[1, k] = w[k];',
+])
+def test_python_loop(body):
+    code = program(body) if '~' not in body else \
+        program('').replace('mu ~ normal(0, 1);', body)
+    source = translate(code)
+    assert 'fori_loop' not in source
+    assert 'for k in range(1, K + 1):' in source
+
+
+recurrence = '''
+data {
+  int N;
+  vector[N] y;
+}
+parameters {
+  real mu;
+}
+model {
+  vector[N] z;
+  z[1] = mu;
+  for (n in 2:N) {
+    z[n] = 0.5 * z[n - 1] + mu;
+    y[n] ~ normal(z[n], 1);
+  }
+}
+'''
+
+
+def test_scan():
+    source = translate(recurrence)
+    assert '''    def ___scan_1(___carry, n):
+        z, = ___carry
+        z = z.at[n - 1].set(0.5 * z[n - 1 - 1] + mu)
+        sample('y__1', dist.Normal(z[n - 1], 1), obs=y[n - 1])
+        return (z,), None
+    (z,), _ = scan(___scan_1, (z,), arange(2, N + 1))''' in source
+    # the sites of a nested loop would depend on the traced index
+    nested = recurrence.replace('vector[N] y;', 'vector[N] y[N];').replace(
+        'y[n] ~ normal(z[n], 1);', 'for (k in 1:N) y[n, k] ~ normal(z[n], 1);')
+    assert 'scan' not in translate(nested).split('def model')[1]
+
+
+def test_scan_values():
+    pytest.importorskip('numpyro')
+    import jax.numpy as jnp
+    from numpyro.infer.util import log_density
+    import numpyro.distributions as dist
+    model = NumPyroModel(model_code=recurrence)
+    y = jnp.array(np.random.randn(10))
+    answer, _ = log_density(model._model, (), dict(N=10, y=y), {'mu': 0.3})
+    z = [0.3]
+    for n in range(1, 10):
+        z.append(0.5 * z[-1] + 0.3)
+    expected = dist.Normal(np.array(z[1:]), 1).log_prob(y[1:]).sum()
+    assert np.allclose(answer, expected, atol=1e-4)
+
+
+def test_element_update():
+    source = translate(program('z[1, 2] = mu;'))
+    assert 'z = z.at[1 - 1, 2 - 1].set(mu)' in source
+
+
+def test_functional_values():
+    pytest.importorskip('numpyro')
+    data = dict(N=20, D=2, K=3, y=np.random.randn(20, 2))
+    answer = []
+    for cls in [PyroModel, NumPyroModel]:
+        model = cls(model_file='deepppl/tests/good/kmeans.stan')
+        transformed_data = model._transformed_data(**data)
+        mu = np.arange(6.).reshape(3, 2)
+        gq = model._generated_quantities(transformed_data=transformed_data,
+                                         parameters={'mu': mu}, **data)
+        answer.append(np.asarray(gq['soft_z']))
+    assert np.allclose(*answer, atol=1e-5)
+
+
+def test_kmeans_log_density():
+    pytest.importorskip('numpyro')
+    import jax.numpy as jnp
+    from numpyro.infer.util import log_density
+    data = dict(N=6, D=2, K=3)
+    y = np.random.randn(6, 2)
+    mu = np.random.randn(3, 2)
+    model = NumPyroModel(model_file='deepppl/tests/good/kmeans.stan')
+    transformed_data = model._transformed_data(y=y, **data)
+    answer, _ = log_density(model._model, (),
+                            dict(y=jnp.asarray(y), transformed_data=transformed_data, **data),
+                            {'mu': jnp.asarray(mu)})
+    model = PyroModel(model_file='deepppl/tests/good/kmeans.stan')
+    transformed_data = {k: torch.tensor(v) for k, v in
+                        model._transformed_data(y=y, **data).items()}
+    conditioned = poutine.condition(model._model, {'mu': torch.tensor(mu)})
+    trace = poutine.trace(conditioned).get_trace(y=torch.tensor(y),
+                                                 transformed_data=transformed_data, **data)
+    assert np.allclose(answer, trace.log_prob_sum().item(), atol=1e-4)
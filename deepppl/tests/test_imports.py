@@ -0,0 +1,34 @@
+# /*
+#  * Copyright 2018 IBM Corporation
+#  *
+#  * Licensed under the Apache License, Version 2.0 (the "License");
+#  * you may not use this file except in compliance with the License.
+#  * You may obtain a copy of the License at
+#  *
+#  * http://www.apache.org/licenses/LICENSE-2.0
+#  *
+#  * Unless required by applicable law or agreed to in writing, software
+#  * distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+# */
+
+from deepppl.benchmarks.import_time import measure, scenarios
+
+import pytest
+
+
+@pytest.mark.parametrize('scenario', ['import deepppl', 'translate', 'command line'])
+def test_translation_does_not_load_frameworks(scenario):
+    code = scenarios[scenario].format(file='deepppl/tests/good/coin.stan')
+    _, loaded = measure(code, repeat=1)
+    assert loaded == []
+
+
+def test_torch_distributions():
+    import torch
+    from deepppl.translation.ir2python import torch_distributions
+    missing = [name for name in torch_distributions
+               if not hasattr(torch.distributions, name)]
+    assert missing == []
@@ -0,0 +1,248 @@
+# /*
+#  * Copyright 2018 IBM Corporation
+#  *
+#  * Licensed under the Apache License, Version 2.0 (the "License");
+#  * you may not use this file except in compliance with the License.
+#  * You may obtain a copy of the License at
+#  *
+#  * http://www.apache.org/licenses/LICENSE-2.0
+#  *
+#  * Unless required by applicable law or agreed to in writing, software
+#  * distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+# */
+
+from deepppl import dpplc, PyroModel
+from deepppl.translation.ir import BinaryOperator, Constant, Pow
+from deepppl.translation.ir2python import ConstantFoldingVisitor
+
+import glob
+import pyro
+import pytest
+import torch
+from pyro import poutine
+
+optimized = dpplc.Config(optimize=True)
+sources = sorted(glob.glob('deepppl/tests/good/*.stan'))
+
+program = '''
+data {
+  int N;
+  int K;
+  real y[N];
+  vector[K] x[N];
+}
+parameters {
+  real mu;
+  real<lower=0> sigma;
+  vector[K] beta;
+}
+transformed parameters {
+  real z[N];
+  for (n in 1:N)
+    z[n] = (y[n] - mu) / exp(sigma) - exp(sigma);
+}
+model {
+  real tau;
+  tau = 1 / exp(sigma);
+  mu ~ normal(0, -(1 - 2));
+  for (n in 1:N) {
+    for (k in 1:K)
+      x[n, k] ~ normal(beta[k] * tau, exp(sigma) + mu);
+    y[n] ~ normal(mu + dot_self(beta), sqrt(tau) * exp(sigma));
+  }
+}
+generated quantities {
+  real w[N];
+  for (n in 1:N)
+    w[n] = z[n] * exp(sigma) + exp(sigma);
+}
+'''
+
+
+def translate(code, config=optimized):
+    return dpplc.stan2pystr(code, config)
+
+
+def model_block(body):
+    return '''
+data {
+  int N;
+  vector[N] v;
+}
+parameters {
+  real mu;
+}
+model {
+  %s
+}
+''' % body
+
+
+def test_constant_folding():
+    with open('deepppl/tests/good/operators.stan') as f:
+        source = translate(f.read())
+    assert "dist.Uniform(0.0, 1)" in source
+    assert "dist.Normal(0, 1)" in translate(program)
+
+
+def power(left, right):
+    expr = BinaryOperator(left = Constant(value = left), op = Pow(),
+                          right = Constant(value = right))
+    expr.expr_type = None
+    return ConstantFoldingVisitor().fold(expr)
+
+
+@pytest.mark.parametrize('left, right, value', [
+    (2, 32, 2 ** 32),
+    (2, -2, 0.25),
+    (0, 1000, 0),
+    (2.0, 10, 1024.0),
+])
+def test_fold_power(left, right, value):
+    answer = power(left, right)
+    assert isinstance(answer, Constant) and answer.value == value
+
+
+@pytest.mark.parametrize('left, right', [
+    # the size of the result is not computed
+    (10, 10 ** 8),
+    (2, 33),
+    # overflow
+    (10.0, 400),
+    # complex result
+    (-8.0, 0.5),
+])
+def test_fold_power_unsafe(left, right):
+    assert isinstance(power(left, right), BinaryOperator)
+
+
+def test_loop_invariant():
+    source = translate(program)
+    assert '''    if 1 <= N and 1 <= K:
+        ___invariant_3 = exp(sigma) + mu
+    if 1 <= N:
+        ___invariant_4 = mu + dot_self(beta)
+''' in source
+    assert '___invariant_3), obs=x[n - 1, k - 1])' in source
+
+
+def test_invariant_inplace():
+    # The loops assigning elements of arrays only hoist scalars
+    source = translate(program)
+    assert '''        ___invariant_2 = exp(sigma)
+    for n in range(1, N + 1):
+        z[n - 1] = (y[n - 1] - mu) / ___invariant_2 - ___invariant_2''' in source
+    code = model_block('real a[N]; for (n in 1:N) a[n] = dot_self(v) + mu;')
+    assert '___invariant' not in translate(code)
+
+
+@pytest.mark.parametrize('body', [
+    # the expression depends on the loop
+    'for (n in 1:N) v[n] ~ normal(exp(n), 1);',
+    # the loop assigns the variable
+    'real a; a = 0; for (n in 1:N) { a = exp(a); v[n] ~ normal(a + mu, 1); }',
+    # conditional evaluation
+    'for (n in 1:N) if (mu > 0) v[n] ~ normal(exp(mu), 1);',
+])
+def test_invariant_fallback(body):
+    assert '___invariant' not in translate(model_block(body))
+
+
+def test_common_subexpressions():
+    code = model_block('real a; real b; a = exp(mu) + 1; b = exp(mu) * a; v ~ normal(b, 1);')
+    source = translate(code)
+    assert '''    ___cse_1 = exp(mu)
+    a = ___cse_1 + 1
+    b = ___cse_1 * a''' in source
+
+
+def test_common_subexpressions_assigned():
+    code = model_block('real a; a = exp(mu); a = exp(a); a = exp(a); v ~ normal(a, 1);')
+    assert '___cse' not in translate(code)
+
+
+def log_prob(config, **data):
+    model = PyroModel(model_code=program, config=config)
+    pyro.set_rng_seed(0)
+    trace = poutine.trace(model._model).get_trace(**data)
+    return trace.log_prob_sum()
+
+
+def generated(config, **data):
+    model = PyroModel(model_code=program, config=config)
+    parameters = {'mu': torch.tensor(0.5), 'sigma': torch.tensor(0.2),
+                  'beta': torch.arange(3.)}
+    return model._generated_quantities(parameters=parameters, **data)
+
+
+def test_same_values():
+    data = dict(N=4, K=3, y=torch.randn(4), x=torch.randn(4, 3))
+    assert torch.allclose(log_prob(optimized, **data), log_prob(dpplc.Config(), **data))
+    answer = generated(optimized, **data)
+    expected = generated(dpplc.Config(), **data)
+    assert set(answer) == {'z', 'w'}
+    for name in expected:
+        assert torch.allclose(torch.as_tensor(answer[name]), torch.as_tensor(expected[name]))
+
+
+def test_overwritten_allocation():
+    with open('deepppl/tests/good/kmeans.stan') as f:
+        code = f.read()
+    vectorized = translate(code, dpplc.Config(vectorize=True, optimize=True))
+    assert 'soft_z = zeros' not in vectorized
+    assert 'soft_z = neg_log_K - 0.5 *' in vectorized
+    # the elements are assigned in place
+    assert 'soft_z = zeros((N, K))' in translate(code)
+
+
+def test_constant_arrays():
+    with open('deepppl/tests/good/schools.stan') as f:
+        source = translate(f.read())
+    assert '''def transformed_data(N=None, sigma_y=None, y=None):
+    ___constant_1 = zeros(N)
+    return {'___constant_1': ___constant_1}''' in source
+    assert "dist.Normal(___constant_1, sigma_eta)" in source
+    with open('deepppl/tests/good/coin_guide.stan') as f:
+        source = translate(f.read())
+    assert 'def guide_(N=None, x=None, transformed_data=None):' in source
+    # the arrays assigned may be modified in place
+    code = model_block('vector[N] a; a = 0; a[1] = mu; v ~ normal(a, 1);')
+    assert '___constant' not in translate(code)
+
+
+def test_constant_arrays_values():
+    with open('deepppl/tests/good/schools.stan') as f:
+        code = f.read()
+    data = dict(N=3, y=torch.randn(3), sigma_y=torch.ones(3))
+    log_probs = []
+    for config in [optimized, dpplc.Config()]:
+        model = PyroModel(model_code=code, config=config)
+        kwargs = dict(data)
+        if model._transformed_data:
+            kwargs['transformed_data'] = {k: torch.Tensor(v) for k, v in
+                                          model._transformed_data(**data).items()}
+        pyro.set_rng_seed(0)
+        log_probs.append(poutine.trace(model._model).get_trace(**kwargs).log_prob_sum())
+    assert torch.allclose(*log_probs)
+
+
+def outcome(code, config):
+    try:
+        dpplc.stan2pystr(code, config)
+    except Exception as e:
+        return type(e)
+    return None
+
+
+@pytest.mark.parametrize('numpyro', [False, True])
+@pytest.mark.parametrize('source', sources)
+def test_optimize_all_programs(source, numpyro):
+    # The optimizations compile the programs compiled without them,
+    # including those with sample statements in the guides and networks
+    with open(source) as f:
+        code = f.read()
+    expected = outcome(code, dpplc.Config(numpyro=numpyro))
+    assert outcome(code, dpplc.Config(numpyro=numpyro, optimize=True)) is expected
@@ -0,0 +1,132 @@
+# /*
+#  * Copyright 2018 IBM Corporation
+#  *
+#  * Licensed under the Apache License, Version 2.0 (the "License");
+#  * you may not use this file except in compliance with the License.
+#  * You may obtain a copy of the License at
+#  *
+#  * http://www.apache.org/licenses/LICENSE-2.0
+#  *
+#  * Unless required by applicable law or agreed to in writing, software
+#  * distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+# */
+
+from deepppl import dpplc, PyroModel, NumPyroModel
+
+import pickle
+import numpy as np
+import pytest
+import torch
+
+x = torch.tensor([0., 0., 1., 0., 0., 0., 1., 0., 0., 1.])
+
+
+def test_pickle():
+    config = dpplc.Config(vectorize=True)
+    model = PyroModel(model_file='deepppl/tests/good/coin.stan', config=config)
+    copy = pickle.loads(pickle.dumps(model))
+    assert type(copy) is PyroModel
+    assert copy.config() is not config and copy.config().key() == config.key()
+    # Both are compiled from the same source
+    assert copy._model.__code__ is model._model.__code__
+
+
+def run(seed):
+    model = PyroModel(model_file='deepppl/tests/good/coin.stan')
+    mcmc = model.mcmc(num_samples=40, warmup_steps=20, num_chains=2,
+                      parallel=True, max_workers=2, seed=seed)
+    mcmc.run(N=10, x=x)
+    return mcmc
+
+
+def test_parallel_chains():
+    mcmc = run(1)
+    samples = mcmc.get_samples()
+    assert samples['z'].shape == (40,)
+    assert np.all((0 < samples['z']) & (samples['z'] < 1))
+    chains = mcmc.mcmc.get_samples(group_by_chain=True)['z']
+    assert chains.shape == (2, 20)
+    # The chains have their own seeds, and are reproducible
+    assert not torch.equal(chains[0], chains[1])
+    assert torch.equal(chains, run(1).mcmc.get_samples(group_by_chain=True)['z'])
+    assert mcmc.timing['num_chains'] == 2
+    # Measured in the workers
+    per_chain = mcmc.timing['per_chain']
+    assert len(per_chain) == 2
+    assert all(0 < t < mcmc.timing['total'] for t in per_chain)
+
+
+@pytest.mark.parametrize('chain_method', ['vectorized', 'sequential'])
+def test_numpyro_chains(chain_method):
+    pytest.importorskip('numpyro')
+    model = NumPyroModel(model_file='deepppl/tests/good/coin.stan',
+                         config=dpplc.Config(vectorize=True))
+    samples = []
+    for seed in [0, 0, 1]:
+        mcmc = model.mcmc(num_samples=40, warmup_steps=20, num_chains=2,
+                          chain_method=chain_method, seed=seed)
+        mcmc.run(N=10, x=x.numpy())
+        samples.append(np.asarray(mcmc.mcmc.get_samples(group_by_chain=True)['z']))
+    assert samples[0].shape == (2, 20)
+    assert not np.array_equal(samples[0][0], samples[0][1])
+    assert np.array_equal(samples[0], samples[1])
+    assert not np.array_equal(samples[0], samples[2])
+    assert mcmc.timing['chain_method'] == chain_method
+    if chain_method == 'sequential':
+        assert len(mcmc.timing['per_chain']) == 2
+        assert sum(mcmc.timing['per_chain']) <= mcmc.timing['total']
+    else:
+        # The chains run together
+        assert 'per_chain' not in mcmc.timing
+
+
+random_generated = '''
+data {
+  int N;
+}
+parameters {
+  real mu;
+}
+model {
+  mu ~ normal(0, 1);
+}
+generated quantities {
+  real w;
+  real z[N];
+  w = 2 * mu;
+  z = randn(N);
+}
+'''
+
+
+def generated(code, samples, **kwargs):
+    model = PyroModel(model_code=code)
+    mcmc = model.mcmc(num_samples=20, warmup_steps=10)
+    mcmc.kwargs = {'N': 3}
+    return mcmc.sample_generated(samples, **kwargs)
+
+
+def test_parallel_generated():
+    samples = {'mu': torch.arange(7.)}
+    expected = generated(random_generated, samples)
+    answer = generated(random_generated, samples, workers=3, chunk_size=2, seed=0)
+    assert np.array_equal(answer['w'], expected['w'])
+    assert answer['z'].shape == (7, 3)
+    # The chunks have their own seeds, whatever the number of workers
+    for workers in [1, 2]:
+        other = generated(random_generated, samples, workers=workers, chunk_size=2, seed=0)
+        assert np.array_equal(other['z'], answer['z'])
+    other = generated(random_generated, samples, workers=3, chunk_size=2, seed=1)
+    assert not np.array_equal(other['z'], answer['z'])
+
+
+def test_process_generated():
+    samples = {'mu': torch.arange(5.)}
+    threads = generated(random_generated, samples, workers=2, chunk_size=3, seed=0)
+    processes = generated(random_generated, samples, workers=2, chunk_size=3, seed=0,
+                          pool='process')
+    for name in threads:
+        assert np.array_equal(threads[name], processes[name])
@@ -0,0 +1,47 @@
+# /*
+#  * Copyright 2018 IBM Corporation
+#  *
+#  * Licensed under the Apache License, Version 2.0 (the "License");
+#  * you may not use this file except in compliance with the License.
+#  * You may obtain a copy of the License at
+#  *
+#  * http://www.apache.org/licenses/LICENSE-2.0
+#  *
+#  * Unless required by applicable law or agreed to in writing, software
+#  * distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+# */
+
+from deepppl import dpplc
+from deepppl.benchmarks.parse_throughput import synthetic_program
+
+import glob
+import pytest
+
+sources = sorted(glob.glob('deepppl/tests/good/*.stan'))
+
+
+def translate(code, parser):
+    try:
+        return dpplc.stan2pystr(code, dpplc.Config(parser=parser))
+    except Exception as e:
+        return type(e)
+
+
+@pytest.mark.parametrize('source', sources)
+def test_sll_same_translation(source):
+    with open(source) as f:
+        code = f.read()
+    assert translate(code, 'sll') == translate(code, 'll')
+
+
+def test_sll_synthetic_program():
+    code = synthetic_program(5)
+    assert translate(code, 'sll') == translate(code, 'll')
+
+
+def test_sll_syntax_error():
+    with pytest.raises(SyntaxError):
+        dpplc.stan2pystr('model { x ~ normal(0, 1) }', dpplc.Config(parser='sll'))
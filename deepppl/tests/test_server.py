@@ -0,0 +1,83 @@
+# /*
+#  * Copyright 2018 IBM Corporation
+#  *
+#  * Licensed under the Apache License, Version 2.0 (the "License");
+#  * you may not use this file except in compliance with the License.
+#  * You may obtain a copy of the License at
+#  *
+#  * http://www.apache.org/licenses/LICENSE-2.0
+#  *
+#  * Unless required by applicable law or agreed to in writing, software
+#  * distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+# */
+
+from deepppl import dpplc, server
+
+import socket
+import threading
+import pytest
+
+pytestmark = pytest.mark.skipif(not hasattr(server.socket, 'AF_UNIX'),
+                                reason='Unix domain sockets are not available')
+
+
+@pytest.fixture
+def socket_path(tmp_path):
+    path = str(tmp_path / 'dpplc.sock')
+    thread = threading.Thread(target=server.serve, args=(path,),
+                              kwargs={'warmup': False})
+    thread.start()
+    for _ in range(100):
+        if server.ping(path):
+            break
+        thread.join(0.05)
+    yield path
+    server.shutdown(path)
+    thread.join(5)
+    assert not thread.is_alive()
+
+
+def test_compile_remote(socket_path):
+    with open('deepppl/tests/good/coin.stan') as f:
+        code = f.read()
+    response = server.compile_remote(code, path=socket_path)
+    assert response['error'] is None
+    assert response['source'] == dpplc.stan2pystr(code, dpplc.Config())
+    assert 'Ir2PythonVisitor' in response['timings']
+
+
+def test_compile_remote_error(socket_path):
+    response = server.compile_remote('model { x ~ }', path=socket_path)
+    assert response['source'] is None
+    assert response['error']['type'] == 'SyntaxError'
+    assert 'Syntax error' in response['diagnostics'][0]
+
+
+def test_no_server(tmp_path):
+    assert server.compile_remote('', path=str(tmp_path / 'none.sock')) is None
+
+
+def test_stale_server(socket_path, monkeypatch):
+    # The compiler was edited after the server started
+    monkeypatch.setattr(server, 'compiler_fingerprint', lambda: 'edited')
+    assert server.compile_remote('', path=socket_path) is None
+    for _ in range(100):
+        if not server.ping(socket_path):
+            break
+        threading.Event().wait(0.05)
+    assert not server.ping(socket_path)
+
+
+def test_compile_timeout(tmp_path):
+    # A server accepting connections but never answering
+    path = str(tmp_path / 'wedged.sock')
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.bind(path)
+    sock.listen(1)
+    try:
+        assert server.compile_remote('', path=path, timeout=0.1) is None
+    finally:
+        sock.close()
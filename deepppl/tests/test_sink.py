@@ -0,0 +1,89 @@
+# /*
+#  * Copyright 2018 IBM Corporation
+#  *
+#  * Licensed under the Apache License, Version 2.0 (the "License");
+#  * you may not use this file except in compliance with the License.
+#  * You may obtain a copy of the License at
+#  *
+#  * http://www.apache.org/licenses/LICENSE-2.0
+#  *
+#  * Unless required by applicable law or agreed to in writing, software
+#  * distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+# */
+
+from deepppl import PyroModel
+from deepppl.dppl import MCMCProxy
+from deepppl.sink import SampleSink, load_samples
+
+import numpy as np
+import torch
+
+
+def test_chunks(tmp_path):
+    sink = SampleSink(str(tmp_path), 5)
+    sink.write('a', 0, np.arange(6.).reshape(3, 2))
+    sink.write('a', 3, np.arange(6., 10.).reshape(2, 2))
+    sink.write('b', 0, [1, 2, 3, 4, 5])
+    sink.close()
+    arrays = sink.arrays()
+    assert isinstance(arrays['a'], np.memmap)
+    assert np.array_equal(arrays['a'], np.arange(10.).reshape(5, 2))
+    assert arrays['b'].dtype == np.int64
+    assert sorted(load_samples(str(tmp_path))) == ['a', 'b']
+
+
+class Draws(object):
+    """Draws of the chains of a sampler that already ran."""
+
+    def __init__(self, samples):
+        self.samples = samples
+        self.calls = []
+
+    def get_samples(self, group_by_chain=False):
+        self.calls.append(group_by_chain)
+        if group_by_chain:
+            return self.samples
+        return {k: v.reshape((-1,) + v.shape[2:]) for k, v in self.samples.items()}
+
+
+def draws(tmp_path, **kwargs):
+    data = dict(N=20, D=2, K=3, y=torch.randn(20, 2).numpy())
+    model = PyroModel(model_file='deepppl/tests/good/kmeans.stan')
+    mcmc = model.mcmc(num_samples=20, warmup_steps=10, thin=2)
+    mcmc.kwargs = dict(data, transformed_data=model._transformed_data(**data))
+    # Two chains of 9 draws: the thinning goes across them
+    mcmc.mcmc = Draws({'mu': torch.randn(2, 9, 3, 2)})
+    expected = mcmc.get_samples()
+    mcmc.mcmc.calls = []
+    return mcmc, expected, mcmc.sink(str(tmp_path), chunk_size=2, **kwargs)
+
+
+def test_sink(tmp_path):
+    mcmc, expected, arrays = draws(tmp_path)
+    # The draws are not gathered in a single array
+    assert mcmc.mcmc.calls == [True]
+    assert sorted(arrays) == ['mu', 'soft_z']
+    assert arrays['soft_z'].shape == (9, 20, 3)
+    for name in arrays:
+        assert np.allclose(arrays[name], expected[name])
+        assert np.allclose(load_samples(str(tmp_path))[name], expected[name])
+
+
+def test_sink_workers(tmp_path, monkeypatch):
+    calls = []
+    sample_generated = MCMCProxy.sample_generated
+
+    def record(self, samples, **kwargs):
+        calls.append(kwargs)
+        return sample_generated(self, samples, **kwargs)
+    monkeypatch.setattr(MCMCProxy, 'sample_generated', record)
+    _, expected, arrays = draws(tmp_path, workers=2, seed=10)
+    assert np.allclose(arrays['soft_z'], expected['soft_z'])
+    # The first call gives the expected values
+    chunks = calls[1:]
+    assert all(call['workers'] == 2 and call['pool'] == 'thread' for call in chunks)
+    # Each chunk has its own seeds
+    assert [call['seed'] for call in chunks] == [10, 12, 14, 15, 17]
@@ -0,0 +1,71 @@
+# /*
+#  * Copyright 2018 IBM Corporation
+#  *
+#  * Licensed under the Apache License, Version 2.0 (the "License");
+#  * you may not use this file except in compliance with the License.
+#  * You may obtain a copy of the License at
+#  *
+#  * http://www.apache.org/licenses/LICENSE-2.0
+#  *
+#  * Unless required by applicable law or agreed to in writing, software
+#  * distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+# */
+
+from deepppl import dpplc, PyroModel
+from deepppl.translation.ir2python import Ir2PythonVisitor
+from deepppl.utils.utils import SiteNames
+
+import ast
+import torch
+from pyro import poutine
+
+
+def test_site_names():
+    names = SiteNames()
+    name = names['x__{}__{}__2', 3, 4]
+    assert name == 'x__3__4__2'
+    assert names['x__{}__{}__2', 3, 4] is name
+
+
+def test_site_names_not_stored():
+    names = SiteNames()
+    # Tensors hash by identity: their names are not kept
+    index = torch.tensor(3)
+    assert names['x__{}__2', index] == 'x__{}__2'.format(index)
+    assert len(names) == 0
+    names.maxsize = 2
+    for i in range(4):
+        assert names['x__{}__2', i] == 'x__{}__2'.format(i)
+    assert len(names) == 2
+
+
+def test_site_names_braces():
+    visitor = Ir2PythonVisitor(None, dpplc.Config())
+    index = ast.Index(value=ast.Str('{k}'))
+    target = ast.Subscript(value=ast.Name(id='x', ctx=ast.Load()), slice=index,
+                           ctx=ast.Load())
+    assert visitor.targetToName(target).s == 'x__{k}'
+    looped = ast.Subscript(value=target, slice=ast.Index(value=ast.Name(id='i', ctx=ast.Load())),
+                           ctx=ast.Load())
+    name = visitor.targetToName(looped, observed=2)
+    key = tuple(ast.literal_eval(e) if isinstance(e, ast.Str) else 3
+                for e in name.slice.value.elts)
+    assert SiteNames()[key] == 'x__{k}__3__2'
+
+
+def test_constant_names():
+    with open('deepppl/tests/good/cockroaches.stan') as f:
+        source = dpplc.stan2pystr(f.read(), dpplc.Config())
+    assert "sample('beta__0__1', dist.Normal(0, 5), obs=beta[1 - 1])" in source
+    assert 'format' not in source
+
+
+def test_loop_names():
+    model = PyroModel(model_file='deepppl/tests/good/coin.stan')
+    x = torch.tensor([0., 1., 0.])
+    trace = poutine.trace(model._model).get_trace(N=3, x=x)
+    assert [n for n in trace.nodes if n.startswith('x__')] == \
+        ['x__0__2', 'x__1__2', 'x__2__2']
@@ -0,0 +1,70 @@
+# /*
+#  * Copyright 2018 IBM Corporation
+#  *
+#  * Licensed under the Apache License, Version 2.0 (the "License");
+#  * you may not use this file except in compliance with the License.
+#  * You may obtain a copy of the License at
+#  *
+#  * http://www.apache.org/licenses/LICENSE-2.0
+#  *
+#  * Unless required by applicable law or agreed to in writing, software
+#  * distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+# */
+
+from deepppl import dpplc, PyroModel
+from deepppl.translation.ir2python import ModuleHeader
+from deepppl.utils.utils import build_hooks
+
+import importlib.util
+import numpy as np
+import pytest
+
+
+def load_module(tmp_path, name):
+    config = dpplc.Config(standalone=True)
+    with open(f'deepppl/tests/good/{name}.stan') as f:
+        source = dpplc.stan2pystr(f.read(), config)
+    path = tmp_path / f'{name}.py'
+    path.write_text(source)
+    spec = importlib.util.spec_from_file_location(name, str(path))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_hooks_are_imported():
+    assert sorted(ModuleHeader.hooks) == sorted(build_hooks())
+
+
+def test_from_module(tmp_path, monkeypatch):
+    module = load_module(tmp_path, 'kmeans')
+
+    def fail(*args, **kwargs):
+        assert False, "The compiler should not run"
+    monkeypatch.setattr(dpplc, 'do_compile', fail)
+    model = PyroModel.from_module(module)
+    assert model._model.__code__ is module.model.__code__
+    assert model._transformed_data is not None
+    assert model._generated_quantities is not None
+
+
+def test_standalone_numpy_scope(tmp_path):
+    module = load_module(tmp_path, 'kmeans')
+    with open('deepppl/tests/good/kmeans.stan') as f:
+        compiled = PyroModel(model_code=f.read())
+    data = {'N': 2, 'D': 2, 'K': 3, 'y': np.ones((2, 2))}
+    parameters = {'mu': np.zeros((3, 2))}
+    model = PyroModel.from_module(module)
+    for transformed_data, generated_quantities in [
+            (module.transformed_data, module.generated_quantities),
+            (model._transformed_data, model._generated_quantities)]:
+        td = transformed_data(**data)
+        assert td == compiled._transformed_data(**data)
+        gq = generated_quantities(transformed_data=td, parameters=parameters, **data)
+        expected = compiled._generated_quantities(transformed_data=td, parameters=parameters,
+                                                  **data)
+        assert type(gq['soft_z']) is type(expected['soft_z']) is np.ndarray
+        np.testing.assert_allclose(gq['soft_z'], expected['soft_z'])
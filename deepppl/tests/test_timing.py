@@ -0,0 +1,52 @@
+# /*
+#  * Copyright 2018 IBM Corporation
+#  *
+#  * Licensed under the Apache License, Version 2.0 (the "License");
+#  * you may not use this file except in compliance with the License.
+#  * You may obtain a copy of the License at
+#  *
+#  * http://www.apache.org/licenses/LICENSE-2.0
+#  *
+#  * Unless required by applicable law or agreed to in writing, software
+#  * distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+# */
+
+from deepppl import dpplc
+from deepppl.utils.timing import PhaseTimer
+
+import pytest
+
+phases = ['lexing', 'parsing', 'StanToIR',
+          'VariableInitializationVisitor', 'VariableAnnotationsVisitor',
+          'NetworksVisitor', 'SamplingConsistencyVisitor',
+          'TypeInferenceVisitor', 'makeGroupCanonLookup', 'Ir2PythonVisitor']
+
+
+def test_compilation_phases():
+    seen = []
+    timer = PhaseTimer(callback=lambda name, seconds: seen.append(name))
+    dpplc.do_compile(model_file='deepppl/tests/good/coin.stan', cache=False, timer=timer,
+                     config=dpplc.Config(incremental=False))
+    assert list(timer.timings) == phases + ['compile']
+    assert seen == list(timer.timings)
+    assert all(t >= 0 for t in timer.timings.values())
+    assert 'total' in timer.report()
+
+
+def test_astor_phase():
+    timer = PhaseTimer()
+    with open('deepppl/tests/good/coin.stan') as f:
+        dpplc.stan2pystr(f.read(), dpplc.Config(incremental=False), timer=timer)
+    assert list(timer.timings) == phases + ['astor']
+
+
+def test_profile():
+    timer = PhaseTimer(profile=True)
+    dpplc.do_compile(model_file='deepppl/tests/good/coin.stan', cache=False, timer=timer,
+                     config=dpplc.Config(incremental=False))
+    assert list(timer.profiles) == list(timer.timings)
+    assert timer.stats('parsing').total_calls > 0
+    assert '=== Ir2PythonVisitor ===' in timer.profile_report()
@@ -0,0 +1,352 @@
+# /*
+#  * Copyright 2018 IBM Corporation
+#  *
+#  * Licensed under the Apache License, Version 2.0 (the "License");
+#  * you may not use this file except in compliance with the License.
+#  * You may obtain a copy of the License at
+#  *
+#  * http://www.apache.org/licenses/LICENSE-2.0
+#  *
+#  * Unless required by applicable law or agreed to in writing, software
+#  * distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+# */
+
+from deepppl import dpplc, dppl, PyroModel
+from deepppl.utils import utils
+
+import numpy as np
+import pyro
+import pytest
+import torch
+from pyro import poutine
+
+vectorized = dpplc.Config(vectorize=True)
+
+program = '''
+data {
+  int K;
+  int M;
+  vector<lower=0>[K] alpha;
+  simplex[K] theta[M];
+  real y[M];
+}
+parameters {
+  real mu;
+}
+model {
+  mu ~ normal(0, 1);
+  for (m in 1:M)
+    theta[m] ~ dirichlet(alpha);
+  for (m in 1:M)
+    y[m] ~ normal(mu + 2 * theta[m, 1], exp(theta[m, 2]));
+}
+'''
+
+
+def translate(code, config=vectorized):
+    return dpplc.stan2pystr(code, config)
+
+
+def model_block(body):
+    return '''
+data {
+  int N;
+  real y[N];
+  vector[N] x;
+  vector[N] A[N];
+}
+parameters {
+  real mu;
+}
+model {
+  %s
+}
+''' % body
+
+
+def test_observed_loop():
+    with open('deepppl/tests/good/coin.stan') as f:
+        code = f.read()
+    source = translate(code)
+    assert "with plate('x__2__plate', N, dim=-1):" in source
+    assert "obs=x[1 - 1:N]" in source
+    assert 'for ' not in source
+    assert 'plate' not in translate(code, dpplc.Config())
+
+
+def test_event_dimensions():
+    source = translate(program)
+    assert "with plate('theta__2__plate', M, dim=-1):" in source
+    assert "with plate('y__3__plate', M, dim=-1):" in source
+    assert 'theta[1 - 1:M, (1 - 1)]' in source
+
+
+autoregressive = model_block('for (n in 2:N) y[n] ~ normal(mu + 0.5 * y[n - 1], 1);')
+
+
+def test_shifted_indexes():
+    source = translate(autoregressive)
+    assert "with plate('y__1__plate', N - 2 + 1, dim=-1):" in source
+    assert "dist.Normal(mu + 0.5 * y[1 - 1:N - 1], 1), obs=y[2 -\n            1:N])" in source
+    # the slices of the observations are not subsampled
+    subsampled = translate(autoregressive, dpplc.Config(subsample=True))
+    assert "with plate('y__1__plate', N - 2 + 1, dim=-1):" in subsampled
+
+
+def test_shifted_values():
+    data = dict(N=5, y=torch.randn(5), x=torch.randn(5), A=torch.randn(5, 5))
+    log_probs = []
+    for config in [vectorized, dpplc.Config()]:
+        model = PyroModel(model_code=autoregressive, config=config)
+        pyro.set_rng_seed(0)
+        log_probs.append(poutine.trace(model._model).get_trace(**data).log_prob_sum())
+    assert torch.allclose(*log_probs)
+
+
+@pytest.mark.parametrize('body', [
+    # recurrence on the parameters
+    'real z[N]; z[1] = mu; for (n in 2:N) { z[n] = z[n - 1] + mu; y[n] ~ normal(z[n], 1); }',
+    # several statements
+    'for (n in 1:N) { y[n] ~ normal(mu, 1); x[n] ~ normal(mu, 1); }',
+    # non elementwise function
+    'for (n in 1:N) y[n] ~ normal(sum(A[n]), 1);',
+    # the index is not the subscript
+    'for (n in 1:N) y[n] ~ normal(n, 1);',
+    # the shapes of the elements differ
+    'for (n in 1:N) A[n] ~ normal(y[n], 1);',
+    # parameters
+    'for (n in 1:N) mu ~ normal(0, 1);',
+])
+def test_fallback(body):
+    code = model_block(body)
+    assert translate(code) == translate(code, dpplc.Config())
+
+
+def assignment(body):
+    return '''
+data {
+  int N;
+  int K;
+  vector[N] x;
+  vector[K] w;
+}
+transformed parameters {
+  real z[N, K];
+  %s
+}
+model {
+}
+''' % body
+
+
+@pytest.mark.parametrize('config', [vectorized, dpplc.Config(vectorize=True, numpyro=True)])
+def test_assignment_nest(config):
+    with open('deepppl/tests/good/kmeans.stan') as f:
+        source = translate(f.read(), config)
+    assert 'soft_z = neg_log_K - 0.5 * ((mu[(None), 1 - 1:K] - y[1 - 1:N, (None)]) ** 2\n' in source
+    assert 'soft_z[n - 1, k - 1]' not in source
+
+
+@pytest.mark.parametrize('body', [
+    # loop-carried dependency
+    'for (n in 1:N) for (k in 1:K) z[n, k] = z[1, k] + x[n];',
+    # part of the array
+    'for (n in 2:N) for (k in 1:K) z[n, k] = x[n] * w[k];',
+    # the value does not depend on all the indexes
+    'for (n in 1:N) for (k in 1:K) z[n, k] = x[n];',
+    # transposed subscript
+    'for (k in 1:K) for (n in 1:N) z[n, k] = x[n] * w[k];',
+])
+def test_assignment_fallback(body):
+    code = assignment(body)
+    assert translate(code) == translate(code, dpplc.Config())
+
+
+def test_assignment_broadcast():
+    code = assignment('for (n in 1:N) for (k in 1:K) z[n, k] = exp(x[n]) * w[k];')
+    assert 'z = exp(x[1 - 1:N, (None)]) * w[(None), 1 - 1:K]' in translate(code)
+
+
+def soft_z(vectorize, **data):
+    model = PyroModel(model_file='deepppl/tests/good/kmeans.stan',
+                      config=dpplc.Config(vectorize=vectorize))
+    transformed_data = model._transformed_data(**data)
+    mu = torch.arange(6.).reshape(3, 2)
+    return model._generated_quantities(transformed_data=transformed_data,
+                                       parameters={'mu': mu}, **data)['soft_z']
+
+
+def test_assignment_values():
+    data = dict(N=20, D=2, K=3, y=torch.randn(20, 2))
+    assert torch.allclose(torch.as_tensor(soft_z(True, **data)).double(),
+                          torch.as_tensor(soft_z(False, **data)).double())
+
+
+def log_prob(vectorize, **data):
+    model = PyroModel(model_code=program, config=dpplc.Config(vectorize=vectorize))
+    pyro.set_rng_seed(0)
+    trace = poutine.trace(model._model).get_trace(**data)
+    return trace.log_prob_sum()
+
+
+def test_log_prob():
+    theta = torch.distributions.Dirichlet(torch.ones(3)).sample((4,))
+    data = dict(K=3, M=4, alpha=2 * torch.ones(3), theta=theta, y=torch.randn(4))
+    assert torch.allclose(log_prob(True, **data), log_prob(False, **data))
+
+
+def test_subsample():
+    with open('deepppl/tests/good/coin.stan') as f:
+        source = translate(f.read(), dpplc.Config(subsample=True))
+    assert 'def model(N=None, x=None, subsample_size=None):' in source
+    assert "with plate('x__2__plate', N, subsample_size=subsample_size, dim=-1) as i:" in source
+    assert "obs=x[i]" in source
+
+
+def test_subsample_scale():
+    model = PyroModel(model_file='deepppl/tests/good/coin.stan',
+                      config=dpplc.Config(subsample=True))
+    x = torch.tensor([0., 0., 1., 0., 0., 0., 1., 0., 0., 1.])
+    trace = poutine.trace(model._model).get_trace(N=10, x=x, subsample_size=4)
+    site = trace.nodes['x__2']
+    assert site['value'].shape == (4,)
+    assert site['scale'] == 2.5
+    trace = poutine.trace(model._model).get_trace(N=10, x=x)
+    assert trace.nodes['x__2']['value'].shape == (10,)
+
+
+def test_svi_minibatch():
+    model = PyroModel(model_file='deepppl/tests/good/coin_guide.stan',
+                      config=dpplc.Config(subsample=True))
+    sites = []
+
+    def loss(model_, guide, *args, **kwargs):
+        # The observations of the model traced at each step
+        guide_trace = poutine.trace(guide).get_trace(*args, **kwargs)
+        replayed = poutine.replay(model_, trace=guide_trace)
+        sites.append(poutine.trace(replayed).get_trace(*args, **kwargs).nodes['x__2'])
+        return pyro.infer.Trace_ELBO().differentiable_loss(model_, guide, *args, **kwargs)
+    svi = model.svi(params={'lr': 0.01}, loss=loss, subsample_size=4)
+    pyro.clear_param_store()
+    x = torch.tensor([0., 0., 1., 0., 0., 0., 1., 0., 0., 1.])
+    for _ in range(3):
+        svi.step(N=10, x=x)
+    assert len(sites) == 3
+    for site in sites:
+        assert site['value'].shape == (4,)
+        assert site['scale'] == 2.5
+    # Without subsampled plate, the minibatches are rejected
+    with pytest.raises(ValueError):
+        PyroModel(model_file='deepppl/tests/good/coin_guide.stan').svi(subsample_size=4)
+    with pytest.raises(ValueError):
+        PyroModel(model_file='deepppl/tests/good/gaussian.stan',
+                  config=dpplc.Config(subsample=True)).svi(subsample_size=4)
+
+
+def test_subsample_whole_array():
+    code = """
+    data { int N; int D; vector[D] y[N]; vector[N] v; }
+    parameters { vector[D] mu; real<lower=0> sigma; }
+    model {
+      y ~ normal(mu, sigma);
+      v ~ normal(0, sigma);
+    }
+    """
+    source = translate(code, dpplc.Config(subsample=True))
+    assert "with plate('y__1__plate', N, subsample_size=subsample_size, dim=-2" in source
+    assert "obs=y[y__index]" in source
+    assert "dist.Normal(0, sigma), obs=v[v__index]" in source
+    model = PyroModel(model_code=code, config=dpplc.Config(subsample=True))
+    data = {'N': 10, 'D': 3, 'y': torch.randn(10, 3), 'v': torch.randn(10)}
+    trace = poutine.trace(model._model).get_trace(subsample_size=5, **data)
+    assert trace.nodes['y__1']['value'].shape == (5, 3)
+    assert trace.nodes['v__2']['value'].shape == (5,)
+    assert trace.nodes['v__2']['scale'] == 2.
+
+
+def generated(vectorize, batched, chunk_size=None, **data):
+    model = PyroModel(model_file='deepppl/tests/good/kmeans.stan',
+                      config=dpplc.Config(vectorize=vectorize))
+    mcmc = model.mcmc(num_samples=20, warmup_steps=10)
+    mcmc.kwargs = dict(data, transformed_data=model._transformed_data(**data))
+    samples = {'mu': torch.randn(5, 3, 2, generator=torch.Generator().manual_seed(0))}
+    return mcmc.sample_generated(samples, batched=batched, chunk_size=chunk_size)['soft_z']
+
+
+def has_vmap():
+    try:
+        dppl._torch_vmap()
+    except NotImplementedError:
+        return False
+    return True
+
+
+def test_batched_generated():
+    data = dict(N=20, D=2, K=3, y=torch.randn(20, 2).numpy())
+    expected = generated(True, False, **data)
+    # The draws are stacked in a single array
+    assert isinstance(expected, np.ndarray)
+    assert expected.shape == (5, 20, 3)
+    expected = torch.as_tensor(expected).double()
+    for chunk_size in [None, 2]:
+        if has_vmap():
+            answer = generated(True, True, chunk_size=chunk_size, **data)
+        else:
+            with pytest.warns(UserWarning):
+                answer = generated(True, True, chunk_size=chunk_size, **data)
+        assert answer.shape == (5, 20, 3)
+        assert torch.allclose(torch.as_tensor(answer).double(), expected)
+    # The in-place updates of the loop are evaluated draw by draw
+    with pytest.warns(UserWarning):
+        answer = generated(False, True, **data)
+    assert torch.allclose(torch.as_tensor(answer).double(), expected)
+
+
+def batched_mcmc(batched_generated_quantities, **data):
+    model = PyroModel(model_file='deepppl/tests/good/kmeans.stan',
+                      config=dpplc.Config(vectorize=True))
+    mcmc = model.mcmc(num_samples=20, warmup_steps=10)
+    mcmc.kwargs = dict(data, transformed_data=model._transformed_data(**data))
+    mcmc.batched_generated_quantities = batched_generated_quantities
+    return mcmc
+
+
+@pytest.mark.skipif(not has_vmap(), reason='torch.vmap is not available')
+def test_batched_errors():
+    data = dict(N=20, D=2, K=3, y=torch.randn(20, 2).numpy())
+    samples = {'mu': torch.randn(5, 3, 2)}
+
+    def failing(**kwargs):
+        raise ValueError('shape mismatch')
+    # The errors of the program are raised
+    with pytest.raises(ValueError, match='shape mismatch'):
+        batched_mcmc(failing, **data).sample_generated(samples, batched=True)
+
+    def control_flow(parameters=None, **kwargs):
+        if parameters['mu'].sum() > 0:
+            return {'a': parameters['mu']}
+        return {'a': -parameters['mu']}
+    # Those of vmap fall back to the evaluation draw by draw
+    with pytest.warns(UserWarning, match='Cannot vectorize'):
+        answer = batched_mcmc(control_flow, **data).sample_generated(samples, batched=True)
+    assert answer['soft_z'].shape == (5, 20, 3)
+
+
+@pytest.mark.parametrize('config, inplace', [(dpplc.Config(), True), (vectorized, False)])
+def test_inplace_updates(config, inplace):
+    # The loops assigning elements are not batched
+    model = PyroModel(model_file='deepppl/tests/good/kmeans.stan', config=config)
+    code = model._batched_generated_quantities.__code__
+    assert utils.inplace_updates(code) == inplace
+
+
+def test_stack():
+    arrays = {}
+    dppl._stack(arrays, 'a', 0, np.array([1]), 3)
+    # The later draws need a wider type
+    dppl._stack(arrays, 'a', 1, np.array([1.5, 2.5]), 3)
+    assert arrays['a'].dtype == np.float64
+    assert arrays['a'].tolist() == [1., 1.5, 2.5]
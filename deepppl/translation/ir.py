@@ -2,14 +2,36 @@ import warnings
 from itertools import chain
 
 class IRMeta(type):
+    """Registers the IR classes, for the dispatch tables of the visitors."""
+    classes = []
+
     def __init__(cls, *args, **kwargs):
-        selector = 'return visitor.visit{}(self)'.format(cls.__name__)
-        accept_code = "def accept(self, visitor):\n\t{}".format(selector)
-        l = {}
-        exec(accept_code, globals(), l)
-        setattr(cls, "accept", l["accept"])
+        super(IRMeta, cls).__init__(*args, **kwargs)
+        IRMeta.classes.append(cls)
+
+
+class DispatchTable(dict):
+    """Maps each IR class `X` to the method of `visitor_cls` visiting its
+    instances: `visitX` if the visitor defines it, `defaultVisit` otherwise.
+    Built once per visitor class (see `IRVisitor.__init_subclass__`)."""
+
+    def __init__(self, visitor_cls):
+        super(DispatchTable, self).__init__()
+        self.visitor_cls = visitor_cls
+        for cls in IRMeta.classes:
+            self[cls]
+
+    def __missing__(self, cls):
+        method = getattr(self.visitor_cls, 'visit' + cls.__name__, None)
+        if method is None:
+            method = self.visitor_cls.defaultVisit
+        self[cls] = method
+        return method
 
 class IR(metaclass=IRMeta):
+    def accept(self, visitor):
+        return visitor._dispatch[type(self)](visitor, self)
+
     def is_variable_decl(self):
         return False
 
@@ -279,6 +301,17 @@ class ForStmt(Statements):
     def children(self, children):
         [self.from_, self.to_, self.body] = children
 
+class Plate(ForStmt):
+    """Vectorized loop: the body is evaluated once for the whole range of
+    the index, in a plate of dimension `dim` (see `VectorizationVisitor`).
+    When `subsample` is set, the body only sees a random subset of the
+    range, whose indices are bound to `id`."""
+    def __init__(self, id = None, from_ = None, to_ = None, body = None, dim = -1,
+                 subsample = False):
+        super(Plate, self).__init__(id = id, from_ = from_, to_ = to_, body = body)
+        self.dim = dim
+        self.subsample = subsample
+
 class ConditionalStmt(Statements):
     def __init__(self, test = None, true = None, false = None):
         super(ConditionalStmt, self).__init__()
@@ -493,6 +526,39 @@ class Subscript(Expression):
     def is_generated_quantities_var(self):
         return self.id.is_generated_quantities_var()
 
+class Slice(Expression):
+    """The index range `from_:to_`, bounds included."""
+    def __init__(self, from_ = None, to_ = None):
+        super(Slice, self).__init__()
+        self.from_ = from_
+        self.to_ = to_
+
+    @property
+    def children(self):
+        return [self.from_, self.to_]
+
+    @children.setter
+    def children(self, children):
+        [self.from_, self.to_] = children
+
+class NewAxis(Expression):
+    """A new dimension of size 1 in a subscript."""
+    pass
+
+class Sum(Expression):
+    """Sum of `value` over its last dimension."""
+    def __init__(self, value = None):
+        super(Sum, self).__init__()
+        self.value = value
+
+    @property
+    def children(self):
+        return [self.value]
+
+    @children.setter
+    def children(self, children):
+        [self.value] = children
+
 class VariableDecl(IR):
     def __init__(self, id = None, dim = None, init = None,
                     type_ = None):
@@ -623,6 +689,10 @@ class Variable(Expression):
     def is_generated_quantities_var(self):
         return self.block_name == GeneratedQuantities.blockName()
 
+class PlateIndex(Variable):
+    """The indices (starting at 0) of the elements of a subsampled plate."""
+    pass
+
 class VariableProperty(Expression):
     def __init__(self, var = None, prop = None):
         super(VariableProperty, self).__init__()
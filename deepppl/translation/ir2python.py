@@ -17,26 +17,52 @@
 from collections import defaultdict, OrderedDict
 from contextlib import contextmanager
 import ast
-import torch
+import copy
+import math
+import operator
 import astpretty
 import astor
 import sys
 
 from .sdim import KnownDimension, makeGroupCanonLookup
+from .stype import Indexed, Primitive
 from .ir import NetVariable, Program, ForStmt, ConditionalStmt, \
                 AssignStmt, Subscript, BlockStmt,\
                 CallStmt, List, SamplingStmt, SamplingDeclaration, SamplingObserved,\
                 SamplingParameters, Variable, Constant, BinaryOperator, \
                 Minus, UnaryOperator, UMinus, AnonymousShapeProperty,\
                 VariableProperty, NetVariableProperty, Prior, \
-                TransformedParameters, Model
+                TransformedParameters, Model, DispatchTable, Plate, Slice, \
+                Tuple, UPlus, Plus, Mult, Div, DotMult, DotDiv, IR, NewAxis, \
+                Sum, Pow, PlateIndex, VariableDecl, Operator, And, Or, LE, \
+                TransformedData
 
 from .exceptions import *
 from .stype_infer import TypeInferenceVisitor
+from ..utils.timing import null_timer
 
 from_test = lambda: hasattr(sys, "_called_from_test")
 
+# Distributions provided by `torch.distributions`. They are listed here
+# rather than looked up so that the translation does not import torch, and
+# so that the generated code does not depend on the installed version. The
+# list must be kept in sync with the oldest supported torch: every name
+# must exist there (see `test_imports.test_torch_distributions`).
+torch_distributions = frozenset([
+    'Bernoulli', 'Beta', 'Binomial', 'Categorical', 'Cauchy', 'Chi2',
+    'ContinuousBernoulli', 'Dirichlet', 'Exponential', 'FisherSnedecor',
+    'Gamma', 'Geometric', 'Gumbel', 'HalfCauchy', 'HalfNormal', 'Independent',
+    'Laplace', 'LogNormal', 'LogisticNormal', 'LowRankMultivariateNormal',
+    'MixtureSameFamily', 'Multinomial', 'MultivariateNormal',
+    'NegativeBinomial', 'Normal', 'OneHotCategorical', 'Pareto', 'Poisson',
+    'RelaxedBernoulli', 'RelaxedOneHotCategorical', 'StudentT',
+    'TransformedDistribution', 'Uniform', 'VonMises', 'Weibull'])
+
 class IRVisitor(object):
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._dispatch = DispatchTable(cls)
+
     def defaultVisit(self, node):
         raise NotImplementedError
 
@@ -65,6 +91,8 @@ class IRVisitor(object):
     def _visitChildren(self, node):
         return self._visitAll(node.children)
 
+IRVisitor._dispatch = DispatchTable(IRVisitor)
+
 class TargetVisitor(IRVisitor):
     def __init__(self, ir2py):
         super(TargetVisitor, self).__init__()
@@ -419,7 +447,9 @@ class PythonASTHelper(object):
 
     def ensureStmtList(self, listOrNode):
         if type(listOrNode) == type([]):
-            return [self.ensureStmt(x) for x in listOrNode if x is not None]
+            # A statement may be translated into several ones
+            return [self.ensureStmt(y) for x in listOrNode if x is not None
+                    for y in (x if type(x) == type([]) else [x])]
         else:
             return [self.ensureStmt(listOrNode)]
 
@@ -564,6 +594,1006 @@ class VariableInitializationVisitor(IRVisitor):
         return answer
 
 
+class VectorizationVisitor(IRVisitor):
+    """Rewrite the loops of the model and of the transformed parameters
+    into tensor operations:
+    - a loop whose body is a single observation of independent elements
+      becomes a `Plate`: one batched sample statement on slices of the
+      data instead of one sample site per iteration.
+    - a nest of loops assigning each element of an array becomes a single
+      assignment of the whole array, computed by broadcasting.
+
+    The elements indexed by the loop variables are sliced: they get a
+    leading batch dimension for each loop of the nest (a new axis for
+    the loops they do not depend on). The indexes shifted by a constant,
+    as `y[t - 1]` in the recurrences of the time series, give shifted
+    slices: the values observed are all known before the loop, so its
+    iterations are independent. A loop is only rewritten when the
+    operands indexed by the loops all have the shape of the result, so
+    that the other ones broadcast as in the loop. Otherwise it is kept
+    as is."""
+
+    elementwise = frozenset(['exp', 'log', 'sqrt', 'softplus', 'fabs', 'inv_logit'])
+    # Distributions over vectors: their last dimension is not a batch dimension
+    multivariate = frozenset(['dirichlet', 'multi_normal', 'multi_normal_cholesky',
+                              'multinomial'])
+
+    def __init__(self, type_infer, subsample=False):
+        super(VectorizationVisitor, self).__init__()
+        self.type_infer = type_infer
+        self.subsample = subsample
+        self.plates = 0
+        self.assignments = 0
+
+    def defaultVisit(self, node):
+        return node
+
+    def visitProgram(self, program):
+        for block in [program.transformedparameters, program.model]:
+            if block is not None:
+                block.body = self._visitAll(block.body)
+        if self.subsample and program.model is not None:
+            sizes = self.sizes(program)
+            body = []
+            for stmt in program.model.body:
+                plate = self.subsampleObserved(stmt, sizes)
+                if plate is not None:
+                    self.plates += 1
+                body.append(plate or stmt)
+            program.model.body = body
+        return program
+
+    def sizes(self, program):
+        """The block of the integers of the data and transformed data,
+        which give the dimensions of the arrays."""
+        answer = {}
+        for block in [program.data, program.transformeddata]:
+            if block is None:
+                continue
+            for decl in block.body:
+                if isinstance(decl, VariableDecl) and decl.dim is None and \
+                        decl.type_ is not None and decl.type_.type_ == 'int' and \
+                        not decl.type_.is_array and decl.type_.dim is None:
+                    answer[decl.id] = block.blockName()
+        return answer
+
+    def visitBlockStmt(self, block):
+        block.body = self._visitAll(block.body)
+        return block
+
+    def visitConditionalStmt(self, conditional):
+        conditional.true = conditional.true.accept(self)
+        if conditional.false is not None:
+            conditional.false = conditional.false.accept(self)
+        return conditional
+
+    def visitForStmt(self, forstmt):
+        plate = self.vectorizeSampling(forstmt)
+        if plate is not None:
+            self.plates += 1
+            return plate
+        assign = self.vectorizeAssign(forstmt)
+        if assign is not None:
+            self.assignments += 1
+            return assign
+        forstmt.body = forstmt.body.accept(self)
+        return forstmt
+
+    def single(self, stmt):
+        if isinstance(stmt, BlockStmt) and len(stmt.body) == 1:
+            return stmt.body[0]
+        return stmt
+
+    def vectorizeSampling(self, forstmt):
+        body = self.single(forstmt.body)
+        if not isinstance(body, SamplingObserved) or body.shape is not None:
+            return None
+        loops = [forstmt]
+        target = self.elementShape(body.target, loops)
+        if target is None or not target[0]:
+            return None
+        shape = target[1]
+        if body.id in self.multivariate and not shape:
+            return None
+        for arg in body.args:
+            arg_shape = self.elementShape(arg, loops)
+            if arg_shape is None:
+                return None
+            dep, dims = arg_shape
+            if dims != shape and (dep or dims):
+                return None
+        # Plates over the elements of the data can be subsampled
+        subsample = self.subsample and self.isOne(forstmt.from_) and \
+            isinstance(forstmt.to_, Variable) and forstmt.to_.is_data_var() and \
+            not self.shifted([body.target] + list(body.args), [forstmt.id])
+        body.target = self.sliced(body.target, loops, subsample)
+        body.args = [self.sliced(arg, loops, subsample) for arg in body.args]
+        batch_dims = len(shape) - (1 if body.id in self.multivariate else 0)
+        return Plate(id = forstmt.id, from_ = forstmt.from_, to_ = forstmt.to_,
+                     body = body, dim = -1 - batch_dims, subsample = subsample)
+
+    def subsampleObserved(self, sampling, sizes):
+        """Subsampled plate over the elements of a data array observed as a
+        whole, as `x ~ bernoulli(z)` with `int x[N]`: the operands with
+        the dimensions of `x` are indexed by the indices of the plate, the
+        other ones must broadcast over its elements."""
+        if not isinstance(sampling, SamplingObserved) or sampling.shape is not None:
+            return None
+        target = sampling.target
+        if not isinstance(target, Variable) or not target.is_data_var():
+            return None
+        dims = self.shape(getattr(target, 'expr_type', None))
+        if not dims or dims[0] not in sizes:
+            return None
+        if sampling.id in self.multivariate and len(dims) < 2:
+            return None
+        index = '{}__index'.format(target.id)
+        args = [self.subsampledOperand(arg, dims, index) for arg in sampling.args]
+        if None in args:
+            return None
+        sampling.target = self.elements(target, index)
+        # The distribution is over the elements of the plate
+        sampling.expr_type = sampling.target.expr_type
+        sampling.args = args
+        size = Variable(id = dims[0])
+        size.block_name = sizes[dims[0]]
+        batch_dims = len(dims) - 1 - (1 if sampling.id in self.multivariate else 0)
+        return Plate(id = index, from_ = Constant(value = 1), to_ = size,
+                     body = sampling, dim = -1 - batch_dims, subsample = True)
+
+    def subsampledOperand(self, expr, dims, index):
+        """The operand `expr` of an observation of an array of dimensions
+        `dims` for the elements of the subsampled plate `index`, or `None`
+        if it cannot be restricted to them."""
+        if isinstance(expr, Constant):
+            if self.shape(getattr(expr, 'expr_type', None)) == dims:
+                # Constant arrays are built for the elements of the plate
+                expr = copy.copy(expr)
+                expr.expr_type = expr.expr_type.description().component()
+            return expr
+        if isinstance(expr, UnaryOperator):
+            if not isinstance(expr.op, (UPlus, UMinus)):
+                return None
+            value = self.subsampledOperand(expr.value, dims, index)
+            if value is None:
+                return None
+            answer = copy.copy(expr)
+            answer.value = value
+            return answer
+        if isinstance(expr, BinaryOperator):
+            if not isinstance(expr.op, (Plus, Minus, Mult, Div, DotMult, DotDiv)):
+                return None
+            if isinstance(expr.op, (Mult, Div)) and \
+                    all(self.operandShape(e) != [] for e in [expr.left, expr.right]):
+                # Products of vectors and matrices are not elementwise
+                return None
+            left = self.subsampledOperand(expr.left, dims, index)
+            right = self.subsampledOperand(expr.right, dims, index)
+            if left is None or right is None:
+                return None
+            answer = copy.copy(expr)
+            answer.left, answer.right = left, right
+            return answer
+        if isinstance(expr, CallStmt) and expr.id in self.elementwise:
+            args = [self.subsampledOperand(a, dims, index) for a in expr.args.children]
+            if None in args:
+                return None
+            answer = copy.copy(expr)
+            answer.args = copy.copy(expr.args)
+            answer.args.children = args
+            return answer
+        operand = self.operandShape(expr)
+        if operand is None:
+            return None
+        if operand == dims and isinstance(expr, (Variable, Subscript)):
+            return self.elements(expr, index)
+        if operand == [] or operand == dims[1:]:
+            # Broadcast over the elements
+            return expr
+        return None
+
+    def elements(self, expr, index):
+        """The elements of the array `expr` at the indices of the plate `index`."""
+        answer = Subscript(id = expr, index = PlateIndex(id = index))
+        answer.expr_type = expr.expr_type.description().component()
+        return answer
+
+    def operandShape(self, expr):
+        if isinstance(expr, Constant):
+            return []
+        return self.shape(getattr(expr, 'expr_type', None))
+
+    def shape(self, type_):
+        """Canonical description of all the dimensions of the values of
+        `type_`, the outer ones first, or `None` if they are not known."""
+        if type_ is None or type_.isVariable():
+            return None
+        answer = []
+        desc = type_.description()
+        while isinstance(desc, Indexed):
+            if not desc.dimension.isKnown():
+                return None
+            answer.append(str(desc.dimension.canon(self.type_infer.dims_canon_map)))
+            desc = desc.component().description()
+        return answer if isinstance(desc, Primitive) else None
+
+    def vectorizeAssign(self, forstmt):
+        loops = []
+        stmt = forstmt
+        while isinstance(stmt, ForStmt) and not isinstance(stmt, Plate):
+            loops.append(stmt)
+            stmt = self.single(stmt.body)
+        if not isinstance(stmt, AssignStmt) or not isinstance(stmt.target, Subscript):
+            return None
+        array = stmt.target.id
+        if not isinstance(array, Variable):
+            return None
+        ids = [loop.id for loop in loops]
+        indexes = self.indexes(stmt.target)
+        if [i.id if isinstance(i, Variable) else None for i in indexes] != ids:
+            return None
+        # The nest must assign all the elements of the array
+        dims = self.dims(array.expr_type)
+        bounds = [self.bound(loop.to_, ids) for loop in loops]
+        if dims is None or dims[:len(ids)] != bounds or \
+                not all(self.isOne(loop.from_) for loop in loops):
+            return None
+        value = self.elementShape(stmt.value, loops)
+        if value is None or value[0] != set(ids) or value[1] != dims[len(ids):]:
+            return None
+        if self.mentions(stmt.value, [array.id]):
+            # Loop-carried dependency
+            return None
+        # The statements of the transformed parameters are shared with
+        # the model
+        stmt = copy.deepcopy(stmt)
+        return AssignStmt(target = stmt.target.id,
+                          value = self.sliced(stmt.value, loops))
+
+    def indexes(self, subscript):
+        if subscript.index.is_tuple():
+            return subscript.index.exprs
+        return [subscript.index]
+
+    def bound(self, expr, ids):
+        """The loop bound `expr` as a dimension, or `None`."""
+        if isinstance(expr, Variable) and expr.id not in ids:
+            return expr.id
+        if isinstance(expr, Constant):
+            return str(expr.value)
+        return None
+
+    def isOne(self, expr):
+        return isinstance(expr, Constant) and expr.value == 1
+
+    def dims(self, type_):
+        """Canonical description of the dimensions of `type_`, or `None`
+        if they are not known."""
+        if type_ is None or type_.isVariable():
+            return None
+        answer = []
+        for d in type_.all_dimensions():
+            if not d.isKnown():
+                return None
+            answer.append(str(d.canon(self.type_infer.dims_canon_map)))
+        return answer
+
+    def elementShape(self, expr, loops):
+        """Return the set of the indexes of `loops` that `expr` depends on
+        and the dimensions of its value for given indexes, or `None` if
+        the expression cannot be vectorized."""
+        ids = [loop.id for loop in loops]
+        if isinstance(expr, Constant):
+            return frozenset(), []
+        if isinstance(expr, Variable):
+            if expr.id in ids:
+                return None
+            return self.independent(expr)
+        if isinstance(expr, Subscript):
+            uses = [i for i in self.indexes(expr) if self.mentions(i, ids)]
+            if not uses:
+                return self.independent(expr)
+            indexes = [self.loopIndex(i, ids) for i in uses]
+            if None in indexes:
+                return None
+            positions = [k for k, _ in indexes]
+            # The batch dimensions must come in the order of the loops
+            if positions != sorted(set(positions)) or \
+                    not isinstance(expr.id, Variable) or expr.id.id in ids:
+                return None
+            dims = self.dims(getattr(expr, 'expr_type', None))
+            return None if dims is None else (frozenset(ids[k] for k in positions), dims)
+        if isinstance(expr, UnaryOperator):
+            if not isinstance(expr.op, (UPlus, UMinus)):
+                return None
+            return self.elementShape(expr.value, loops)
+        if isinstance(expr, BinaryOperator):
+            if not isinstance(expr.op, (Plus, Minus, Mult, Div, DotMult, DotDiv)):
+                return None
+            left = self.elementShape(expr.left, loops)
+            right = self.elementShape(expr.right, loops)
+            if left is None or right is None:
+                return None
+            if isinstance(expr.op, (Mult, Div)) and left[1] and right[1]:
+                # Products of vectors and matrices are not elementwise
+                return None
+            if left[1] == right[1] or not right[1]:
+                dims = left[1]
+            elif not left[1]:
+                dims = right[1]
+            else:
+                return None
+            # An operand indexed by the loops gets leading batch
+            # dimensions: it must not be broadcast
+            if any(used and d != dims for used, d in [left, right]):
+                return None
+            return left[0] | right[0], dims
+        if isinstance(expr, CallStmt):
+            args = expr.args.children
+            if not any(self.mentions(a, ids) for a in args):
+                return self.independent(expr)
+            if len(args) != 1:
+                return None
+            arg = self.elementShape(args[0], loops)
+            if arg is None:
+                return None
+            if expr.id in self.elementwise:
+                return arg
+            if expr.id == 'dot_self' and len(arg[1]) == 1:
+                return arg[0], []
+            return None
+        return None
+
+    def loopIndex(self, index, ids):
+        """The position in `ids` of the loop variable of the subscript
+        `index`, as `t`, `t + 1` or `t - 1`, and the constant added to it,
+        or `None`."""
+        if isinstance(index, Variable) and index.id in ids:
+            return ids.index(index.id), 0
+        if isinstance(index, BinaryOperator) and isinstance(index.op, (Plus, Minus)):
+            left, right = index.left, index.right
+            if isinstance(index.op, Plus) and isinstance(left, Constant):
+                left, right = right, left
+            if isinstance(left, Variable) and left.id in ids and \
+                    isinstance(right, Constant) and type(right.value) is int:
+                offset = right.value if isinstance(index.op, Plus) else -right.value
+                return ids.index(left.id), offset
+        return None
+
+    def shifted(self, exprs, ids):
+        """Some subscript of `exprs` shifts the index of a loop of `ids`."""
+        for expr in exprs:
+            if isinstance(expr, Subscript):
+                for i in self.indexes(expr):
+                    index = self.loopIndex(i, ids)
+                    if index is not None and index[1] != 0:
+                        return True
+            if isinstance(expr, IR) and \
+                    self.shifted([c for c in expr.children if c is not None], ids):
+                return True
+        return False
+
+    def offset(self, bound, offset):
+        """The loop bound `bound` shifted by `offset`."""
+        if offset == 0:
+            return bound
+        if isinstance(bound, Constant):
+            return Constant(value = bound.value + offset)
+        op = Plus() if offset > 0 else Minus()
+        return BinaryOperator(left = bound, op = op, right = Constant(value = abs(offset)))
+
+    def independent(self, expr):
+        dims = self.dims(getattr(expr, 'expr_type', None))
+        return None if dims is None else (frozenset(), dims)
+
+    def mentions(self, expr, ids):
+        if isinstance(expr, Variable):
+            return expr.id in ids
+        if isinstance(expr, SamplingStmt) or not isinstance(expr, IR):
+            return False
+        return any(self.mentions(c, ids) for c in expr.children if c is not None)
+
+    def sliced(self, expr, loops, subsample=False):
+        """Replace the indexes of `loops` by slices in the subscripts of
+        `expr`, or by the indices of the plate if it is subsampled."""
+        ids = [loop.id for loop in loops]
+        if isinstance(expr, Subscript) and self.mentions(expr.index, ids):
+            expr.index = self.slicedIndex(self.indexes(expr), loops, subsample)
+            return expr
+        if isinstance(expr, (Variable, Constant)):
+            return expr
+        if isinstance(expr, CallStmt):
+            dependent = self.mentions(expr, ids)
+            expr.args.children = [self.sliced(a, loops, subsample)
+                                  for a in expr.args.children]
+            if dependent and expr.id == 'dot_self':
+                [arg] = expr.args.children
+                return Sum(value = BinaryOperator(left = arg, op = Pow(),
+                                                  right = Constant(value = 2)))
+            return expr
+        if isinstance(expr, UnaryOperator):
+            expr.value = self.sliced(expr.value, loops, subsample)
+            return expr
+        if isinstance(expr, BinaryOperator):
+            expr.left = self.sliced(expr.left, loops, subsample)
+            expr.right = self.sliced(expr.right, loops, subsample)
+            return expr
+        return expr
+
+    def slicedIndex(self, indexes, loops, subsample=False):
+        ids = [loop.id for loop in loops]
+        answer = []
+        position = 0
+        for index in indexes:
+            loop_index = self.loopIndex(index, ids)
+            if loop_index is not None:
+                k, offset = loop_index
+                answer.extend(NewAxis() for _ in range(position, k))
+                if subsample:
+                    answer.append(PlateIndex(id = index.id))
+                else:
+                    answer.append(Slice(from_ = self.offset(loops[k].from_, offset),
+                                        to_ = self.offset(loops[k].to_, offset)))
+                position = k + 1
+            else:
+                answer.append(index)
+        answer.extend(NewAxis() for _ in range(position, len(loops)))
+        return answer[0] if len(answer) == 1 else Tuple(exprs = answer)
+
+
+class OptimizationVisitor(IRVisitor):
+    """Base of the passes optimizing the statements evaluated at each run
+    of the model: the transformed data, transformed parameters, model and
+    generated quantities blocks. They only move or share pure expressions:
+    arithmetic, subscripts and the functions of `pure` over variables and
+    constants. The values they introduce are stored in temporary
+    variables named after `prefix`."""
+
+    pure = frozenset(['exp', 'log', 'sqrt', 'softplus', 'fabs', 'inv_logit',
+                      'dot_self', 'log_sum_exp'])
+    arithmetic = (Plus, Minus, Mult, Div, DotMult, DotDiv, Pow)
+    prefix = None
+
+    def __init__(self):
+        super(OptimizationVisitor, self).__init__()
+        self.temporaries = 0
+        self._block = None
+
+    def defaultVisit(self, node):
+        return node
+
+    def visitProgram(self, program):
+        for block in [program.transformeddata, program.transformedparameters,
+                      program.model, program.generatedquantities]:
+            if block is not None:
+                self._block = block
+                block.body = self.statements(self.clone(block.body))
+        self._block = None
+        return program
+
+    def clone(self, node):
+        """Copy of the statements and expressions of `node`, which are
+        rewritten in place. The model shares some of them with the
+        transformed parameters. Their types are not copied."""
+        if isinstance(node, list):
+            return [self.clone(x) for x in node]
+        if not isinstance(node, IR) or isinstance(node, VariableDecl):
+            return node
+        answer = copy.copy(node)
+        for attr, value in vars(node).items():
+            if isinstance(value, (IR, list)):
+                setattr(answer, attr, self.clone(value))
+        return answer
+
+    def statements(self, stmts):
+        raise NotImplementedError
+
+    def key(self, expr):
+        """Structural description of the pure expression `expr`, the same
+        for the expressions computing the same value, or `None`."""
+        if isinstance(expr, Variable):
+            return (type(expr).__name__, expr.id)
+        if isinstance(expr, Constant):
+            return ('Constant', type(expr.value).__name__, expr.value,
+                    str(getattr(expr, 'expr_type', None)))
+        if isinstance(expr, (NewAxis, Operator)):
+            return (type(expr).__name__,)
+        if isinstance(expr, CallStmt):
+            if expr.id not in self.pure:
+                return None
+            children = expr.args.children
+        elif isinstance(expr, BinaryOperator):
+            if not isinstance(expr.op, self.arithmetic):
+                return None
+            children = expr.children
+        elif isinstance(expr, UnaryOperator):
+            if not isinstance(expr.op, (UPlus, UMinus)):
+                return None
+            children = expr.children
+        elif isinstance(expr, (Subscript, Slice, Tuple, Sum)):
+            children = expr.children
+        else:
+            return None
+        keys = tuple(self.key(c) for c in children)
+        if None in keys:
+            return None
+        return (type(expr).__name__, getattr(expr, 'id', None) if isinstance(expr, CallStmt)
+                else None, keys)
+
+    def isCandidate(self, expr):
+        """Pure expressions worth storing in a temporary variable."""
+        if isinstance(expr, (Variable, Constant, NewAxis, Operator, Slice, Tuple)):
+            return False
+        return getattr(expr, 'expr_type', None) is not None and self.key(expr) is not None
+
+    def isScalar(self, expr):
+        type_ = getattr(expr, 'expr_type', None)
+        return type_ is not None and type_.isPrimitive()
+
+    def variables(self, expr):
+        """Names of the variables of the pure expression `expr`."""
+        return set(var.id for var in self.variableNodes(expr))
+
+    def variableNodes(self, expr):
+        if isinstance(expr, Variable):
+            yield expr
+        elif isinstance(expr, IR):
+            for child in self.nodes(expr):
+                yield from self.variableNodes(child)
+
+    def nodes(self, node):
+        """The statements and expressions directly under `node`. The sample
+        statements do not have `children`: their target, distribution and
+        arguments are listed instead."""
+        if isinstance(node, SamplingStmt):
+            return [c for c in [node.target, node.id] + list(node.args) + [node.shape]
+                    if isinstance(c, IR)]
+        return [c for c in node.children if c is not None]
+
+    def mapNodes(self, node, f):
+        """Replace each statement or expression `c` directly under `node` by
+        `f(c)`."""
+        if isinstance(node, SamplingStmt):
+            node.target = f(node.target)
+            node.args = [f(a) for a in node.args]
+            if node.shape is not None:
+                node.shape = f(node.shape)
+        else:
+            node.children = [c if c is None else f(c) for c in node.children]
+
+    def scalarOnly(self, expr):
+        """`expr` cannot be modified through an alias by the assignment of
+        an element of an array: its value and its variables are scalars."""
+        return self.isScalar(expr) and \
+            all(self.isScalar(var) for var in self.variableNodes(expr))
+
+    def assigned(self, stmt):
+        """Return the names of the variables assigned by `stmt`, whether it
+        assigns elements of arrays in place, and whether it may have other
+        side effects on the variables."""
+        if isinstance(stmt, (AssignStmt, SamplingParameters, SamplingDeclaration)):
+            target = stmt.target
+            inplace = False
+            while isinstance(target, Subscript):
+                target = target.id
+                inplace = True
+            names = set([target.id]) if isinstance(target, Variable) else set()
+            return names, inplace, False
+        if isinstance(stmt, SamplingObserved):
+            return set(), False, False
+        if isinstance(stmt, VariableDecl):
+            return set([stmt.id]), False, False
+        if isinstance(stmt, ForStmt):
+            names, inplace, effects = self.assigned(stmt.body)
+            return names | set([stmt.id]), inplace, effects
+        if isinstance(stmt, (BlockStmt, ConditionalStmt)):
+            if isinstance(stmt, BlockStmt):
+                body = stmt.body
+            else:
+                body = [s for s in [stmt.true, stmt.false] if s is not None]
+            names, inplace, effects = set(), False, False
+            for s in body:
+                n, i, e = self.assigned(s)
+                names |= n
+                inplace = inplace or i
+                effects = effects or e
+            return names, inplace, effects
+        return set(), False, True
+
+    def expressions(self, stmt):
+        """The expressions of `stmt` evaluated before any of its variables
+        is assigned, as pairs of the statement and attribute holding them.
+        The targets of the sample statements are left unchanged since they
+        name the sample sites."""
+        if isinstance(stmt, AssignStmt):
+            return [(stmt, 'value')]
+        if isinstance(stmt, SamplingStmt):
+            return [(stmt.args, i) for i in range(len(stmt.args))]
+        if isinstance(stmt, ForStmt):
+            return [(stmt, 'from_'), (stmt, 'to_')]
+        if isinstance(stmt, ConditionalStmt):
+            return [(stmt, 'test')]
+        return []
+
+    def getLocation(self, location):
+        holder, attr = location
+        return holder[attr] if isinstance(attr, int) else getattr(holder, attr)
+
+    def setLocation(self, location, value):
+        holder, attr = location
+        if isinstance(attr, int):
+            holder[attr] = value
+        else:
+            setattr(holder, attr, value)
+
+    def replace(self, expr, f):
+        """Rewrite `expr`, bottom-up, replacing each node by `f(node)`."""
+        if isinstance(expr, IR) and not isinstance(expr, (Variable, Constant)):
+            self.mapNodes(expr, lambda c: self.replace(c, f))
+        return f(expr)
+
+    def temporary(self, expr):
+        """A new temporary variable holding the value of `expr`, and the
+        statement assigning it."""
+        self.temporaries += 1
+        name = '{}_{}'.format(self.prefix, self.temporaries)
+        return self.load(name, expr), AssignStmt(target = self.load(name, expr), value = expr)
+
+    def load(self, name, expr):
+        var = Variable(id = name)
+        var.block_name = self._block.blockName()
+        var.expr_type = expr.expr_type
+        return var
+
+    def evaluated(self, expr):
+        """The children of `expr` that are always evaluated with it: the
+        right operand of the logical operators is skipped."""
+        if isinstance(expr, BinaryOperator) and isinstance(expr.op, (And, Or)):
+            return [expr.left]
+        return self.nodes(expr)
+
+    def body(self, stmt):
+        """The statements of the body `stmt` of a loop or a conditional."""
+        return stmt.body if isinstance(stmt, BlockStmt) else [stmt]
+
+    def nested(self, stmt):
+        """Process the body `stmt` of a loop or a conditional."""
+        body = self.statements(self.body(stmt))
+        if isinstance(stmt, BlockStmt):
+            stmt.body = body
+            return stmt
+        return body[0] if len(body) == 1 else BlockStmt(body = body)
+
+
+class ConstantFoldingVisitor(OptimizationVisitor):
+    """Replace the arithmetic operations on scalar constants by their
+    value. They are computed as the generated python code would. As in
+    CPython's peephole optimizer, the integer powers are only computed
+    when the size of their result is bounded (see `safe`), and the
+    integers larger than `maxbits` bits are left unfolded."""
+
+    maxbits = 64
+
+    folders = {
+        Plus: operator.add,
+        Minus: operator.sub,
+        Mult: operator.mul,
+        DotMult: operator.mul,
+        Div: operator.truediv,
+        DotDiv: operator.truediv,
+        Pow: operator.pow,
+    }
+
+    def __init__(self):
+        super(ConstantFoldingVisitor, self).__init__()
+        self.folded = 0
+
+    def statements(self, stmts):
+        for stmt in stmts:
+            self.foldStmt(stmt)
+        return stmts
+
+    def foldStmt(self, stmt):
+        for location in self.expressions(stmt):
+            self.setLocation(location, self.replace(self.getLocation(location), self.fold))
+        if isinstance(stmt, AssignStmt) and isinstance(stmt.target, Subscript):
+            stmt.target.index = self.replace(stmt.target.index, self.fold)
+        if isinstance(stmt, ForStmt):
+            self.statements(self.body(stmt.body))
+        elif isinstance(stmt, ConditionalStmt):
+            for branch in [stmt.true, stmt.false]:
+                if branch is not None:
+                    self.statements(self.body(branch))
+        elif isinstance(stmt, BlockStmt):
+            self.statements(stmt.body)
+
+    def number(self, expr):
+        """`expr` is written as a number, not as an array, by
+        `Ir2PythonVisitor.visitConstant`."""
+        type_ = getattr(expr, 'expr_type', None)
+        return type_ is None or not type_.all_dimensions()
+
+    def constant(self, expr):
+        """The value of the constant number `expr`, or `None`."""
+        if isinstance(expr, Constant) and self.number(expr) and \
+                type(expr.value) in (int, float):
+            return expr.value
+        return None
+
+    def fold(self, expr):
+        if not self.number(expr):
+            return expr
+        if isinstance(expr, UnaryOperator) and isinstance(expr.op, (UPlus, UMinus)):
+            value = self.constant(expr.value)
+            if value is None:
+                return expr
+            return self.foldedConstant(expr, -value if isinstance(expr.op, UMinus) else value)
+        if isinstance(expr, BinaryOperator) and type(expr.op) in self.folders:
+            left = self.constant(expr.left)
+            right = self.constant(expr.right)
+            if left is None or right is None or not self.safe(expr.op, left, right):
+                return expr
+            try:
+                value = self.folders[type(expr.op)](left, right)
+            except (ArithmeticError, ValueError):
+                return expr
+            return self.foldedConstant(expr, value)
+        return expr
+
+    def safe(self, op, left, right):
+        """The value of `left op right` can be computed at compile time:
+        an integer power has at most `bit_length(left) * right` bits,
+        which must not exceed `maxbits`. The other operations on numbers
+        stay small or raise an error on overflow."""
+        if isinstance(op, Pow) and type(left) is int and type(right) is int and right > 0:
+            return left.bit_length() * right <= self.maxbits
+        return True
+
+    def foldedConstant(self, expr, value):
+        # Only values that python writes back as a number
+        if type(value) is float and not math.isfinite(value):
+            return expr
+        if type(value) is int and value.bit_length() > self.maxbits:
+            return expr
+        if type(value) not in (int, float):
+            return expr
+        self.folded += 1
+        const = Constant(value = value)
+        const.expr_type = expr.expr_type
+        return const
+
+
+class LoopInvariantVisitor(OptimizationVisitor):
+    """Hoist the pure expressions of the body of a loop that do not depend
+    on the variables assigned by the loop before it. The loops are
+    processed outermost first, so that an expression is computed outside
+    of all the loops it does not depend on. A loop assigning elements of
+    arrays in place only hoists scalars, which cannot be aliased. Plates
+    evaluate their body only once, and loops with statements of unknown
+    effects are left unchanged."""
+
+    prefix = '___invariant'
+
+    def statements(self, stmts):
+        answer = []
+        for stmt in stmts:
+            if isinstance(stmt, ForStmt) and not isinstance(stmt, Plate):
+                answer.extend(self.hoist(stmt))
+                stmt.body = self.nested(stmt.body)
+            elif isinstance(stmt, ConditionalStmt):
+                stmt.true = self.nested(stmt.true)
+                if stmt.false is not None:
+                    stmt.false = self.nested(stmt.false)
+            elif isinstance(stmt, BlockStmt):
+                stmt.body = self.statements(stmt.body)
+            answer.append(stmt)
+        return answer
+
+    def hoist(self, forstmt):
+        """Replace the invariant expressions of the body of `forstmt` by
+        temporaries, and return the statements computing them."""
+        variant, inplace, effects = self.assigned(forstmt)
+        if effects:
+            return []
+        self._variant = variant
+        self._inplace = inplace
+        self._hoisted = OrderedDict()
+        for stmt in self.body(forstmt.body):
+            self.hoistStmt(stmt, (forstmt,))
+        guarded = OrderedDict()
+        for (loops, _), (_, assign) in self._hoisted.items():
+            guarded.setdefault(loops, []).append(assign)
+        return [stmt for loops, assigns in guarded.items()
+                for stmt in self.guard(loops, assigns)]
+
+    def hoistStmt(self, stmt, loops):
+        """Hoist the invariant expressions of `stmt`, which is evaluated
+        when all the `loops` have at least one iteration. The branches
+        of the conditionals may not be evaluated: they are left as is."""
+        for location in self.expressions(stmt):
+            self.setLocation(location, self.rewrite(self.getLocation(location), loops))
+        if isinstance(stmt, Plate):
+            self.hoistStmt(stmt.body, loops)
+        elif isinstance(stmt, ForStmt):
+            if self.invariant(stmt.from_, True) and self.invariant(stmt.to_, True):
+                for s in self.body(stmt.body):
+                    self.hoistStmt(s, loops + (stmt,))
+        elif isinstance(stmt, BlockStmt):
+            for s in stmt.body:
+                self.hoistStmt(s, loops)
+
+    def invariant(self, expr, trivial = False):
+        """`expr` has the same value at each iteration of the loop. Unless
+        `trivial`, it must also be worth a temporary."""
+        if not (trivial and isinstance(expr, (Variable, Constant))) and \
+                not self.isCandidate(expr):
+            return False
+        if self.key(expr) is None or self.variables(expr) & self._variant:
+            return False
+        return self.scalarOnly(expr) if self._inplace else True
+
+    def rewrite(self, expr, loops):
+        if self.invariant(expr):
+            key = (loops, self.key(expr))
+            if key not in self._hoisted:
+                self._hoisted[key] = self.temporary(expr)
+            return self.load(self._hoisted[key][0].id, expr)
+        if isinstance(expr, IR) and not isinstance(expr, (Variable, Constant)):
+            evaluated = self.evaluated(expr)
+            self.mapNodes(expr, lambda c: self.rewrite(c, loops)
+                          if any(c is e for e in evaluated) else c)
+        return expr
+
+    def guard(self, loops, assigns):
+        """Evaluate `assigns` only if all the `loops` have an iteration,
+        as the expressions they hoist."""
+        tests = [BinaryOperator(left = copy.deepcopy(loop.from_), op = LE(),
+                                right = copy.deepcopy(loop.to_))
+                 for loop in loops if not self.nonEmpty(loop)]
+        if not tests:
+            return assigns
+        test = tests[0]
+        for t in tests[1:]:
+            test = BinaryOperator(left = test, op = And(), right = t)
+        return [ConditionalStmt(test = test, true = BlockStmt(body = assigns))]
+
+    def nonEmpty(self, loop):
+        return isinstance(loop.from_, Constant) and isinstance(loop.to_, Constant) and \
+            loop.from_.value <= loop.to_.value
+
+
+class CommonSubexpressionVisitor(OptimizationVisitor):
+    """Compute only once the pure expressions repeated in a sequence of
+    statements, as long as none of their variables is assigned in between.
+    The assignment of an element of an array, which may modify its aliases,
+    ends the sharing of all the values that are not scalars. The
+    statements with unknown effects end all the sharing. The largest
+    repeated expression is shared first, until none is left."""
+
+    prefix = '___cse'
+
+    def statements(self, stmts):
+        stmts = list(stmts)
+        while self.share(stmts):
+            pass
+        for stmt in stmts:
+            if isinstance(stmt, ForStmt) and not isinstance(stmt, Plate):
+                stmt.body = self.nested(stmt.body)
+            elif isinstance(stmt, ConditionalStmt):
+                stmt.true = self.nested(stmt.true)
+                if stmt.false is not None:
+                    stmt.false = self.nested(stmt.false)
+            elif isinstance(stmt, BlockStmt):
+                stmt.body = self.statements(stmt.body)
+        return stmts
+
+    def occurrences(self, stmts):
+        """Groups of the occurrences of the same value, as lists of pairs
+        of the index of the statement and the expression."""
+        live = {}
+        groups = []
+        for i, stmt in enumerate(stmts):
+            for location in self.expressions(stmt):
+                for expr in self.subexpressions(self.getLocation(location)):
+                    live.setdefault(self.key(expr), []).append((i, expr))
+            names, inplace, effects = self.assigned(stmt)
+            for key, group in list(live.items()):
+                expr = group[0][1]
+                if effects or self.variables(expr) & names or \
+                        (inplace and not self.scalarOnly(expr)):
+                    groups.append(group)
+                    del live[key]
+        return groups + list(live.values())
+
+    def subexpressions(self, expr):
+        if self.isCandidate(expr):
+            yield expr
+        if isinstance(expr, IR) and not isinstance(expr, (Variable, Constant)):
+            for child in self.evaluated(expr):
+                yield from self.subexpressions(child)
+
+    def size(self, expr):
+        if not isinstance(expr, IR) or isinstance(expr, (Variable, Constant)):
+            return 1
+        return 1 + sum(self.size(c) for c in self.nodes(expr))
+
+    def share(self, stmts):
+        """Share the largest repeated expression of `stmts`, if any."""
+        groups = [g for g in self.occurrences(stmts) if len(g) > 1]
+        if not groups:
+            return False
+        group = max(groups, key = lambda g: self.size(g[0][1]))
+        first, expr = group[0]
+        var, assign = self.temporary(expr)
+        nodes = set(id(e) for _, e in group)
+        for stmt in stmts[first:group[-1][0] + 1]:
+            for location in self.expressions(stmt):
+                self.setLocation(location, self.replace(self.getLocation(location),
+                         lambda e: self.load(var.id, e) if id(e) in nodes else e))
+        stmts.insert(first, assign)
+        return True
+
+
+class AllocationVisitor(OptimizationVisitor):
+    """Remove the default value `zeros(x.shape)` of the arrays assigned as
+    a whole before any use, like the loops turned into a single assignment
+    by the vectorization: the value assigned is computed as a new array
+    anyway. The arrays assigned element by element keep their allocation."""
+
+    def statements(self, stmts):
+        answer = []
+        for i, stmt in enumerate(stmts):
+            name = self.allocated(stmt)
+            if name is not None and self.overwritten(name, stmts[i + 1:]):
+                continue
+            if isinstance(stmt, ForStmt) and not isinstance(stmt, Plate):
+                stmt.body = self.nested(stmt.body)
+            elif isinstance(stmt, ConditionalStmt):
+                stmt.true = self.nested(stmt.true)
+                if stmt.false is not None:
+                    stmt.false = self.nested(stmt.false)
+            elif isinstance(stmt, BlockStmt):
+                stmt.body = self.statements(stmt.body)
+            answer.append(stmt)
+        return answer
+
+    def allocated(self, stmt):
+        """The name of the array allocated by `stmt`, as the default values
+        of `VariableInitializationVisitor`, or `None`."""
+        if not (isinstance(stmt, AssignStmt) and isinstance(stmt.target, Variable)):
+            return None
+        value = stmt.value
+        if not (isinstance(value, CallStmt) and value.id == 'zeros' and
+                len(value.args.elements) == 1):
+            return None
+        shape = value.args.elements[0]
+        if isinstance(shape, VariableProperty) and shape.prop == 'shape' and \
+                isinstance(shape.var, Variable) and shape.var.id == stmt.target.id:
+            return stmt.target.id
+        return None
+
+    def overwritten(self, name, stmts):
+        """The variable `name` is assigned as a whole by `stmts` before any
+        other use."""
+        for stmt in stmts:
+            if isinstance(stmt, AssignStmt) and isinstance(stmt.target, Variable) \
+                    and stmt.target.id == name:
+                return name not in self.mentioned(stmt.value)
+            if name in self.mentioned(stmt):
+                return False
+        return False
+
+    def mentioned(self, node):
+        """Names of the variables of the statement or expression `node`."""
+        if isinstance(node, list):
+            return set().union(*[self.mentioned(n) for n in node])
+        if isinstance(node, (Variable, VariableDecl)):
+            return set([node.id])
+        if isinstance(node, IR):
+            return self.mentioned(self.nodes(node))
+        return set()
+
+
 class Ir2PythonVisitor(IRVisitor):
     new_distributions = {name.lower(): name for name in [
                             'bernoulli_logit',
@@ -598,9 +1628,21 @@ class Ir2PythonVisitor(IRVisitor):
         self._model_header = []
         self._guide_header = []
         self._observed = 0
+        self._plate_site = None
         self.forIndexes = []
         self.type_infer = type_infer
         self.verbose = verbose
+        # Arrays of constants built once with the transformed data
+        self._constants = OrderedDict()
+        self._hoistConstants = False
+        # Indexes of the enclosing loops generated as JAX loops
+        self._functionalIndexes = []
+        self._functionalLoops = 0
+        # Sample statements of the body of a `scan` have static names
+        self._scanned = False
+        # Some plate of the model is subsampled: the model and the guide
+        # take the `subsample_size` of the minibatches
+        self._subsampled = False
         self._config = config
         self._moduleHeader = ModuleHeader.create(config, self.helper)
         
@@ -661,6 +1703,34 @@ class Ir2PythonVisitor(IRVisitor):
         args = args.elts if args else []
         return self.call(id, args=args)
 
+    def constantArray(self, name, dims):
+        """The array `name(*dims)` of zeros or ones. With the `optimize`
+        option, the arrays of the model whose dimensions are given by the
+        data are built once with the transformed data instead of at each
+        run, and read as transformed data."""
+        value = self.call(self.loadName(name), args=dims)
+        if not (self._config.optimize and self._hoistConstants):
+            return value
+        static = self.data_names | self._transformed_data_names
+        if not all(isinstance(d, ast.Num) or
+                   (isinstance(d, ast.Name) and d.id in static) for d in dims):
+            return value
+        key = astor.to_source(value).strip()
+        if key not in self._constants:
+            constant = '___constant_{}'.format(len(self._constants) + 1)
+            self._constants[key] = (constant, value)
+            self._transformed_data_names.add(constant)
+        return self.loadName(self._constants[key][0])
+
+    @contextmanager
+    def hoistingConstants(self, enabled=True):
+        previous = self._hoistConstants
+        self._hoistConstants = enabled
+        try:
+            yield
+        finally:
+            self._hoistConstants = previous
+
     def _funcDef(self, name = None, args = [], defaults=[], body = []):
         return ast.FunctionDef(
                 name = name,
@@ -676,33 +1746,62 @@ class Ir2PythonVisitor(IRVisitor):
             )
 
     def targetToName(self, target, observed = None):
+        """Name of the sample site of `target`. The parts of the name known
+        at compile time are folded into a single template. The names
+        depending on loop indexes are looked up in the `site_names` table,
+        which formats each of them only once."""
+        template, args = self.siteTemplate(target, observed = observed)
+        if not args:
+            return ast.Str(template.format())
+        key = ast.Tuple(elts = [ast.Str(template)] + args, ctx = ast.Load())
+        return ast.Subscript(value = self.loadName('site_names'),
+                             slice = ast.Index(value = key),
+                             ctx = ast.Load())
+
+    def siteTemplate(self, target, observed = None):
         if isinstance(target, ast.Name):
-            base = ast.Str(target.id)
+            template, args = target.id, []
         elif isinstance(target, ast.Subscript):
-            base = self.targetToName(target.value)
+            template, args = self.siteTemplate(target.value)
             arg = target.slice.value
-            format = self.loadAttr(ast.Str('__{}'), 'format')
-            formatted = self.call(format, args = [arg,])
-            base = ast.BinOp(left = base,
-                             right = formatted,
-                             op = ast.Add())
+            value = self.constantValue(arg)
+            if value is None:
+                template += '__{}'
+                args.append(arg)
+            else:
+                # The braces of the constant indexes are not fields
+                template += '__' + str(value).replace('{', '{{').replace('}', '}}')
         elif observed is not None:
             # arbitrary expressions
-            base = ast.Str('expr')
+            template, args = 'expr', []
             for idx in self.forIndexes:
-                arg = self.loadName(idx)
-                format = self.loadAttr(ast.Str('__{}'), 'format')
-                formatted = self.call(format, args = [arg,])
-                base = ast.BinOp(left = base,
-                                 right = formatted,
-                                 op = ast.Add())
+                template += '__{}'
+                args.append(self.loadName(idx))
         else:
             assert False, "Don't know how to stringfy: {}".format(target)
-        if observed is None:
-            return base
-        else:
-            observed_str = ast.Str('__' + str(observed))
-            return ast.BinOp(left = base, right = observed_str, op = ast.Add())
+        if observed is not None:
+            template += '__' + str(observed)
+        return template, args
+
+    def constantValue(self, node):
+        """Value of the index `node` if it is known at compile time."""
+        if isinstance(node, ast.Num):
+            return node.n
+        if isinstance(node, ast.Str):
+            return node.s
+        if isinstance(node, ast.Tuple):
+            values = [self.constantValue(x) for x in node.elts]
+            return None if None in values else tuple(values)
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+            value = self.constantValue(node.operand)
+            return None if value is None else -value
+        if isinstance(node, ast.BinOp) and isinstance(node.op, (ast.Add, ast.Sub)):
+            left = self.constantValue(node.left)
+            right = self.constantValue(node.right)
+            if left is None or right is None:
+                return None
+            return left + right if isinstance(node.op, ast.Add) else left - right
+        return None
 
     def visitConstant(self, const):
         if hasattr(const, 'expr_type'):
@@ -711,9 +1810,9 @@ class Ir2PythonVisitor(IRVisitor):
                 return ast.Num(const.value)
             args = [self.dimensionToAST(d) for d in dims]
             if const.value == 0:
-                return self.call(self.loadName("zeros"), args=args)
+                return self.constantArray("zeros", args)
             else:
-                ones = self.call(self.loadName("ones"), args=args)
+                ones = self.constantArray("ones", args)
                 if const.value == 1:
                     return ones
                 else:
@@ -768,7 +1867,10 @@ class Ir2PythonVisitor(IRVisitor):
             right=lower)
 
     def visitAssignStmt(self, ir):
-        target, value = self._visitChildren(ir)
+        # The array assigned may be modified in place: it cannot be shared
+        with self.hoistingConstants(self._hoistConstants and
+                                    not isinstance(ir.value, Constant)):
+            target, value = self._visitChildren(ir)
         if ir.target.is_variable():
             if ir.target.is_guide_parameters_var():
                 target_name = self.targetToName(target)
@@ -798,24 +1900,51 @@ class Ir2PythonVisitor(IRVisitor):
                                     value,
                                     ## XXX possible constraints
                             ])
+        if self._config.numpyro and isinstance(target, ast.Subscript):
+            return self.functionalAssign(target, value)
         if self.verbose and ir.target.expr_type is not None:
             ctype = ir.target.expr_type.canon((self.type_infer.dims_canon_map))
             return self._assign(target, value, var_type=self.typeToAnnotation(ctype))
         else:
             return self._assign(target, value)
 
+    def functionalAssign(self, target, value):
+        """`x = x.at[i].set(value)` for the assignment of the element
+        `target` of a JAX array, which cannot be modified in place."""
+        while isinstance(target, ast.Subscript):
+            at = ast.Subscript(value = self.loadAttr(target.value, 'at'),
+                               slice = target.slice,
+                               ctx = ast.Load())
+            value = self.call(self.loadAttr(at, 'set'), args = [value])
+            target = target.value
+        return self._assign(target, value)
+
     def _pyroattr(self, attr):
         return self.loadAttr(self.loadName('pyro'), attr)
 
     def visitForStmt(self, forstmt):
         ## TODO: id is not an object of ir!
         id = forstmt.id
+        functional = self.functionalLoop(forstmt)
         self.forIndexes.append(id)
+        if functional is not None:
+            carried, scanned = functional
+            self._functionalLoops += 1
+            name = '___{}_{}'.format('scan' if scanned else 'loop', self._functionalLoops)
+            self._functionalIndexes.append(id)
+            enclosing, self._scanned = self._scanned, scanned
         from_, to_, body = self._visitChildren(forstmt)
+        if functional is not None:
+            self._scanned = enclosing
+            self._functionalIndexes.pop()
         self.forIndexes.pop()
         incl_to = ast.BinOp(left = to_,
                             right = ast.Num(1),
                             op = ast.Add())
+        if functional is not None and scanned:
+            return self.scan(name, id, from_, incl_to, body, carried)
+        if functional is not None:
+            return self.foriLoop(name, id, from_, incl_to, body, carried)
         interval = [from_, incl_to]
         iter = self.call(self.loadName('range'),
                                 interval)
@@ -825,6 +1954,116 @@ class Ir2PythonVisitor(IRVisitor):
                         body = body,
                         orelse = [])
 
+    def functionalLoop(self, forstmt):
+        """The pair of the names of the arrays updated by the iterations of
+        `forstmt` and of whether the loop observes values, if it is
+        generated as a `fori_loop` or as a `scan` of NumPyro, `None`
+        otherwise. The body must only assign arrays, no conditionals or
+        slices, which cannot depend on the traced loop index. The bounds of
+        the loop must not be traced either, for the loop to be
+        differentiable. The recurrences observing values, like the time
+        series, are a `scan`, which records each observe statement of the
+        body as a single site for all the iterations."""
+        if not self._config.numpyro or isinstance(forstmt, Plate):
+            return None
+        if self.irVariables([forstmt.from_, forstmt.to_]) & set(self._functionalIndexes):
+            return None
+        assigned, declared, observed = set(), set([forstmt.id]), []
+        if not self.functionalBody(forstmt.body, assigned, declared, observed):
+            return None
+        carried = sorted(assigned - declared)
+        if not carried:
+            return None
+        for name in carried:
+            # The type of the scalars may change between iterations
+            type_ = self.typeOfVariable(name)
+            if type_ is None or not type_.all_dimensions():
+                return None
+        return carried, bool(observed)
+
+    def functionalBody(self, stmt, assigned, declared, observed = None):
+        if isinstance(stmt, BlockStmt):
+            return all(self.functionalBody(s, assigned, declared, observed)
+                       for s in stmt.body)
+        if isinstance(stmt, VariableDecl):
+            declared.add(stmt.id)
+            return True
+        if isinstance(stmt, ForStmt) and not isinstance(stmt, Plate):
+            if self.irVariables([stmt.from_, stmt.to_]) & declared:
+                return False
+            declared.add(stmt.id)
+            # The sites of a nested loop would have traced names
+            return self.functionalBody(stmt.body, assigned, declared)
+        if isinstance(stmt, SamplingObserved) and observed is not None:
+            if self.hasSlice([stmt.target] + list(stmt.args)):
+                return False
+            observed.append(stmt)
+            return True
+        if isinstance(stmt, AssignStmt):
+            target = stmt.target
+            while isinstance(target, Subscript):
+                target = target.id
+            if not isinstance(target, Variable) or \
+                    self.hasSlice([stmt.target, stmt.value]):
+                return False
+            assigned.add(target.id)
+            return True
+        return False
+
+    def irVariables(self, nodes):
+        """Names of the variables of the IR expressions `nodes`."""
+        names = set()
+        for node in nodes:
+            if isinstance(node, Variable):
+                names.add(node.id)
+            elif isinstance(node, IR):
+                names |= self.irVariables([c for c in node.children if c is not None])
+        return names
+
+    def hasSlice(self, nodes):
+        return any(isinstance(node, Slice) or
+                   (isinstance(node, IR) and
+                    self.hasSlice([c for c in node.children if c is not None]))
+                   for node in nodes)
+
+    def foriLoop(self, name, id, from_, to_, body, carried):
+        """The `fori_loop` over `range(from_, to_)` of JAX computing the
+        `body` of a loop, which updates the arrays `carried`. The body is
+        the function `name` of the index `id` and of the carried values."""
+        def values(ctx):
+            return ast.Tuple(elts = [ast.Name(id = x, ctx = ctx()) for x in carried],
+                             ctx = ctx())
+        unpack = ast.Assign(targets = [values(ast.Store)], value = self.loadName('___carry'))
+        f = self._funcDef(name = name,
+                          args = [ast.arg(id, None), ast.arg('___carry', None)],
+                          body = [unpack] + self._ensureStmtList(body) +
+                                 [ast.Return(values(ast.Load))])
+        loop = self.call(self.loadName('fori_loop'),
+                         args = [from_, to_, self.loadName(name), values(ast.Load)])
+        return [f, ast.Assign(targets = [values(ast.Store)], value = loop)]
+
+    def scan(self, name, id, from_, to_, body, carried):
+        """The `scan` of NumPyro over `arange(from_, to_)` computing the
+        `body` of a loop, which updates the arrays `carried` and observes
+        values. The body is the function `name` of the carried values and
+        of the index `id`."""
+        def values(ctx):
+            return ast.Tuple(elts = [ast.Name(id = x, ctx = ctx()) for x in carried],
+                             ctx = ctx())
+        unpack = ast.Assign(targets = [values(ast.Store)], value = self.loadName('___carry'))
+        result = ast.Tuple(elts = [values(ast.Load), ast.NameConstant(None)],
+                           ctx = ast.Load())
+        f = self._funcDef(name = name,
+                          args = [ast.arg('___carry', None), ast.arg(id, None)],
+                          body = [unpack] + self._ensureStmtList(body) +
+                                 [ast.Return(result)])
+        indexes = self.call(self.loadName('arange'), args = [from_, to_])
+        loop = self.call(self.loadName('scan'),
+                         args = [self.loadName(name), values(ast.Load), indexes])
+        targets = ast.Tuple(elts = [values(ast.Store), self.storeName('_')],
+                            ctx = ast.Store())
+        return [f, ast.Assign(targets = [targets], value = loop)]
+
     def visitConditionalStmt(self, conditional):
         test, true = self._visitAll((conditional.test,
                                    conditional.true))
@@ -871,6 +2110,9 @@ class Ir2PythonVisitor(IRVisitor):
     def visitDotMult(self, dummy):
         return ast.Mult()
 
+    def visitPow(self, dummy):
+        return ast.Pow()
+
     def visitDiv(self, dummy):
         return ast.Div()
 
@@ -907,12 +2149,46 @@ class Ir2PythonVisitor(IRVisitor):
 
     def visitSubscript(self, subscript):
         id, idx = self._visitChildren(subscript)
+        if isinstance(idx, ast.Slice):
+            return ast.Subscript(value = id, slice = idx, ctx = ast.Load())
+        if isinstance(subscript.index, PlateIndex):
+            return ast.Subscript(value = id, slice = ast.Index(value = idx),
+                                 ctx = ast.Load())
+        if isinstance(idx, ast.Tuple) and \
+                any(isinstance(x, ast.Slice) or self.isNewAxis(x) or
+                    isinstance(i, PlateIndex)
+                    for x, i in zip(idx.elts, subscript.index.exprs)):
+            dims = [x if isinstance(x, ast.Slice) else
+                    ast.Index(value = x if self.isNewAxis(x) or isinstance(i, PlateIndex)
+                              else self.shiftIdx(x))
+                    for x, i in zip(idx.elts, subscript.index.exprs)]
+            return ast.Subscript(value = id,
+                                 slice = ast.ExtSlice(dims = dims),
+                                 ctx = ast.Load())
         idx_z = self.shiftIdx(idx)
         return ast.Subscript(
                 value = id,
                 slice=ast.Index(value=idx_z),
                 ctx=ast.Load())
 
+    def isNewAxis(self, node):
+        return isinstance(node, ast.NameConstant) and node.value is None
+
+    def visitPlateIndex(self, index):
+        return self.loadName(index.id)
+
+    def visitNewAxis(self, dummy):
+        return ast.NameConstant(value = None)
+
+    def visitSum(self, sum_):
+        value = sum_.value.accept(self)
+        return self.call(self.loadAttr(value, 'sum'),
+                         args = [ast.UnaryOp(op = ast.USub(), operand = ast.Num(1))])
+
+    def visitSlice(self, slice_):
+        from_, to_ = self._visitChildren(slice_)
+        return ast.Slice(lower = self.shiftIdx(from_), upper = to_, step = None)
+
     def samplingDist(self, sampling):
         kwds = []
         result_shape = sampling.expr_type.all_dimensions()
@@ -928,12 +2204,12 @@ class Ir2PythonVisitor(IRVisitor):
                     dims = [self.dimensionToAST(d) for d in target_shape]
                     if isinstance(arg, ast.Num):
                         if arg.n == 0:
-                            zeros = self.call(self.loadName("zeros"), args=dims)
+                            zeros = self.constantArray("zeros", dims)
                             return zeros
                         elif arg.n == 1:
-                            ones = self.call(self.loadName("ones"), args=dims)
-                            return zeros
-                    ones = self.call(self.loadName("ones"), args=dims)
+                            ones = self.constantArray("ones", dims)
+                            return ones
+                    ones = self.constantArray("ones", dims)
                     return ast.BinOp(left = arg,
                                 right = ones,
                                 op = ast.Mult())
@@ -949,7 +2225,7 @@ class Ir2PythonVisitor(IRVisitor):
             if not isinstance(sh, ast.Tuple) or len(sh.elts) != 0:
                 kwds.append(ast.keyword('shape', sh))
         id = sampling.id
-        if hasattr(torch.distributions, id.capitalize()):
+        if id.capitalize() in torch_distributions:
             # Check if the distribution exists in torch.distributions
             dist = self.loadAttr(self.loadName('dist'), id.capitalize())
         ## XXX We need keyword parameters
@@ -987,12 +2263,51 @@ class Ir2PythonVisitor(IRVisitor):
         target = sampling.target.accept(self)
         keyword = ast.keyword(arg='obs', value = target)
         self._observed += 1
+        if self._plate_site is not None or self._scanned:
+            # Vectorized or scanned: a single site for all the iterations
+            site = '{}__{}'.format(self.siteBase(sampling.target), self._observed)
+            if self._plate_site is not None:
+                self._plate_site = site
+            call = self.call(self.loadName('sample'),
+                             args = [ast.Str(site), self.samplingDist(sampling)],
+                             keywords = [keyword])
+            return ast.Expr(value = call)
         call = self.samplingCall(sampling,
                                 target,
                                 keywords = [keyword],
                                 observed = self._observed)
         return ast.Expr(value = call)
 
+    def siteBase(self, target):
+        while isinstance(target, Subscript):
+            target = target.id
+        return target.id if isinstance(target, Variable) else 'expr'
+
+    def visitPlate(self, plate):
+        from_, to_ = self._visitAll([plate.from_, plate.to_])
+        self._plate_site = ''
+        body = self._ensureStmtList(plate.body.accept(self))
+        site = self._plate_site
+        self._plate_site = None
+        if isinstance(from_, ast.Num) and from_.n == 1:
+            size = to_
+        else:
+            size = ast.BinOp(left = ast.BinOp(left = to_, right = from_, op = ast.Sub()),
+                             right = ast.Num(1), op = ast.Add())
+        dim = ast.UnaryOp(op = ast.USub(), operand = ast.Num(-plate.dim))
+        keywords = [ast.keyword(arg = 'dim', value = dim)]
+        indices = None
+        if plate.subsample:
+            keywords.insert(0, ast.keyword(arg = 'subsample_size',
+                                           value = self.loadName('subsample_size')))
+            indices = ast.Name(id = plate.id, ctx = ast.Store())
+        plate_call = self.call(self.loadName('plate'),
+                               args = [ast.Str(site + '__plate'), size],
+                               keywords = keywords)
+        return ast.With(items = [ast.withitem(context_expr = plate_call,
+                                              optional_vars = indices)],
+                        body = body)
+
     def visitSamplingParameters(self, sampling):
         """Sample a parameter."""
         target = sampling.target.accept(self)
@@ -1115,7 +2430,8 @@ class Ir2PythonVisitor(IRVisitor):
     visitParameters = visitData
 
     def visitTransformedParameters(self, transformed_parameters):
-        body = self._visitChildren(transformed_parameters)
+        with self.hoistingConstants():
+            body = self._visitChildren(transformed_parameters)
         body = self._ensureStmtList(body)
         self._transformed_parameters = body
         return None
@@ -1127,10 +2443,25 @@ class Ir2PythonVisitor(IRVisitor):
 
     def visitModel(self, model):
         body = self.liftBlackBox(model)
-        body.extend(self._visitChildren(model))
+        with self.hoistingConstants():
+            body.extend(self._visitChildren(model))
+        body.extend(self.buildDeterministicSites())
         body = self._ensureStmtList(body)
         return self.buildModel(body)
 
+    def recordedParameters(self):
+        """Transformed parameters recorded in deterministic sites."""
+        if not self._config.deterministic:
+            return []
+        excluded = set(self._config.deterministic_exclude)
+        return sorted(self._transformed_parameters_names - excluded)
+
+    def buildDeterministicSites(self):
+        deterministic = self.loadName('deterministic')
+        return [ast.Expr(value = self.call(deterministic,
+                                           args = [ast.Str(name), self.loadName(name)]))
+                for name in self.recordedParameters()]
+
     def getParametersSample(self, parameters, names):
         samples = []
         for name in sorted(names):
@@ -1141,21 +2472,80 @@ class Ir2PythonVisitor(IRVisitor):
             samples.append(self._assign(self.loadName(name), param))
         return samples
 
+    def buildTransformedParametersAccess(self):
+        """The transformed parameters recorded in deterministic sites are
+        read from the draws returning them. Only the statements needed by
+        the excluded ones are evaluated then (see `neededStatements`). The
+        other draws compute all the transformed parameters."""
+        recorded = self.recordedParameters()
+        if not recorded:
+            return self._transformed_parameters
+        body = self.getParametersSample('parameters', recorded)
+        excluded = self._transformed_parameters_names - set(recorded)
+        if excluded:
+            body.extend(self.neededStatements(self._transformed_parameters,
+                                              excluded, recorded))
+        keys = self.call(self.loadAttr(self.loadName('parameters'), 'keys'))
+        test = ast.Compare(left = ast.Set(elts = [ast.Str(name) for name in recorded]),
+                           ops = [ast.LtE()],
+                           comparators = [keys])
+        return [ast.If(test = test,
+                       body = body,
+                       orelse = self._transformed_parameters)]
+
+    def neededStatements(self, stmts, names, available = ()):
+        """The python statements of `stmts` needed to compute the variables
+        `names` at their end, when the variables `available` are already
+        known. A statement is kept if it assigns one of the variables
+        needed after it, as a whole or in place, or if it assigns none
+        (like a call, of unknown effects). The variables it reads are then
+        needed before it, unless they are available, and so are those it
+        assigns: the arrays it updates are computed again rather than
+        modified, even if they are available."""
+        needed = set(names)
+        answer = []
+        for stmt in reversed(stmts):
+            stored = self.storedNames(stmt)
+            if stored and not stored & needed:
+                continue
+            loaded = set(node.id for node in ast.walk(stmt) if isinstance(node, ast.Name))
+            needed |= stored | (loaded - stored - set(available))
+            answer.append(stmt)
+        return answer[::-1]
+
+    def storedNames(self, stmt):
+        """Names of the variables assigned by the python statement `stmt`,
+        including the arrays whose elements it assigns."""
+        names = set()
+        for node in ast.walk(stmt):
+            if isinstance(node, (ast.FunctionDef, ast.ClassDef)):
+                names.add(node.name)
+            elif isinstance(getattr(node, 'ctx', None), ast.Store):
+                while isinstance(node, (ast.Subscript, ast.Attribute)):
+                    node = node.value
+                if isinstance(node, ast.Name):
+                    names.add(node.id)
+        return names
+
     def buildGeneratedQuantities(self):
         transformed_parameters = self._program.transformedparameters
         generated_quantities = self._program.generatedquantities
         name = 'generated_quantities'
+        if not (generated_quantities is None):
+            # Before the arguments, which include the constants it uses
+            with self.hoistingConstants():
+                gq_body = self._visitChildren(generated_quantities)
         args = self.modelArgs(with_parameters_sample=True)
         body = []
         body.extend(self.buildTransformedDataAccess())
         body.extend(self.getParametersSample('parameters', self._parameters_names))
         body.extend(self.buildBasicHeaders())
-        body.extend(self._transformed_parameters)
+        body.extend(self.buildTransformedParametersAccess())
         dd = sorted(self._transformed_parameters_names)
         k = [ast.Str(name) for name in dd]
         v = [self.loadName(name) for name in dd]
         if not (generated_quantities is None):
-            body.extend(self._visitChildren(generated_quantities))
+            body.extend(gq_body)
             gqn = sorted(self._generated_quantities_names)
             k.extend([ast.Str(gq_name) for gq_name in gqn])
             v.extend([self.loadName(gq_name) for gq_name in gqn])
@@ -1230,7 +2620,7 @@ class Ir2PythonVisitor(IRVisitor):
         is_net = len(guide._nets) > 0
         assert (is_net and len(guide._nets) == 1) or not is_net
         name = guide._nets[0] if is_net else  ''
-        args = self.modelArgs()
+        args = self.modelArgs(with_subsample=True)
         ## TODO: only one nn is suported in here.
         name_guide = 'guide_' + name ## XXX
         pre_body = self.liftBlackBox(guide)
@@ -1261,7 +2651,8 @@ class Ir2PythonVisitor(IRVisitor):
         else:
             return ast.Str(str(t))
 
-    def modelArgs(self, no_transformed_data=False, with_parameters_sample=False):
+    def modelArgs(self, no_transformed_data=False, with_parameters_sample=False,
+                  with_subsample=False):
         args = [ast.arg(name, self.typeToAnnotation(self.typeOfVariable(name)) if self.verbose else None)
             for name in sorted(self.data_names)]
         defaults = [ ast.NameConstant(None) for name in self.data_names ]
@@ -1271,6 +2662,10 @@ class Ir2PythonVisitor(IRVisitor):
         if with_parameters_sample:
             args.append(ast.arg('parameters', None))
             defaults.append(ast.NameConstant(None))
+        if with_subsample and self._subsampled:
+            # Size of the subsampled plates, all the elements by default
+            args.append(ast.arg('subsample_size', None))
+            defaults.append(ast.NameConstant(None))
         return { 'args': args, 'defaults': defaults }
 
     def buildPrior(self, prior, basename):
@@ -1300,7 +2695,7 @@ class Ir2PythonVisitor(IRVisitor):
 
     def buildModel(self, inner_body):
         name = 'model'
-        args = self.modelArgs()
+        args = self.modelArgs(with_subsample=True)
         td_access = self.buildTransformedDataAccess()
         pre_body = []
         for prior in self._priors:
@@ -1327,6 +2722,7 @@ class Ir2PythonVisitor(IRVisitor):
 
     def visitProgram(self, program):
         self._program = program
+        self._subsampled = self.hasSubsampledPlate(program.model)
         self.buildHeaders(program)
         python_nodes = [node.accept(self) for node in [
                                                         program.transformeddata,
@@ -1337,20 +2733,103 @@ class Ir2PythonVisitor(IRVisitor):
                                                 if node]
         if program.generatedquantities is not None or program.transformedparameters is not None:
             python_nodes += [self.buildGeneratedQuantities()]
+        if self._constants:
+            python_nodes = self.buildConstants(python_nodes)
         body = self._ensureStmtList(python_nodes)
         module = ast.Module()
-        module.body = self._moduleHeader.build() + body
+        module.body = self._moduleHeader.build() + body + self._moduleHeader.footer(body)
         ast.fix_missing_locations(module)
         if from_test():
             # astpretty.pprint(module)
             print(astor.to_source(module))
         return module
 
+    def hasSubsampledPlate(self, node):
+        if isinstance(node, Plate) and node.subsample:
+            return True
+        if isinstance(node, list):
+            return any(self.hasSubsampledPlate(x) for x in node)
+        if not isinstance(node, IR) or isinstance(node, SamplingStmt):
+            return False
+        return any(self.hasSubsampledPlate(x) for x in node.children if x is not None)
+
+    def buildConstants(self, functions):
+        """Build the arrays of `constantArray` in the transformed data,
+        which the functions built before reading them also receive."""
+        assigns = [self._assign(self.loadName(name), value)
+                   for name, value in self._constants.values()]
+        td = [f for f in functions
+              if isinstance(f, ast.FunctionDef) and f.name == 'transformed_data']
+        if td:
+            f = td[0]
+            ret = f.body[-1]
+            f.body[-1:] = assigns + [ret]
+            for name, _ in self._constants.values():
+                ret.value.keys.append(ast.Str(name))
+                ret.value.values.append(self.loadName(name))
+        else:
+            td_names = self._transformed_data_names
+            self._transformed_data_names = set(name for name, _ in self._constants.values())
+            f = self.visitTransformedData(TransformedData(body = []))
+            self._transformed_data_names = td_names
+            f.body[-1:] = assigns + f.body[-1:]
+            functions = [f] + functions
+        for f in functions:
+            if not isinstance(f, ast.FunctionDef):
+                continue
+            names = [arg.arg for arg in f.args.args]
+            if f.name != 'transformed_data' and 'transformed_data' not in names:
+                position = len(self.data_names)
+                f.args.args.insert(position, ast.arg('transformed_data', None))
+                f.args.defaults.insert(position, ast.NameConstant(None))
+        return functions
+
 class ModuleHeader(object):
-    def __init__(self, helper):
+    # Functions defined by `utils.build_hooks`
+    hooks = [
+        'bernoulli_logit',
+        'categorical_logits',
+        'binomial_logit',
+        'poisson_log',
+        'ImproperUniform',
+        'LowerConstrainedImproperUniform',
+        'UpperConstrainedImproperUniform',
+        'log',
+        'dot_self',
+        'log_sum_exp',
+        'inv_logit',
+        'site_names',
+    ]
+
+    def __init__(self, helper, standalone=False):
         self._helper = helper
+        self._standalone = standalone
         
     def build(self):
+        answer = self.imports()
+        if self._standalone:
+            answer += self.runtime()
+        return answer
+
+    def footer(self, body):
+        """In a standalone module, the transformed data and the generated
+        quantities are bound to the names of `PyroModel._np_scoped`, as when
+        the model is loaded by `PyroModel`."""
+        if not self._standalone:
+            return []
+        names = [node.name for node in body if isinstance(node, ast.FunctionDef)
+                 and node.name in ('transformed_data', 'generated_quantities')]
+        return [ast.Assign(targets=[self._helper.storeName(name)],
+                           value=self._helper.call(self._helper.loadName('np_scoped'),
+                                                   [self._helper.loadName(name)]))
+                for name in names]
+
+    def imports(self):
+        raise NotImplementedError
+
+    def runtime(self):
+        """Imports of the names bound by `PyroModel._stan_scoped`,
+        in the same order so that later names shadow earlier ones."""
         raise NotImplementedError
     
     def import_(self, *args):
@@ -1358,16 +2837,19 @@ class ModuleHeader(object):
     
     def importFrom_(self, *args):
         return self._helper.importFrom_(*args)
+
+    def importAs_(self, module, name, asname):
+        return ast.ImportFrom(module, [ast.alias(name=name, asname=asname)], 0)
     
     @classmethod
     def create(cls, config, helper):
         if config.numpyro:
-            return NumPyroModuleHeader(helper)
+            return NumPyroModuleHeader(helper, config.standalone)
         else:
-            return PyroModuleHeader(helper)
+            return PyroModuleHeader(helper, config.standalone)
         
 class PyroModuleHeader(ModuleHeader):
-    def build(self):
+    def imports(self):
         answer = [
             self.import_('torch'),
             self.importFrom_('torch', ['tensor', 'rand']),
@@ -1375,37 +2857,76 @@ class PyroModuleHeader(ModuleHeader):
             self.import_('torch.distributions.constraints', 'constraints'),
             self.import_('pyro.distributions', 'dist')]
         return answer
+
+    def runtime(self):
+        answer = [
+            self.importFrom_('deepppl.utils.pyro_hooks', self.hooks + ['np_scoped']),
+            self.importFrom_('torch', ['tensor', 'sqrt', 'rand', 'randn', 'exp',
+                                       'log', 'zeros', 'ones']),
+            self.importFrom_('torch.nn.functional', ['softplus']),
+            self.importFrom_('pyro', ['sample', 'plate', 'deterministic']),
+            self.importAs_('torch', 'abs', 'fabs')]
+        return answer
     
 class NumPyroModuleHeader(ModuleHeader):
-    def build(self):
+    def imports(self):
         answer = [
             self.importFrom_('numpy.random', ['rand']),
             self.import_('numpyro.distributions.constraints', 'constraints'),
             self.import_('numpyro.distributions', 'dist')]
         return answer
+
+    def runtime(self):
+        answer = [
+            self.importFrom_('deepppl.utils.numpyro_hooks', self.hooks + ['softplus', 'np_scoped']),
+            self.importFrom_('jax.numpy', ['sqrt', 'exp', 'log', 'zeros', 'ones', 'arange']),
+            self.importFrom_('jax.lax', ['fori_loop']),
+            self.importFrom_('numpyro.contrib.control_flow', ['scan']),
+            self.importFrom_('numpyro', ['sample', 'plate', 'deterministic']),
+            self.importAs_('jax.numpy', 'abs', 'fabs')]
+        return answer
     
         
 
 
 
-def ir2python(ir, config, verbose=False):
-    initialization = VariableInitializationVisitor()
-    ir.accept(initialization)
-    annotator = VariableAnnotationsVisitor()
-    ir = ir.accept(annotator)
-    nets = NetworksVisitor()
-    ir = ir.accept(nets)
-    consistency = SamplingConsistencyVisitor()
-    ir = ir.accept(consistency)
-    type_infer = TypeInferenceVisitor.run(ir)
-    equality_grouper = type_infer.equalities
-    equality_groups = equality_grouper.groups()
-    type_infer.dims_canon_map = makeGroupCanonLookup(equality_groups)
+def ir2python(ir, config, verbose=False, timer=null_timer):
+    """Translate the IR to a python AST. The duration of each pass is
+    recorded by `timer` (see `PhaseTimer`)."""
+    with timer.phase('VariableInitializationVisitor'):
+        initialization = VariableInitializationVisitor()
+        ir.accept(initialization)
+    with timer.phase('VariableAnnotationsVisitor'):
+        annotator = VariableAnnotationsVisitor()
+        ir = ir.accept(annotator)
+    with timer.phase('NetworksVisitor'):
+        nets = NetworksVisitor()
+        ir = ir.accept(nets)
+    with timer.phase('SamplingConsistencyVisitor'):
+        consistency = SamplingConsistencyVisitor()
+        ir = ir.accept(consistency)
+    with timer.phase('TypeInferenceVisitor'):
+        type_infer = TypeInferenceVisitor.run(ir)
+    with timer.phase('makeGroupCanonLookup'):
+        equality_grouper = type_infer.equalities
+        equality_groups = equality_grouper.groups()
+        type_infer.dims_canon_map = makeGroupCanonLookup(equality_groups)
     if verbose and len(equality_groups) != 0:
         print(f"WARNING: There are unproven equality constraints: {equality_grouper}.  The lookup map is {type_infer.dims_canon_map}")
-    visitor = Ir2PythonVisitor(type_infer, config, verbose=verbose)
-    a = ir.accept(visitor)
-    ast.fix_missing_locations(a)
+    if config.vectorize or config.subsample:
+        with timer.phase('VectorizationVisitor'):
+            ir = ir.accept(VectorizationVisitor(type_infer, subsample=config.subsample))
+    if config.optimize:
+        for pass_ in [ConstantFoldingVisitor, LoopInvariantVisitor,
+                      CommonSubexpressionVisitor]:
+            with timer.phase(pass_.__name__):
+                ir = ir.accept(pass_())
+        with timer.phase('AllocationVisitor'):
+            ir = ir.accept(AllocationVisitor())
+    with timer.phase('Ir2PythonVisitor'):
+        visitor = Ir2PythonVisitor(type_infer, config, verbose=verbose)
+        a = ir.accept(visitor)
+        ast.fix_missing_locations(a)
     return a
 
 
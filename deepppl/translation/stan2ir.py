@@ -19,8 +19,6 @@ import ast
 from ..parser.stanListener import stanListener
 import astor
 import astpretty
-import torch
-import ipdb
 if __name__ is not None and "." in __name__:
     from .ir import *
     from .ir2python import *
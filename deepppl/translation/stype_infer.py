@@ -28,7 +28,7 @@ from .ir import IR, Program, ProgramBlocks, Data, VariableDecl, Subscript, \
                 CallStmt, List, SamplingStmt, SamplingDeclaration, SamplingObserved,\
                 SamplingParameters, Variable, Constant, BinaryOperator, \
                 Plus, Minus, Mult, DotMult, Div, DotDiv, UnaryOperator, UPlus, UMinus, AnonymousShapeProperty,\
-                VariableProperty, NetVariableProperty, Prior
+                VariableProperty, NetVariableProperty, Prior, DispatchTable
 
 from .ir import Type_ as IrType
 
@@ -42,6 +42,10 @@ from .exceptions import *
 
 from_test = lambda: hasattr(sys, "_called_from_test")
 class IRVisitor(object):
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._dispatch = DispatchTable(cls)
+
     def defaultVisit(self, node):
         raise NotImplementedError
 
@@ -57,6 +61,8 @@ class IRVisitor(object):
     def _visitChildren(self, node):
         return self._visitAll(node.children)
 
+IRVisitor._dispatch = DispatchTable(IRVisitor)
+
 class DimensionInferenceVisitor(IRVisitor):
     def __init__(self, outer:'TypeInferenceVisitor'):
         super(DimensionInferenceVisitor, self).__init__()
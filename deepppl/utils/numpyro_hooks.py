@@ -0,0 +1,38 @@
+# /*
+#  * Copyright 2018 IBM Corporation
+#  *
+#  * Licensed under the Apache License, Version 2.0 (the "License");
+#  * you may not use this file except in compliance with the License.
+#  * You may obtain a copy of the License at
+#  *
+#  * http://www.apache.org/licenses/LICENSE-2.0
+#  *
+#  * Unless required by applicable law or agreed to in writing, software
+#  * distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+#  */
+
+# NumPyro hooks imported by the standalone modules generated by the compiler
+
+from jax import numpy as jnp
+
+from .utils import build_hooks
+from . import utils
+
+_hooks = build_hooks(npyro=True)
+globals().update(_hooks)
+
+
+def softplus(x):
+    return jnp.logaddexp(x, 0.)
+
+
+def np_scoped(f):
+    """Bind the transformed data or the generated quantities of a standalone
+    module as `NumPyroModel._np_scoped` does."""
+    return utils.np_scoped(f, npyro=True)
+
+
+__all__ = list(_hooks) + ['softplus', 'np_scoped']
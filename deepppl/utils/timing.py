@@ -0,0 +1,96 @@
+# /*
+#  * Copyright 2018 IBM Corporation
+#  *
+#  * Licensed under the Apache License, Version 2.0 (the "License");
+#  * you may not use this file except in compliance with the License.
+#  * You may obtain a copy of the License at
+#  *
+#  * http://www.apache.org/licenses/LICENSE-2.0
+#  *
+#  * Unless required by applicable law or agreed to in writing, software
+#  * distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+#  */
+
+import cProfile
+import io
+import pstats
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+
+class PhaseTimer(object):
+    """Duration of the compiler phases, in the order they ran.
+
+    `callback(name, seconds)` is called at the end of each phase. With
+    `profile=True`, each phase also runs under cProfile and its
+    statistics are kept in `profiles`."""
+
+    def __init__(self, profile=False, callback=None):
+        self.timings = OrderedDict()
+        self.profiles = OrderedDict()
+        self.profile = profile
+        self.callback = callback
+
+    @contextmanager
+    def phase(self, name):
+        profiler = cProfile.Profile() if self.profile else None
+        start = time.perf_counter()
+        if profiler:
+            profiler.enable()
+        try:
+            yield
+        finally:
+            if profiler:
+                profiler.disable()
+            elapsed = time.perf_counter() - start
+            self.timings[name] = self.timings.get(name, 0.) + elapsed
+            if profiler:
+                if name in self.profiles:
+                    self.profiles[name].add(profiler)
+                else:
+                    self.profiles[name] = pstats.Stats(profiler)
+            if self.callback:
+                self.callback(name, elapsed)
+
+    def total(self):
+        return sum(self.timings.values())
+
+    def stats(self, name=None):
+        """cProfile statistics of the phase `name`, or of all the phases."""
+        names = [name] if name else list(self.profiles)
+        answer = pstats.Stats()
+        answer.add(*[self.profiles[n] for n in names])
+        return answer
+
+    def report(self):
+        total = self.total()
+        lines = []
+        for name, elapsed in self.timings.items():
+            share = 100 * elapsed / total if total else 0.
+            lines.append('{:<32} {:9.4f}s {:6.1f}%'.format(name, elapsed, share))
+        lines.append('{:<32} {:9.4f}s'.format('total', total))
+        return '\n'.join(lines)
+
+    def profile_report(self, sort='cumulative', limit=20):
+        out = io.StringIO()
+        for name in self.profiles:
+            out.write('=== {} ===\n'.format(name))
+            stats = pstats.Stats(stream=out)
+            stats.add(self.profiles[name])
+            stats.sort_stats(sort).print_stats(limit)
+        return out.getvalue()
+
+
+class NullTimer(object):
+    """Timer used when no timing is requested."""
+
+    @contextmanager
+    def phase(self, name):
+        yield
+
+
+null_timer = NullTimer()
@@ -14,24 +14,46 @@
 #  * limitations under the License.
 #  */
 
-from pyro import distributions as dist
-from torch.distributions import constraints
-from numpyro import distributions as np_dist
-from numpyro.distributions import constraints as np_constraints
-import jax.numpy as jnp
-import torch
-
 # Utils to be imported by PyroModel
 
+from types import CodeType, FunctionType
+import builtins
+import dis
+import functools
+import numbers
+
+
+class SiteNames(dict):
+    """Names of the sample sites indexed by loop variables, keyed by
+    `(template, index, ...)`. The names whose indexes are integers are
+    formatted on first use only, up to `maxsize` of them. The other
+    indexes, like tensors which hash by identity, are formatted at each
+    use and never stored."""
+
+    maxsize = 1 << 16
+
+    def __missing__(self, key):
+        template, *indexes = key
+        name = template.format(*indexes)
+        if len(self) < self.maxsize and \
+                all(isinstance(i, numbers.Integral) for i in indexes):
+            self[key] = name
+        return name
+
 
 def build_hooks(npyro=False):
+    # The frameworks are imported here so that only the one
+    # used by the model gets loaded
     if npyro:
-        d = np_dist
-        const = np_constraints
+        from numpyro import distributions as d
+        from numpyro.distributions import constraints as const
+        import jax.numpy as jnp
+        from jax.scipy.special import logsumexp
         provider = jnp
     else:
-        d = dist
-        const = constraints
+        from pyro import distributions as d
+        from torch.distributions import constraints as const
+        import torch
         provider = torch
         
     def categorical_logits(logits):
@@ -87,7 +109,7 @@ def build_hooks(npyro=False):
             return s
 
     def is_arrayed(x):
-        cls = jnp.DeviceArray if npyro else torch.Tensor
+        cls = jnp.ndarray if npyro else torch.Tensor
         return isinstance(x, cls)
         
     def build_array(x):
@@ -104,7 +126,7 @@ def build_hooks(npyro=False):
 
 
     def log_sum_exp(x):
-        f = jnp.logaddexp if npyro else torch.logsumexp
+        f = logsumexp if npyro else torch.logsumexp
         return f(x, 0)
 
 
@@ -112,7 +134,7 @@ def build_hooks(npyro=False):
         return provider.log(p / (1. - p))
 
 
-    return {x.__name__: x for x in [
+    hooks = {x.__name__: x for x in [
         bernoulli_logit,
         categorical_logits,
         binomial_logit,
@@ -126,3 +148,83 @@ def build_hooks(npyro=False):
         inv_logit]
 
     }
+    hooks['site_names'] = SiteNames()
+    return hooks
+
+
+def build_np_scope(npyro=False):
+    """Names bound in the transformed data and the generated quantities,
+    which are evaluated outside of the model with NumPy. With `npyro`,
+    `jax.numpy` is used for the blocks updating arrays with the functional
+    operations of JAX (see `functional_updates`)."""
+    import numpy as onp
+    scope = {k: v for k, v in builtins.__dict__.items()}
+    if npyro:
+        import jax
+        import jax.numpy as jnp
+        scope.update({x.__name__: x
+                      for x in [jnp.sqrt,
+                                jnp.exp,
+                                jnp.log,
+                                jnp.zeros,
+                                jnp.ones]})
+        scope['randn'] = onp.random.randn
+        scope['dot_self'] = lambda x: jnp.dot(x, x)
+        scope['fori_loop'] = jax.lax.fori_loop
+    else:
+        scope.update({x.__name__: x
+                      for x in [onp.sqrt,
+                                onp.random.randn,
+                                onp.exp,
+                                onp.log,
+                                onp.zeros,
+                                onp.ones]})
+        scope['dot_self'] = lambda x: onp.dot(x, x)
+    return scope
+
+
+def functional_updates(code):
+    """The code generated for NumPyro updates arrays with `x.at[i].set(v)`
+    or in a `fori_loop`, which NumPy arrays do not support."""
+    if 'at' in code.co_names or 'fori_loop' in code.co_names:
+        return True
+    return any(functional_updates(c) for c in code.co_consts if isinstance(c, CodeType))
+
+
+def inplace_updates(code):
+    """The code assigns elements of arrays in place, like the loops that
+    are not vectorized, which `vmap` cannot batch."""
+    if any(i.opname == 'STORE_SUBSCR' for i in dis.get_instructions(code)):
+        return True
+    return any(inplace_updates(c) for c in code.co_consts if isinstance(c, CodeType))
+
+
+def np_scoped(f, npyro=False):
+    """Rebind the function `f` of the transformed data or of the generated
+    quantities to the names of `build_np_scope`. The functional updates
+    trace their values with JAX: the NumPy arrays given to `f` are then
+    converted to `jax.numpy` arrays, as the data of the model."""
+    functional = npyro and functional_updates(f.__code__)
+    scope = build_np_scope(functional)
+    name = f.__name__
+    scope[name] = FunctionType(f.__code__, scope, name, f.__defaults__)
+    if not functional:
+        return scope[name]
+    scoped = scope[name]
+
+    @functools.wraps(scoped)
+    def wrapper(*args, **kwargs):
+        return scoped(*[_to_jnp(v) for v in args],
+                      **{k: _to_jnp(v) for k, v in kwargs.items()})
+    return wrapper
+
+
+def _to_jnp(value):
+    import numpy as onp
+    import jax.numpy as jnp
+    if isinstance(value, onp.ndarray):
+        return jnp.asarray(value)
+    elif isinstance(value, dict):
+        return {k: _to_jnp(v) for k, v in value.items()}
+    else:
+        return value
@@ -7,4 +7,6 @@ setup(name='DeepPPL',
       author='Many Authors',
       author_email='many.authors@ibm.com',
       license='Apache License 2.0',
-      packages=['deepppl', 'deepppl.parser', 'deepppl.translation', 'deepppl.utils'])
\ No newline at end of file
+      packages=['deepppl', 'deepppl.benchmarks', 'deepppl.parser', 'deepppl.translation', 'deepppl.utils'],
+      # The NumPyro backend updates the arrays with `x.at[i].set(v)`
+      extras_require={'numpyro': ['jax>=0.2.22', 'numpyro>=0.8.0']})
\ No newline at end of file